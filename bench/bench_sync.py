@@ -0,0 +1,104 @@
+"""จับเวลา Sync ทีละขั้นด้วยไฟล์จำลอง (generate_exports.py) ที่ 10k / 100k / 1M บรรทัดออเดอร์
+
+  python bench/bench_sync.py                         ทุกขนาด (สร้างไฟล์ครั้งแรกแล้วใช้ซ้ำจาก --data-dir)
+  python bench/bench_sync.py --sizes 10000 100000 --json bench.json
+
+ขั้นที่จับเวลา (ทำทีละขั้นใน thread เดียว เวลาแต่ละขั้นจะได้ไม่ปนกัน):
+  list      source.folders() + collect_sync_files
+  download  อ่านไฟล์ทั้งหมดเข้าหน่วยความจำ
+  income    INCOME_LOADERS ต่อ Platform
+  orders    PROCESSORS ต่อร้าน (หา header / อ่าน Excel-CSV / merge Income)
+  master    build_master_df ต่อร้าน (Pro-rate / ต้นทุน / สถานะ / วันที่)
+  write     write_orders_diff ลง SQLite ไฟล์ใหม่
+  summary   refresh_daily_summary
+แล้วปิดท้ายด้วย run_sync ทั้งรอบ (end_to_end) ลง SQLite อีกไฟล์ ด้วยจำนวน thread ตาม --workers"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sync_pipeline import (LocalFolderSource, SyncJob, PROCESSORS, INCOME_LOADERS, ORDER_COLUMNS, collect_sync_files,
+                           build_master_df, load_order_index, write_orders_diff, refresh_daily_summary, run_sync, to_cost_frame)
+from storage import SQLiteStorage
+from generate_exports import generate
+
+SIZES = [10_000, 100_000, 1_000_000]
+
+class Stages:
+    """เก็บเวลา / จำนวนแถวของแต่ละขั้น (เรียก stage ซ้ำชื่อเดิม = บวกเพิ่ม)
+    rows = จำนวนแถวที่ขั้นนั้นทำ: ตัวเลข หรือฟังก์ชันที่รับผลของขั้นแล้วคืนตัวเลข"""
+
+    def __init__(self):
+        self.rows = {}
+
+    def run(self, name, func, *args, rows=len):
+        started = time.perf_counter()
+        result = func(*args)
+        entry = self.rows.setdefault(name, {'stage': name, 'seconds': 0.0, 'rows': 0})
+        entry['seconds'] += time.perf_counter() - started
+        entry['rows'] += rows(result) if callable(rows) else rows
+        return result
+
+def bench(root, workers):
+    source = LocalFolderSource(root)
+    job = SyncJob(True, 1, echo=lambda msg: print("   ", msg) if msg.startswith("❌") else None)
+    cost_df = to_cost_frame(pd.read_csv(os.path.join(root, "costs.csv"), dtype=str).to_dict('records'))
+    stages = Stages()
+
+    count_files = lambda plan: sum(len(info['income']) + sum(len(fs) for fs in info['shops'].values()) for info in plan.values())
+    plan = stages.run('list', lambda: collect_sync_files(source.folders()), rows=count_files)
+    files = [f for info in plan.values() for f in info['income'] + [f for fs in info['shops'].values() for f in fs]]
+    cache = stages.run('download', lambda: {f['id']: source.download(f['id']) for f in files})
+    fetch = lambda file_id: io.BytesIO(cache[file_id].getvalue())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = SQLiteStorage(os.path.join(tmp, "stages.db"))
+        for platform, info in plan.items():
+            income, _ = stages.run('income', INCOME_LOADERS[platform], info['income'], fetch, job, rows=lambda r: len(r[0]))
+            for shop_name, order_files in info['shops'].items():
+                df, _ = stages.run('orders', PROCESSORS[platform], order_files, income, shop_name, fetch, job, rows=lambda r: len(r[0]))
+                master_df = stages.run('master', build_master_df, [df], cost_df) if not df.empty else pd.DataFrame(columns=ORDER_COLUMNS)
+                stages.run('write', lambda: write_orders_diff(db, master_df, load_order_index(db, shop_name=shop_name)), rows=len(master_df))
+                stages.run('summary', refresh_daily_summary, db, master_df[['created_date', 'shop_name']], rows=len(master_df))
+
+        started = time.perf_counter()
+        e2e_job = SyncJob(True, workers)
+        stats = run_sync(SQLiteStorage(os.path.join(tmp, "end_to_end.db")), source, plan, e2e_job, True, workers, cost_df=cost_df)
+        results = list(stages.rows.values())
+        results.append({'stage': f'end_to_end ({workers} workers)', 'seconds': time.perf_counter() - started, 'rows': (stats or {}).get('rows', 0)})
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="จับเวลา Sync ทีละขั้นด้วยไฟล์ export จำลอง")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="จำนวนบรรทัดออเดอร์รวม")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "profit_income_bench"), help="ที่เก็บไฟล์จำลอง (ใช้ซ้ำข้ามรอบ)")
+    parser.add_argument("--workers", type=int, default=4, help="จำนวน thread ของ end_to_end")
+    parser.add_argument("--json", metavar="FILE", help="บันทึกผลเป็น JSON")
+    args = parser.parse_args(argv)
+
+    report = []
+    for size in args.sizes:
+        root = os.path.join(args.data_dir, str(size))
+        if not os.path.exists(os.path.join(root, "costs.csv")):
+            started = time.perf_counter()
+            generate(root, size)
+            print(f"สร้างไฟล์ {size:,} บรรทัดที่ {root} ({time.perf_counter() - started:.1f}s)")
+        results = bench(root, args.workers)
+        print(f"\n== {size:,} บรรทัด ==")
+        print(f"{'stage':<24}{'seconds':>10}{'rows':>12}{'rows/s':>12}")
+        for r in results:
+            rate = r['rows'] / r['seconds'] if r['seconds'] and r['rows'] else 0
+            print(f"{r['stage']:<24}{r['seconds']:>10.2f}{r['rows']:>12,}{rate:>12,.0f}")
+        report.append({'size': size, 'stages': results})
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as fh: json.dump(report, fh, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""สร้างไฟล์ export จำลองของ TikTok / Shopee / Lazada (ออเดอร์ + Income) ไว้ทดสอบ / จับเวลา Sync โดยไม่ต้องใช้ไฟล์จริง
+
+  python bench/generate_exports.py --rows 100000 --out /tmp/exports_100k
+  python sync_cli.py --local /tmp/exports_100k --dry-run --costs /tmp/exports_100k/costs.csv
+
+โครงสร้างโฟลเดอร์เหมือนใน Drive (TIKTOK 1 ... LAZADA 3 / INCOME *) อ่านด้วย LocalFolderSource ได้เลย
+ครอบคลุมกรณีที่เจอในไฟล์จริง:
+- หัวตารางภาษาไทย / อังกฤษ ตามชื่อคอลัมน์ที่ get_col_data หา
+- แถวขยะก่อนหัวตาราง (ชื่อรายงาน / ช่วงวันที่) ให้ read_excel_with_header หาแถว header เอง
+- TikTok: xlsx / csv UTF-8 / csv cp874 (หัวตารางไทย) และเลขออเดอร์ที่ Excel แปลงเป็น 5.7E+17 หรือเป็นตัวเลข
+- Shopee: ไฟล์ Income มีหลาย sheet ข้อมูลอยู่ใน sheet 'Income'
+- Lazada: Income เป็นรายการบวก/ลบหลายบรรทัดต่อออเดอร์
+- 1 ออเดอร์มีได้หลาย SKU (ใช้ทดสอบการ Pro-rate)
+--rows = จำนวนบรรทัดออเดอร์ (order line) รวมทุก Platform"""
+import argparse
+import datetime
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import openpyxl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sync_pipeline import SHOP_FOLDERS, INCOME_FOLDERS
+
+PLATFORM_SHARE = {'TIKTOK': 0.4, 'SHOPEE': 0.35, 'LAZADA': 0.25}
+ROWS_PER_FILE = 50_000      # ไฟล์ export จริงแบ่งเป็นช่วง ๆ ไม่เกินประมาณนี้
+SCI_ID_SHARE = 0.2          # สัดส่วนเลขออเดอร์ TikTok ใน csv ที่เป็นรูป 5.70000000001E+17
+N_SKUS = 2000
+START_DATE = datetime.date(2025, 10, 1)
+N_DAYS = 90
+
+TIKTOK_HEADERS = {  # ชื่อคอลัมน์ อังกฤษ / ไทย (ไฟล์ csv cp874 ใช้หัวไทย)
+    'order_id': ('Order ID', 'หมายเลขคำสั่งซื้อ'), 'status': ('Order Status', 'สถานะคำสั่งซื้อ'),
+    'sku': ('Seller SKU', 'รหัสสินค้าของผู้ขาย'), 'product_name': ('Product Name', 'ชื่อสินค้า'),
+    'quantity': ('Quantity', 'จำนวน'), 'sales': ('SKU Subtotal After Discount', 'ยอดคำสั่งซื้อ'),
+    'created': ('Created Time', 'เวลาที่สร้าง'), 'shipped': ('Shipped Time', 'เวลาจัดส่ง'),
+    'tracking': ('Tracking ID', 'หมายเลขติดตามพัสดุ'),
+}
+TIKTOK_STATUS = {'en': ['Completed', 'Completed', 'Completed', 'Shipped', 'Cancelled', 'To ship'],
+                 'th': ['สำเร็จแล้ว', 'สำเร็จแล้ว', 'สำเร็จแล้ว', 'จัดส่งแล้ว', 'ยกเลิกแล้ว', 'ที่ต้องจัดส่ง']}
+SHOPEE_STATUS = ['สำเร็จแล้ว', 'สำเร็จแล้ว', 'สำเร็จแล้ว', 'ที่ต้องจัดส่ง', 'ยกเลิกแล้ว', 'คืนเงิน/คืนสินค้า']
+LAZADA_STATUS = ['delivered', 'delivered', 'delivered', 'shipped', 'canceled', 'returned']
+PRODUCT_WORDS = ['เสื้อยืด', 'กางเกง', 'Cotton', 'Oversize', 'ครีมกันแดด', 'Serum', 'แก้วน้ำ', 'กระเป๋า', 'Premium', 'สีดำ', 'สีขาว']
+
+def order_lines(rng, n_lines, platform, shop_index):
+    """บรรทัดออเดอร์ของ 1 ร้าน: 1 ออเดอร์มี 1-3 SKU (ไม่ซ้ำกันในออเดอร์เดียว)"""
+    per_order = rng.choice([1, 1, 1, 2, 2, 3], size=n_lines)
+    per_order = per_order[:np.searchsorted(np.cumsum(per_order), n_lines) + 1]
+    per_order[-1] -= per_order.sum() - n_lines
+    order_no = np.repeat(np.arange(len(per_order)), per_order)
+    line_no = np.arange(n_lines) - np.repeat(np.cumsum(per_order) - per_order, per_order)
+    sku_no = (rng.integers(0, N_SKUS, size=len(per_order))[order_no] + line_no * 7) % N_SKUS
+    days = rng.integers(0, N_DAYS, size=len(per_order))[order_no]
+    created = pd.Timestamp(START_DATE) + pd.to_timedelta(days, unit='D') + pd.to_timedelta(rng.integers(0, 86400, size=n_lines) // 60, unit='min')
+    lines = pd.DataFrame({
+        'order_no': order_no,
+        'sku': [f"{platform[:2]}-{s:05d}" for s in sku_no],
+        'product_name': [f"{PRODUCT_WORDS[s % len(PRODUCT_WORDS)]} {PRODUCT_WORDS[(s // 11) % len(PRODUCT_WORDS)]} #{s}" for s in sku_no],
+        'quantity': rng.choice([1, 1, 1, 2, 3], size=n_lines),
+        'created': created,
+        'status_idx': rng.integers(0, 6, size=len(per_order))[order_no],
+    })
+    lines['sales'] = (lines['quantity'] * rng.integers(59, 1500, size=n_lines)).astype(float)
+    lines['shipped'] = lines['created'] + pd.to_timedelta(rng.integers(1, 4, size=n_lines), unit='D')
+    lines['tracking'] = [f"TH{shop_index}{o:011d}" for o in order_no]
+    return lines
+
+def write_xlsx(path, header, rows, junk=(), sheet='Sheet1', extra_sheets=()):
+    """xlsx แบบ write-only (ไม่เก็บทั้งไฟล์ในหน่วยความจำ) junk = แถวก่อนหัวตาราง"""
+    wb = openpyxl.Workbook(write_only=True)
+    for name, sheet_rows in extra_sheets:
+        ws = wb.create_sheet(name)
+        for r in sheet_rows: ws.append(r)
+    ws = wb.create_sheet(sheet)
+    for r in junk: ws.append(r)
+    ws.append(header)
+    for r in rows: ws.append(r)
+    wb.save(path)
+
+def chunks(df, min_files=1):
+    """แบ่งเป็นไฟล์ละไม่เกิน ROWS_PER_FILE แถว และอย่างน้อย min_files ไฟล์ (ให้มีไฟล์ทุกแบบแม้ข้อมูลน้อย)"""
+    size = max(1, min(ROWS_PER_FILE, -(-len(df) // min_files)))
+    for i in range(0, len(df), size): yield i // size, df.iloc[i:i + size]
+
+def report_junk(title):
+    return [[title], [f"ช่วงวันที่: {START_DATE:%Y-%m-%d} - {START_DATE + datetime.timedelta(days=N_DAYS - 1):%Y-%m-%d}"], []]
+
+def write_tiktok(rng, out, shop_lines):
+    """ออเดอร์: สลับ xlsx / csv UTF-8 / csv cp874 (หัวไทย) ต่อไฟล์, Income: xlsx + csv ต่อร้าน"""
+    incomes = []
+    for shop_index, (shop_name, lines) in enumerate(shop_lines.items()):
+        order_ids = 570_000_000_000_000_000 + (shop_index * 10_000_000 + lines['order_no'].to_numpy()) * 10_000_000
+        lines = lines.assign(order_id=order_ids)
+        for part, df in chunks(lines, min_files=3):
+            kind = ['xlsx', 'csv', 'cp874'][part % 3]
+            lang = 'th' if kind == 'cp874' else 'en'
+            table = pd.DataFrame({
+                'order_id': df['order_id'].astype(str), 'status': np.array(TIKTOK_STATUS[lang])[df['status_idx']],
+                'sku': df['sku'].str.lower(), 'product_name': df['product_name'], 'quantity': df['quantity'], 'sales': df['sales'],
+                'created': df['created'].dt.strftime('%d/%m/%Y %H:%M:%S'), 'shipped': df['shipped'].dt.strftime('%d/%m/%Y %H:%M:%S'),
+                'tracking': df['tracking'],
+            }).rename(columns={k: en if lang == 'en' else th for k, (en, th) in TIKTOK_HEADERS.items()})
+            path = os.path.join(out, shop_name, f"tiktok_orders_{part + 1:03d}")
+            if kind == 'xlsx':
+                # Excel เก็บเลขออเดอร์เป็นตัวเลข (อ่านกลับมาเป็น float) + แถวคำอธิบายก่อนหัวตาราง
+                rows = table.astype(object).to_numpy().tolist()
+                for r, oid in zip(rows, df['order_id']): r[0] = float(oid)
+                write_xlsx(path + ".xlsx", list(table.columns), rows, junk=report_junk("TikTok Shop Order Export"))
+            else:
+                sci = rng.random(len(table)) < SCI_ID_SHARE
+                ids = table.iloc[:, 0].to_numpy(dtype=object)
+                ids[sci] = [f"{v:.11E}" for v in df['order_id'].to_numpy()[sci]]
+                table.iloc[:, 0] = ids
+                table.to_csv(path + ".csv", index=False, encoding='cp874' if kind == 'cp874' else 'utf-8')
+        orders = lines.groupby('order_id', as_index=False).agg(sales=('sales', 'sum'), status_idx=('status_idx', 'first'))
+        settled = orders[(orders['status_idx'] < 4) & (rng.random(len(orders)) < 0.85)]
+        incomes.append(pd.DataFrame({
+            'Order ID': settled['order_id'].astype(str),
+            'Settlement Amount': (settled['sales'] * 0.88).round(2),
+            'Affiliate Commission': (settled['sales'] * 0.05).round(2),
+            'Platform Fee': (settled['sales'] * 0.07).round(2),
+        }))
+    income = pd.concat(incomes, ignore_index=True)
+    for part, df in chunks(income, min_files=2):
+        path = os.path.join(out, INCOME_FOLDERS['TIKTOK'], f"tiktok_income_{part + 1:03d}")
+        if part % 2: df.to_csv(path + ".csv", index=False)
+        else: write_xlsx(path + ".xlsx", list(df.columns), df.astype(object).to_numpy().tolist())
+
+def write_shopee(rng, out, shop_lines):
+    """ออเดอร์: xlsx หัวไทย, Income: xlsx ที่มี sheet สรุปก่อน sheet 'Income' และแถวขยะก่อนหัวตาราง"""
+    incomes = []
+    for shop_index, (shop_name, lines) in enumerate(shop_lines.items()):
+        order_ids = [f"{d:%y%m%d}{shop_index}{o:07d}SP" for d, o in zip(lines['created'], lines['order_no'])]
+        lines = lines.assign(order_id=order_ids)
+        for part, df in chunks(lines):
+            table = pd.DataFrame({
+                'หมายเลขคำสั่งซื้อ': df['order_id'], 'สถานะการสั่งซื้อ': np.array(SHOPEE_STATUS)[df['status_idx']],
+                'เลขอ้างอิง SKU (SKU Reference No.)': df['sku'], 'ชื่อสินค้า': df['product_name'],
+                'จำนวน': df['quantity'], 'ราคาขายสุทธิ': df['sales'],
+                'วันที่ทำการสั่งซื้อ': df['created'].dt.strftime('%Y-%m-%d %H:%M'),
+                'เวลาการชำระสินค้า': df['created'].dt.strftime('%Y-%m-%d %H:%M'),
+                'หมายเลขติดตามพัสดุ': df['tracking'],
+            })
+            write_xlsx(os.path.join(out, shop_name, f"Order.all.{part + 1:03d}.xlsx"), list(table.columns), table.astype(object).to_numpy().tolist())
+        orders = lines.groupby('order_id', as_index=False).agg(sales=('sales', 'sum'), status_idx=('status_idx', 'first'), created=('created', 'first'))
+        settled = orders[(orders['status_idx'] < 4) & (rng.random(len(orders)) < 0.85)]
+        incomes.append(pd.DataFrame({
+            'หมายเลขคำสั่งซื้อ': settled['order_id'],
+            'วันที่โอนชำระเงินสำเร็จ': (settled['created'] + pd.Timedelta(days=7)).dt.strftime('%Y-%m-%d'),
+            'จำนวนเงินทั้งหมดที่โอนแล้ว (฿)': (settled['sales'] * 0.9).round(2),
+            'สินค้าราคาปกติ': (settled['sales'] * 1.1).round(2),
+            'ค่าคอมมิชชั่น': (settled['sales'] * 0.04).round(2),
+        }))
+    income = pd.concat(incomes, ignore_index=True)
+    for part, df in chunks(income):
+        write_xlsx(os.path.join(out, INCOME_FOLDERS['SHOPEE'], f"Income.โอนเงินสำเร็จ.{part + 1:03d}.xlsx"),
+                   list(df.columns), df.astype(object).to_numpy().tolist(), junk=report_junk("รายงานรายได้"),
+                   sheet='Income', extra_sheets=[('Summary', [['สรุปรายได้'], ['ยอดรวม', float(df['จำนวนเงินทั้งหมดที่โอนแล้ว (฿)'].sum())]])])
+
+def write_lazada(rng, out, shop_lines):
+    """ออเดอร์: xlsx หัวอังกฤษแบบ camelCase, Income: หลายบรรทัดต่อออเดอร์ (ยอดขาย +, ค่าธรรมเนียม -)"""
+    incomes = []
+    for shop_index, (shop_name, lines) in enumerate(shop_lines.items()):
+        lines = lines.assign(order_id=(400_000_000_000_000 + shop_index * 10_000_000 + lines['order_no']).astype(str))
+        for part, df in chunks(lines):
+            table = pd.DataFrame({
+                'orderItemId': np.arange(len(df)) + part * ROWS_PER_FILE, 'orderNumber': df['order_id'],
+                'status': np.array(LAZADA_STATUS)[df['status_idx']], 'sellerSku': df['sku'], 'itemName': df['product_name'],
+                'paidPrice': df['sales'], 'trackingCode': df['tracking'],
+                'createTime': df['created'].dt.strftime('%d %b %Y %H:%M'), 'updateTime': df['shipped'].dt.strftime('%d %b %Y %H:%M'),
+            })
+            write_xlsx(os.path.join(out, shop_name, f"lazada_orders_{part + 1:03d}.xlsx"), list(table.columns), table.astype(object).to_numpy().tolist())
+        orders = lines.groupby('order_id', as_index=False).agg(sales=('sales', 'sum'), status_idx=('status_idx', 'first'), created=('created', 'first'))
+        settled = orders[(orders['status_idx'] < 4) & (rng.random(len(orders)) < 0.85)]
+        date = (settled['created'] + pd.Timedelta(days=10)).dt.strftime('%d %b %Y')
+        incomes.append(pd.concat([
+            pd.DataFrame({'Transaction Date': date, 'Order No.': settled['order_id'], 'Fee Name': 'Item Price Credit', 'Amount (incl. VAT)': settled['sales']}),
+            pd.DataFrame({'Transaction Date': date, 'Order No.': settled['order_id'], 'Fee Name': 'Commission', 'Amount (incl. VAT)': -(settled['sales'] * 0.06).round(2)}),
+            pd.DataFrame({'Transaction Date': date, 'Order No.': settled['order_id'], 'Fee Name': 'Payment Fee', 'Amount (incl. VAT)': -(settled['sales'] * 0.03).round(2)}),
+        ]).sort_values(['Order No.', 'Fee Name'], kind='stable'))
+    income = pd.concat(incomes, ignore_index=True)
+    for part, df in chunks(income):
+        write_xlsx(os.path.join(out, INCOME_FOLDERS['LAZADA'], f"lazada_transactions_{part + 1:03d}.xlsx"),
+                   list(df.columns), df.astype(object).to_numpy().tolist(), junk=[["Account Statement"]])
+
+WRITERS = {'TIKTOK': write_tiktok, 'SHOPEE': write_shopee, 'LAZADA': write_lazada}
+
+def generate(out, rows, seed=0):
+    """เขียนไฟล์ทั้งหมดลง out (rows = จำนวนบรรทัดออเดอร์รวม) และ costs.csv สำหรับ --costs คืนจำนวนบรรทัดต่อร้าน"""
+    rng = np.random.default_rng(seed)
+    counts = {}
+    for platform, share in PLATFORM_SHARE.items():
+        shops = SHOP_FOLDERS[platform]
+        n_platform = int(rows * share) if platform != 'LAZADA' else rows - sum(counts.values())
+        sizes = np.full(len(shops), n_platform // len(shops)); sizes[0] += n_platform - sizes.sum()
+        shop_lines = {}
+        for shop_index, (shop_name, n) in enumerate(zip(shops, sizes)):
+            os.makedirs(os.path.join(out, shop_name), exist_ok=True)
+            shop_lines[shop_name] = order_lines(rng, int(n), platform, shop_index)
+            counts[shop_name] = int(n)
+        os.makedirs(os.path.join(out, INCOME_FOLDERS[platform]), exist_ok=True)
+        WRITERS[platform](rng, out, shop_lines)
+    costs = pd.DataFrame([(f"{p[:2]}-{s:05d}", p, round(float(rng.uniform(20, 400)), 2))
+                          for p in PLATFORM_SHARE for s in range(N_SKUS)], columns=['sku', 'platform', 'unit_cost'])
+    costs.to_csv(os.path.join(out, "costs.csv"), index=False)
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="สร้างไฟล์ export จำลองของ TikTok / Shopee / Lazada")
+    parser.add_argument("--rows", type=int, default=10_000, help="จำนวนบรรทัดออเดอร์รวมทุก Platform")
+    parser.add_argument("--out", required=True, help="โฟลเดอร์ปลายทาง (โครงสร้างเดียวกับใน Drive)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    counts = generate(args.out, args.rows, args.seed)
+    for shop_name, n in counts.items(): print(f"{shop_name}: {n:,} บรรทัด")
+
+if __name__ == "__main__":
+    main()
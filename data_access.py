@@ -0,0 +1,101 @@
+"""อ่านข้อมูลจาก Supabase แบบกรองที่ฝั่ง Database
+query object (ช่วงวันที่ / Platform / ร้าน / คอลัมน์ที่ต้องใช้) -> ตัวกรอง PostgREST + select เฉพาะคอลัมน์
+เงื่อนไขเดียวกันใช้กรอง snapshot บนดิสก์ได้ด้วย (filter_frame) ได้ผลเหมือนกันไม่ว่าอ่านจากทางไหน"""
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+
+import pandas as pd
+
+DB_PAGE_SIZE = 1000     # PostgREST คืนข้อมูลได้สูงสุดครั้งละ max-rows (ค่าเริ่มต้น 1000)
+DB_FETCH_WORKERS = 4    # จำนวนหน้าที่ดึงพร้อมกัน
+
+def fetch_pages_parallel(make_query, page_size=DB_PAGE_SIZE, max_workers=DB_FETCH_WORKERS):
+    """ดึงทุกแถวแบบแบ่งหน้า: หน้าแรกขอ count='exact' มาด้วยเพื่อรู้จำนวนทั้งหมด แล้วยิงหน้าที่เหลือพร้อมกัน
+    make_query(count) ต้องสร้าง query ใหม่ทุกครั้ง และ .order() ไว้ให้ลำดับคงที่ (หน้าจะได้ไม่ซ้อน/หาย)"""
+    first = make_query("exact").range(0, page_size - 1).execute()
+    rows = list(first.data)
+    total = first.count if first.count is not None else len(rows)
+    if not rows or len(rows) >= total: return rows
+    step = len(rows)  # ถ้า Server ตั้ง max-rows ต่ำกว่า page_size ให้ใช้ขนาดหน้าที่ได้มาจริง
+    def fetch_page(start):
+        return make_query(None).range(start, start + step - 1).execute().data
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for data in pool.map(fetch_page, range(step, total, step)): rows.extend(data)
+    return rows
+
+@dataclass(frozen=True)
+class TableQuery:
+    """เงื่อนไขการอ่าน 1 ตาราง: ค่าว่าง = ไม่กรอง, columns ว่าง = ทุกคอลัมน์
+    frozen + tuple ล้วน -> hash ได้ ส่งเป็น argument ของฟังก์ชันที่ Cache ได้เลย"""
+    start: datetime.date = None
+    end: datetime.date = None
+    platforms: tuple = ()
+    shops: tuple = ()
+    columns: tuple = ()
+    table: str = ""
+    date_column: str = ""
+    order_by: tuple = ()    # ต้องทำให้ลำดับคงที่ เพราะดึงแบบแบ่งหน้า
+
+    def __post_init__(self):
+        # รับ list / None มาได้ เก็บเป็น tuple เสมอ
+        for name in ('platforms', 'shops', 'columns', 'order_by'):
+            object.__setattr__(self, name, tuple(getattr(self, name) or ()))
+
+    def select_clause(self):
+        return ", ".join(self.columns) if self.columns else "*"
+
+    def build(self, client, count=None):
+        """สร้าง query ของ postgrest-py (ยังไม่ .range() / .execute())"""
+        q = client.table(self.table).select(self.select_clause(), count=count)
+        if self.start: q = q.gte(self.date_column, self.start.strftime('%Y-%m-%d'))
+        if self.end: q = q.lte(self.date_column, self.end.strftime('%Y-%m-%d'))
+        if self.platforms: q = q.in_("platform", list(self.platforms))
+        if self.shops: q = q.in_("shop_name", list(self.shops))
+        for c in self.order_by: q = q.order(c)
+        return q
+
+    def fetch(self, client):
+        """ทุกแถวที่ตรงเงื่อนไข (list ของ dict) ดึงแบบแบ่งหน้า"""
+        return fetch_pages_parallel(lambda count: self.build(client, count))
+
+    def filter_frame(self, df):
+        """กรอง DataFrame ที่โหลดไว้แล้ว (เช่น snapshot ทั้งตาราง) ด้วยเงื่อนไขเดียวกัน คืน DataFrame ใหม่ ไม่แก้ df"""
+        if df.empty: return df.copy()
+        mask = pd.Series(True, index=df.index)
+        if self.start or self.end:
+            dates = df[self.date_column]
+            as_bound = pd.Timestamp if pd.api.types.is_datetime64_any_dtype(dates) else (lambda d: d)
+            if self.start: mask &= dates >= as_bound(self.start)
+            if self.end: mask &= dates <= as_bound(self.end)
+        if self.platforms: mask &= df['platform'].isin(self.platforms)
+        if self.shops: mask &= df['shop_name'].isin(self.shops)
+        cols = [c for c in self.columns if c in df.columns] if self.columns else df.columns
+        return df.loc[mask, cols].reset_index(drop=True)
+
+@dataclass(frozen=True)
+class OrderQuery(TableQuery):
+    """orders ตามวันที่สร้างออเดอร์"""
+    table: str = "orders"
+    date_column: str = "created_date"
+    order_by: tuple = ("id",)
+
+@dataclass(frozen=True)
+class SummaryQuery(TableQuery):
+    """daily_summary (ยอดรายวันต่อร้าน)"""
+    table: str = "daily_summary"
+    date_column: str = "created_date"
+    order_by: tuple = ("created_date", "shop_name", "platform")
+
+@dataclass(frozen=True)
+class AdsQuery(TableQuery):
+    """daily_ads (ไม่มีคอลัมน์ platform ห้ามกรอง platforms)
+    ชื่อร้านใน daily_ads อาจพิมพ์เล็ก/ใหญ่ไม่ตรงกัน (แถวที่บันทึกก่อนบังคับตัวพิมพ์ใหญ่) .in_() ของ PostgREST แยกตัวพิมพ์
+    จึงกรองแค่วันที่ที่ Database แล้วกรองร้านด้วย filter_frame หลังแปลงชื่อร้านเป็นตัวพิมพ์ใหญ่ (to_ads_frame)"""
+    table: str = "daily_ads"
+    date_column: str = "date"
+    order_by: tuple = ("date", "shop_name")
+
+    def build(self, client, count=None):
+        columns = tuple(dict.fromkeys(self.columns + ("shop_name",))) if self.columns else ()
+        return TableQuery.build(replace(self, shops=(), columns=columns), client, count)
@@ -0,0 +1,198 @@
+"""ที่เก็บข้อมูลของแอป: Supabase (PostgREST ผ่าน HTTP) หรือไฟล์ SQLite ในเครื่อง (ไม่ต้องใช้ network)
+
+ทั้งสองแบบมี interface เดียวกัน
+  table(name)          -> query builder แบบ postgrest-py: select / eq / in_ / is_ / gte / lte / like / order / range
+                          / upsert / delete แล้ว .execute() ได้ผลที่มี .data (list ของ dict) และ .count
+  daily_summary(query) -> ยอดสรุปรายวัน x ร้าน x Platform ตาม SummaryQuery (list ของ dict คอลัมน์ SUMMARY_COLUMNS)
+  ads_by_day(query)    -> ค่า Ads ต่อวันรวมทุกร้านใน AdsQuery (date, ads_amount = ผลรวม, roas_ads = ค่าเฉลี่ย)
+โค้ดเดิมที่เรียก supabase.table(...) / query.fetch(client) จึงส่ง storage ตัวไหนก็ได้
+SupabaseStorage อ่านยอดสรุปจากตาราง daily_summary ที่ Sync สร้างไว้ ส่วน SQLiteStorage รวมจาก orders ด้วย SQL ทุกครั้ง"""
+import datetime
+import sqlite3
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from sync_pipeline import SUMMARY_KEY, SUMMARY_STATUS_COUNTS, SUMMARY_SUMS
+
+def ads_by_day_frame(ads):
+    """รวม daily_ads (จาก to_ads_frame) เป็น 1 แถวต่อวัน: ads_amount รวม, roas_ads เฉลี่ย"""
+    if ads.empty: return pd.DataFrame(columns=['date', 'ads_amount', 'roas_ads'])
+    return ads.groupby('date', as_index=False).agg(ads_amount=('ads_amount', 'sum'), roas_ads=('roas_ads', 'mean'))
+
+class SupabaseStorage:
+    def __init__(self, client):
+        self.client = client
+
+    def table(self, name):
+        return self.client.table(name)
+
+    def daily_summary(self, query):
+        return query.fetch(self.client)
+
+    def ads_by_day(self, query):
+        ads = pd.DataFrame(query.fetch(self.client), columns=['date', 'shop_name', 'ads_amount', 'roas_ads'])
+        ads['shop_name'] = ads['shop_name'].astype(str).str.upper().str.strip()
+        if query.shops: ads = ads[ads['shop_name'].isin(query.shops)]  # AdsQuery ไม่กรองร้านที่ Database (ตัวพิมพ์)
+        ads[['ads_amount', 'roas_ads']] = ads[['ads_amount', 'roas_ads']].apply(pd.to_numeric, errors='coerce').fillna(0)
+        return ads_by_day_frame(ads).to_dict('records')
+
+# --- SQLITE ---
+# ตารางเดียวกับใน Supabase (ชนิดข้อมูลแบบ SQLite) key ของ upsert ตรงกับ on_conflict ที่โค้ดใช้
+SQLITE_SCHEMA = {
+    "orders": """id INTEGER PRIMARY KEY AUTOINCREMENT, order_id TEXT, status TEXT, sku TEXT, product_name TEXT,
+        quantity REAL, sales_amount REAL, settlement_amount REAL, fees REAL, affiliate REAL, net_profit REAL,
+        total_cost REAL, unit_cost REAL, settlement_date TEXT, created_date TEXT, shipped_date TEXT,
+        tracking_id TEXT, shop_name TEXT, platform TEXT, source_file_id TEXT, row_hash TEXT,
+        UNIQUE (order_id, sku, shop_name)""",
+    "daily_ads": "date TEXT, shop_name TEXT, ads_amount REAL, roas_ads REAL, PRIMARY KEY (date, shop_name)",
+    "product_costs": "sku TEXT, platform TEXT, unit_cost REAL, UNIQUE (sku, platform)",
+    "daily_summary": """created_date TEXT, shop_name TEXT, platform TEXT, success_count INTEGER, pending_count INTEGER,
+        return_count INTEGER, cancel_count INTEGER, sales_sum REAL, cost_sum REAL, fees_sum REAL, affiliate_sum REAL,
+        PRIMARY KEY (created_date, shop_name, platform)""",
+    "sync_manifest": """file_id TEXT PRIMARY KEY, file_name TEXT, folder_name TEXT, platform TEXT, shop_name TEXT,
+        kind TEXT, modified_time TEXT, md5_checksum TEXT, row_count INTEGER, synced_at TEXT""",
+    "app_meta": "key TEXT PRIMARY KEY, value TEXT",
+}
+SQLITE_INDEXES = ["orders (created_date, shop_name)", "orders (source_file_id)", "orders (sku)"]
+SQLITE_UPSERT_KEYS = {"orders": "id", "daily_ads": "date,shop_name", "product_costs": "sku,platform",
+                      "daily_summary": ",".join(SUMMARY_KEY), "sync_manifest": "file_id", "app_meta": "key"}
+
+def sqlite_value(v):
+    if isinstance(v, np.generic): v = v.item()
+    if isinstance(v, (datetime.date, pd.Timestamp)): v = v.isoformat()[:10]
+    if isinstance(v, float) and np.isnan(v): v = None
+    return v
+
+class SQLiteQuery:
+    """query builder ของ 1 ตาราง รองรับเฉพาะส่วนของ postgrest-py ที่แอปใช้"""
+
+    def __init__(self, storage, table):
+        self.storage = storage
+        self.table = table
+        self.action = 'select'
+        self.columns = "*"
+        self.count = None
+        self.where, self.params = [], []
+        self.orders = []
+        self.limit = None
+        self.records = None
+        self.on_conflict = None
+
+    def select(self, columns="*", count=None):
+        self.columns = ", ".join(c.strip() for c in columns.split(",")) if columns != "*" else "*"
+        self.count = count
+        return self
+
+    def _filter(self, sql, *params):
+        self.where.append(sql); self.params += params
+        return self
+
+    def eq(self, column, value): return self._filter(f"{column} = ?", sqlite_value(value))
+    def gte(self, column, value): return self._filter(f"{column} >= ?", sqlite_value(value))
+    def lte(self, column, value): return self._filter(f"{column} <= ?", sqlite_value(value))
+    def like(self, column, pattern): return self._filter(f"{column} LIKE ?", pattern)
+
+    def in_(self, column, values):
+        values = [sqlite_value(v) for v in values]
+        return self._filter(f"{column} IN ({', '.join('?' * len(values))})", *values)
+
+    def is_(self, column, value):
+        if value in (None, "null"): return self._filter(f"{column} IS NULL")
+        return self._filter(f"{column} IS ?", value)
+
+    def order(self, column, desc=False):
+        self.orders.append(f"{column} DESC" if desc else column)
+        return self
+
+    def range(self, start, end):
+        self.limit = (end - start + 1, start)
+        return self
+
+    def upsert(self, records, on_conflict=None):
+        self.action = 'upsert'
+        self.records = [records] if isinstance(records, dict) else list(records)
+        self.on_conflict = on_conflict or SQLITE_UPSERT_KEYS[self.table]
+        return self
+
+    def delete(self):
+        self.action = 'delete'
+        return self
+
+    def execute(self):
+        where = f" WHERE {' AND '.join(self.where)}" if self.where else ""
+        if self.action == 'delete':
+            self.storage.execute(f"DELETE FROM {self.table}{where}", self.params)
+            return SimpleNamespace(data=[], count=None)
+        if self.action == 'upsert':
+            return SimpleNamespace(data=self.storage.upsert(self.table, self.records, self.on_conflict), count=None)
+        sql = f"SELECT {self.columns} FROM {self.table}{where}"
+        if self.orders: sql += f" ORDER BY {', '.join(self.orders)}"
+        if self.limit: sql += f" LIMIT {self.limit[0]} OFFSET {self.limit[1]}"
+        count = self.storage.query(f"SELECT COUNT(*) AS n FROM {self.table}{where}", self.params)[0]['n'] if self.count else None
+        return SimpleNamespace(data=self.storage.query(sql, self.params), count=count)
+
+class SQLiteStorage:
+    """ไฟล์ SQLite ไฟล์เดียว (สร้างตารางให้เองถ้ายังไม่มี) ใช้ connection เดียวร่วมกันทุก thread โดยมี lock กันชนกัน"""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")  # แอปอ่านได้ระหว่าง sync_cli.py เขียน
+            for name, columns in SQLITE_SCHEMA.items():
+                self.conn.execute(f"CREATE TABLE IF NOT EXISTS {name} ({columns})")
+            for i, index in enumerate(SQLITE_INDEXES):
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{index.split()[0]}_{i} ON {index}")
+
+    def table(self, name):
+        return SQLiteQuery(self, name)
+
+    def query(self, sql, params=()):
+        with self.lock:
+            return [dict(r) for r in self.conn.execute(sql, list(params)).fetchall()]
+
+    def execute(self, sql, params=()):
+        with self.lock, self.conn:
+            self.conn.execute(sql, list(params))
+
+    def upsert(self, table, records, on_conflict):
+        if not records: return []
+        columns = list(records[0])
+        key = [c.strip() for c in on_conflict.split(",")]
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c not in key)
+        sql = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+               f"ON CONFLICT ({', '.join(key)}) DO " + (f"UPDATE SET {updates}" if updates else "NOTHING"))
+        with self.lock, self.conn:
+            self.conn.executemany(sql, [[sqlite_value(r.get(c)) for c in columns] for r in records])
+        return records
+
+    def filters(self, query):
+        """WHERE ตามเงื่อนไขของ TableQuery (แบบเดียวกับ TableQuery.build)
+        ร้าน / Platform เทียบแบบตัวพิมพ์ใหญ่ ตรงกับที่ daily_summary จัดกลุ่ม และกับ daily_ads ที่ตัวพิมพ์ไม่ตรงกัน"""
+        where, params = [], []
+        if query.start: where.append(f"{query.date_column} >= ?"); params.append(query.start.strftime('%Y-%m-%d'))
+        if query.end: where.append(f"{query.date_column} <= ?"); params.append(query.end.strftime('%Y-%m-%d'))
+        for column, values in (('platform', query.platforms), ('shop_name', query.shops)):
+            if values: where.append(f"UPPER(TRIM({column})) IN ({', '.join('?' * len(values))})"); params += [str(v).upper().strip() for v in values]
+        return (" WHERE " + " AND ".join(where)) if where else "", params
+
+    def daily_summary(self, query):
+        """รวมจาก orders ด้วย GROUP BY (สูตรเดียวกับ summarize_orders) ไม่ต้องพึ่งตาราง daily_summary"""
+        where, params = self.filters(query)
+        counts = [f"SUM(status = ?) AS {col}" for col in SUMMARY_STATUS_COUNTS]
+        sums = [f"SUM(COALESCE({src}, 0)) AS {col}" for col, src in SUMMARY_SUMS.items()]
+        sql = (f"SELECT created_date, UPPER(TRIM(shop_name)) AS shop_name, UPPER(TRIM(platform)) AS platform, "
+               f"{', '.join(counts + sums)} FROM orders{where}{' AND' if where else ' WHERE'} created_date IS NOT NULL "
+               f"GROUP BY 1, 2, 3 ORDER BY 1, 2, 3")
+        return self.query(sql, list(SUMMARY_STATUS_COUNTS.values()) + params)
+
+    def ads_by_day(self, query):
+        where, params = self.filters(query)
+        sql = (f"SELECT date, SUM(COALESCE(ads_amount, 0)) AS ads_amount, AVG(COALESCE(roas_ads, 0)) AS roas_ads "
+               f"FROM daily_ads{where} GROUP BY date ORDER BY date")
+        return self.query(sql, params)
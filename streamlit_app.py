@@ -3,13 +3,22 @@ import pandas as pd
 import numpy as np
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
 from supabase import create_client, Client
-import io
+import os
+import json
 import datetime
 import calendar
 from datetime import date
-import math
+from types import MappingProxyType
+import threading
+from pyarrow import feather
+from data_access import TableQuery, OrderQuery, SummaryQuery, AdsQuery
+from storage import SupabaseStorage, SQLiteStorage, ads_by_day_frame
+from sync_pipeline import (PARENT_FOLDER_ID, DriveSource, LocalFolderSource, SyncJob, SyncCancelled, collect_sync_files, run_sync, to_cost_frame,
+                           save_sync_report, new_version_stamp, save_data_version,
+                           summarize_orders, orders_to_records, fetch_all_rows, refresh_daily_summary,
+                           ORDER_KEY, IN_FILTER_CHUNK, WRITE_CHUNK, SUMMARY_COLUMNS, SUMMARY_VALUE_COLUMNS,
+                           SUMMARY_STATUS_COUNTS, SUMMARY_ORDER_COLUMNS)
 
 # --- 1. CONFIGURATION & CSS ---
 st.set_page_config(page_title="Dashboard สรุปยอดขาย", layout="wide", page_icon="🛍️")
@@ -81,84 +90,52 @@ st.markdown("""
 # ใช้ @st.cache_resource เพื่อเชื่อมต่อครั้งเดียว ไม่ต้องต่อใหม่ทุกครั้งที่กดปุ่ม
 
 @st.cache_resource
-def init_supabase():
+def init_storage():
+    """ที่เก็บข้อมูล: ตั้ง SQLITE_PATH ใน secrets = ใช้ไฟล์ SQLite ในเครื่อง (ไม่ต้องต่อ network) ไม่งั้นใช้ Supabase"""
     try:
+        if st.secrets.get("SQLITE_PATH"): return SQLiteStorage(st.secrets["SQLITE_PATH"])
         SUPABASE_URL = st.secrets["SUPABASE_URL"]
         SUPABASE_KEY = st.secrets["SUPABASE_KEY"]
-        return create_client(SUPABASE_URL, SUPABASE_KEY)
+        return SupabaseStorage(create_client(SUPABASE_URL, SUPABASE_KEY))
     except Exception as e:
-        st.error(f"❌ Supabase Config Error: {e}")
+        st.error(f"❌ Database Config Error: {e}")
         return None
 
 @st.cache_resource
-def init_drive_service():
+def init_drive_credentials():
     try:
         SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
-        creds = service_account.Credentials.from_service_account_info(
+        return service_account.Credentials.from_service_account_info(
             st.secrets["gcp_service_account"], scopes=SCOPES
         )
+    except Exception as e:
+        st.error(f"❌ Google Drive Config Error: {e}")
+        return None
+
+@st.cache_resource
+def init_drive_service():
+    creds = init_drive_credentials()
+    if creds is None: return None
+    try:
         return build('drive', 'v3', credentials=creds)
     except Exception as e:
         st.error(f"❌ Google Drive Config Error: {e}")
         return None
 
 # Initialize clients
-supabase = init_supabase()
-drive_service = init_drive_service()
-PARENT_FOLDER_ID = '1DJp8gpZ8lntH88hXqYuZOwIyFv3NY4Ot'
+db = init_storage()
+SYNC_SOURCE_DIR = st.secrets.get("SYNC_SOURCE_DIR")  # ตั้งไว้ = Sync จากโฟลเดอร์ในเครื่อง (โครงสร้างเดียวกับ Drive) แทน Google Drive
+drive_credentials = None if SYNC_SOURCE_DIR else init_drive_credentials()
+drive_service = None if SYNC_SOURCE_DIR else init_drive_service()
 
-if not supabase or not drive_service:
+if not db or not (SYNC_SOURCE_DIR or drive_service):
     st.stop()
 
-# --- 2. HELPER FUNCTIONS ---
-
-def list_files_in_folder(folder_id):
-    try:
-        query = f"'{folder_id}' in parents and trashed = false"
-        results = drive_service.files().list(q=query, fields="files(id, name, mimeType)").execute()
-        return results.get('files', [])
-    except: return []
-
-def download_file(file_id):
-    request = drive_service.files().get_media(fileId=file_id)
-    fh = io.BytesIO()
-    downloader = MediaIoBaseDownload(fh, request)
-    done = False
-    while done is False:
-        status, done = downloader.next_chunk()
-    fh.seek(0)
-    return fh
-
-def clean_date(df, col_name):
-    """
-    แปลงข้อมูลเป็นวันที่ (Date Only) ตัดเวลาทิ้ง
-    รองรับทั้ง:
-    - TikTok/Thai: 27/12/2025 (DD/MM/YYYY)
-    - Shopee/ISO:  2026-01-09 00:02 (YYYY-MM-DD HH:MM)
-    """
-    if col_name in df.columns:
-        # 1. แปลงเป็น String และลบช่องว่าง
-        df[col_name] = df[col_name].astype(str).str.strip()
-        # 2. จัดการค่าว่าง
-        df[col_name] = df[col_name].replace({'nan': None, 'None': None, '': None, 'NaT': None})
-        # 3. แปลงเป็น DateTime
-        try:
-            df[col_name] = pd.to_datetime(df[col_name], errors='coerce', dayfirst=True, format='mixed').dt.date
-        except (ValueError, TypeError):
-            df[col_name] = pd.to_datetime(df[col_name], errors='coerce', dayfirst=True).dt.date
-    return df
-
-def clean_text(df, col_name):
-    if col_name in df.columns:
-        df[col_name] = df[col_name].astype(str).str.strip().str.upper()
-    return df
+# จำนวน thread ดาวน์โหลด/ประมวลผลพร้อมกันตอน Sync (ตั้งใน secrets ได้ ถ้าโดน rate limit ให้ลดลง)
+SYNC_MAX_WORKERS = max(1, int(st.secrets.get("SYNC_MAX_WORKERS", 4)))
+SYNC_WORKERS_LIMIT = max(16, SYNC_MAX_WORKERS)  # เพดานของช่องปรับในหน้าเว็บ (ค่าใน secrets สูงกว่า 16 ก็ยังเลือกได้)
 
-def clean_scientific_notation(val):
-    val_str = str(val).strip()
-    if 'E' in val_str or 'e' in val_str:
-        try: return str(int(float(val)))
-        except: return val_str
-    return val_str.replace('.0', '') 
+# --- 2. HELPER FUNCTIONS ---
 
 def format_thai_date(d):
     if not d: return "-"
@@ -168,374 +145,670 @@ def format_thai_date(d):
         return d.strftime('%d/%m/%Y')
     except: return "-"
 
-def get_standard_status(row):
-    try: amt = float(row.get('settlement_amount', 0))
-    except: amt = 0
-    
-    if amt > 0: return "ออเดอร์สำเร็จ"
-    
-    raw_status = str(row.get('status', '')).lower()
-    if any(x in raw_status for x in ['ยกเลิก', 'cancel', 'failed']): return "ยกเลิก"
-    if any(x in raw_status for x in ['returned', 'return', 'ตีกลับ', 'refund']): return "ตีกลับ"
-    
-    shipped = row.get('shipped_date')
-    if shipped and str(shipped) != 'NaT' and str(shipped) != 'None':
-        return "รอดำเนินการ" 
-        
-    return "รอดำเนินการ"
 
 # --- CACHED DATA FETCHING ---
 # ใช้ @st.cache_data เพื่อดึงข้อมูลแล้วเก็บใน RAM 
 # การกดเปลี่ยนวันที่ในหน้าเว็บจะไม่ไปยิง Database ใหม่ แต่จะดึงจาก cache นี้
 
+# การอ่าน Database ทั้งหมดผ่าน query object ใน data_access.py (กรองที่ Database + select เฉพาะคอลัมน์ที่ใช้)
+# Schema ของ orders ในหน่วยความจำ (ใช้ทุกแท็บ): ข้อความซ้ำๆ -> category, วันที่ -> datetime64, เงิน -> float32
+# ตอนรวมยอด (sum) ให้แปลงเงินกลับเป็น float64 ก่อน ไม่งั้นทศนิยมจะคลาดเมื่อยอดใหญ่
+ORDER_MONEY_COLUMNS = ['sales_amount', 'settlement_amount', 'fees', 'affiliate', 'net_profit', 'total_cost', 'unit_cost']
+ORDER_CATEGORY_COLUMNS = ['platform', 'shop_name', 'status', 'sku']
+ORDER_DATE_COLUMNS = ['created_date', 'shipped_date', 'settlement_date']
+
+@st.cache_resource
+def memory_usage_report():
+    """ขนาดในหน่วยความจำของตารางล่าสุดที่โหลด ก่อน/หลังแปลงตาม schema (ใช้ร่วมกันทุก session)"""
+    return {}
+
+def to_orders_frame(rows):
+    """แปลงแถวจาก DB เป็น DataFrame ตาม schema ของ orders (ORDER_*_COLUMNS) ครั้งเดียว แท็บอื่นไม่ต้องแปลงซ้ำ
+    platform / shop_name เป็นตัวพิมพ์ใหญ่, วันที่ว่าง = NaT, ตัวเลขว่าง = 0"""
+    df = pd.DataFrame(rows)
+    if df.empty: return df
+    before = int(df.memory_usage(deep=True).sum())
+    for c in ORDER_MONEY_COLUMNS:
+        if c in df.columns: df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0).astype('float32')
+    if 'quantity' in df.columns: df['quantity'] = pd.to_numeric(df['quantity'], errors='coerce').fillna(0).astype('int32')
+    for c in ORDER_DATE_COLUMNS:
+        if c in df.columns: df[c] = pd.to_datetime(df[c], errors='coerce').dt.normalize()
+    for c in ['shop_name', 'platform']:
+        if c in df.columns: df[c] = df[c].astype(str).str.upper().str.strip()
+    for c in ORDER_CATEGORY_COLUMNS:
+        if c in df.columns: df[c] = df[c].astype('category')
+    memory_usage_report()['orders'] = {'rows': len(df), 'before': before, 'after': int(df.memory_usage(deep=True).sum())}
+    return df
+
 @st.cache_data(ttl=3600)  # <--- แก้เลขตรงนี้เป็น 3600 (หน่วยเป็นวินาที = 60 นาที)
-def fetch_orders_data():
-    """ดึงข้อมูล Orders ทั้งหมดจาก Supabase (Cached)"""
+def fetch_orders_data(versions, query):
+    """ดึง Orders ตาม OrderQuery (ช่วงวันที่ / Platform / ร้านค้า / คอลัมน์) (Cached แยกตามเวอร์ชันข้อมูล + query)
+    ดึงครบทุกแถวด้วยการแบ่งหน้า เพราะ PostgREST ตัดผลลัพธ์ไว้ที่ max-rows ต่อ 1 request
+    ถ้ามี snapshot ของเวอร์ชันล่าสุดบนดิสก์ จะกรองจาก snapshot แทนการยิง Database"""
     try:
-        # แปลงวันที่เป็น String format ที่ Database เข้าใจ
-        # หมายเหตุ: การใช้ st.session_state ใน cache function โดยตรง
-        # อาจทำให้ cache ไม่ update ตามวันที่ ถ้าจะให้ชัวร์ควรส่งวันที่เข้ามาเป็น parameter
-        # แต่ถ้าใช้แบบเดิม ให้มั่นใจว่ากดปุ่ม Sync แล้วจะเคลียร์ cache
-        
-        if 'd_start' not in st.session_state: return pd.DataFrame()
-        
-        start_str = st.session_state.d_start.strftime('%Y-%m-%d')
-        end_str = st.session_state.d_end.strftime('%Y-%m-%d')
-        
-        # สั่งให้ Supabase ส่งมาเฉพาะช่วงวันที่ที่เลือก
-        res = supabase.table("orders").select("*") \
-            .gte("created_date", start_str) \
-            .lte("created_date", end_str) \
-            .execute()
-        return pd.DataFrame(res.data)
+        snapshot = get_snapshot("orders")
+        if snapshot is not None: return query.filter_frame(snapshot)
+        return to_orders_frame(query.fetch(db))
     except Exception as e:
         st.error(f"Error fetching orders: {e}")
         return pd.DataFrame()
 
 @st.cache_data(ttl=3600)
-def fetch_ads_data():
-    """ดึงข้อมูล Ads ทั้งหมด (Cached)"""
+def fetch_daily_summary(versions, start_date, end_date):
+    """ยอดสรุปรายวันต่อร้าน (Cached ตามเวอร์ชันของ orders) คืน None ถ้ายังไม่มีตาราง
+    Supabase อ่านจากตาราง daily_summary, SQLite รวมจาก orders ด้วย SQL"""
+    try:
+        rows = db.daily_summary(SummaryQuery(start_date, end_date, columns=SUMMARY_COLUMNS))
+        df = pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+        df['created_date'] = pd.to_datetime(df['created_date'], errors='coerce').dt.date
+        df[SUMMARY_VALUE_COLUMNS] = df[SUMMARY_VALUE_COLUMNS].apply(pd.to_numeric, errors='coerce').fillna(0)
+        return df
+    except Exception:
+        return None
+
+@st.cache_data(ttl=3600)
+def load_dashboard_cube(versions, start_date, end_date):
+    """ยอดสรุปรายวัน x ร้าน x Platform ของช่วงวันที่ (Cached ตามเวอร์ชันของ orders)
+    เปลี่ยนตัวกรองร้าน/Platform แค่รวมแถวของก้อนนี้ใหม่ ไม่ต้องดึง/สรุปจาก orders ซ้ำ"""
+    summary = fetch_daily_summary(versions, start_date, end_date)
+    if summary is None or summary.empty:
+        # ยังไม่มี daily_summary (ยังไม่ได้ Sync หลังเพิ่มตาราง) -> สรุปจาก orders แทน
+        summary = summarize_orders(fetch_orders_data(versions, OrderQuery(start_date, end_date, columns=SUMMARY_ORDER_COLUMNS)))
+    return summary
+
+def to_ads_frame(rows):
+    """แปลงแถว daily_ads เป็น DataFrame ที่พร้อมใช้ (วันที่ / ตัวเลข / ชื่อร้านตัวพิมพ์ใหญ่) ครั้งเดียวตอนโหลด"""
+    df = pd.DataFrame(rows)
+    if df.empty: return df
+    df['date'] = pd.to_datetime(df['date'], errors='coerce').dt.date
+    for c in ['ads_amount', 'roas_ads']:
+        if c in df.columns: df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0)
+    if 'shop_name' in df.columns: df['shop_name'] = df['shop_name'].astype(str).str.upper().str.strip()
+    return df
+
+@st.cache_data(ttl=3600)
+def fetch_ads_data(query):
+    """ดึงข้อมูล Ads ตาม AdsQuery (ช่วงวันที่ / ร้าน / คอลัมน์) (Cached แยกตาม query)
+    กรองที่ Database และแบ่งหน้าดึงจนครบ (ถ้ามี snapshot เวอร์ชันล่าสุดจะกรองจาก snapshot แทน)"""
     try:
-        res = supabase.table("daily_ads").select("*").range(0, 10000).execute()
-        return pd.DataFrame(res.data)
+        snapshot = get_snapshot("daily_ads")
+        if snapshot is not None: return query.filter_frame(snapshot)
+        return query.filter_frame(to_ads_frame(query.fetch(db)))  # กรองร้านหลังแปลงเป็นตัวพิมพ์ใหญ่ (ดู AdsQuery)
+    except: return pd.DataFrame()
+
+@st.cache_data(ttl=3600)
+def fetch_ads_by_day(query):
+    """ค่า Ads ต่อวันรวมทุกร้านใน AdsQuery สำหรับ Dashboard (Cached แยกตาม query)
+    มี snapshot -> รวมจาก snapshot, ไม่มี -> ให้ storage รวมมาให้ (SQLite ใช้ GROUP BY ไม่ต้องดึงทีละแถว)"""
+    try:
+        snapshot = get_snapshot("daily_ads")
+        if snapshot is not None: return ads_by_day_frame(query.filter_frame(snapshot))
+        return ads_by_day_frame(to_ads_frame(db.ads_by_day(query)))
     except: return pd.DataFrame()
 
 @st.cache_data(ttl=3600)
 def load_cost_data():
     """ดึงข้อมูลต้นทุนสินค้า (Cached)"""
     try:
-        response = supabase.table("product_costs").select("sku, platform, unit_cost").execute()
-        df = pd.DataFrame(response.data)
-        if not df.empty:
-            df['unit_cost'] = pd.to_numeric(df['unit_cost'], errors='coerce').fillna(0)
-            df['platform'] = df['platform'].str.upper().str.strip()
-            df = clean_text(df, 'sku')
-            return df[['sku', 'platform', 'unit_cost']]
-        return pd.DataFrame()
+        snapshot = get_snapshot("product_costs")
+        if snapshot is not None: return snapshot
+        response = db.table("product_costs").select("sku, platform, unit_cost").execute()
+        return to_cost_frame(response.data)
     except: return pd.DataFrame()
 
-def find_header_row(data_io, required_keywords, sheet_name=0):
-    data_io.seek(0)
+# --- DATA VERSION & LOCAL SNAPSHOT ---
+# ทุกครั้งที่เขียนตาราง (Sync / บันทึก Ads / บันทึกต้นทุน) จะเขียนเวอร์ชันใหม่ลง app_meta
+#   app_meta(key text primary key, value text)  -> key = 'version:<ชื่อตาราง>'
+# แอปเก็บสำเนาทั้งตารางไว้ที่ .cache/<ตาราง>.arrow (Arrow IPC ไม่บีบอัด อ่านแบบ memory-map ได้)
+# เปิดแอปใหม่ / Cache หมดอายุ / กดรีเฟรช -> ถ้าเวอร์ชันยังตรงกับ snapshot ก็อ่านจากดิสก์ ไม่ต้องดึงผ่าน HTTP
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+SNAPSHOT_SOURCES = {  # ตาราง -> (query ทั้งตาราง, แปลงแถวเป็น DataFrame)
+    "orders": (OrderQuery(), to_orders_frame),
+    "daily_ads": (AdsQuery(), to_ads_frame),
+    "product_costs": (TableQuery(table="product_costs", columns=('sku', 'platform', 'unit_cost'), order_by=('sku', 'platform')), to_cost_frame),
+}
+SNAPSHOT_FORMAT = "3"  # เปลี่ยนเมื่อ schema ของ DataFrame เปลี่ยน -> snapshot เก่าจะถูกดึงใหม่
+_snapshot_lock = threading.Lock()
+
+@st.cache_resource
+def data_versions():
+    """เลขเวอร์ชันข้อมูลในโปรเซสนี้ (ใช้ร่วมกันทุก session) เผื่อกรณียังไม่มีตาราง app_meta"""
+    return {}
+
+@st.cache_data(ttl=60)
+def fetch_data_versions():
+    """เวอร์ชันข้อมูลของแต่ละตารางจาก app_meta (Cached 1 นาที) คืน {} ถ้ายังไม่มีตาราง"""
     try:
-        preview = pd.read_excel(data_io, sheet_name=sheet_name, header=None, nrows=20, dtype=str)
-        best_row_idx = 0
-        max_matches = 0
-        for i, row in preview.iterrows():
-            row_text = " ".join([str(x).lower().strip() for x in row.values if pd.notna(x)])
-            matches = sum(1 for k in required_keywords if k.lower() in row_text)
-            if matches > max_matches:
-                max_matches = matches
-                best_row_idx = i
-        data_io.seek(0)
-        return best_row_idx if max_matches > 0 else 0
-    except:
-        data_io.seek(0)
-        return 0
-
-def get_col_data(df, candidates):
-    cols_norm = [" ".join(str(c).replace('\n', ' ').split()).lower() for c in df.columns]
-    for cand in candidates:
-        cand_clean = " ".join(cand.split()).lower()
-        if cand_clean in cols_norm:
-            idx = cols_norm.index(cand_clean)
-            return df.iloc[:, idx]
-    return None
-
-# --- 3. PROCESSORS ---
-
-def process_tiktok(order_files, income_files, shop_name):
-    # --- Helper to load income ---
-    def load_tiktok_income(inc_files):
-        income_dfs = []
-        for f in inc_files:
-            if any(ext in f['name'].lower() for ext in ['xlsx', 'xls', 'csv']):
-                try:
-                    data = download_file(f['id'])
-                    if 'csv' in f['name'].lower():
-                        try:
-                            data.seek(0); df = pd.read_csv(data, dtype=str)
-                        except UnicodeDecodeError:
-                            data.seek(0); df = pd.read_csv(data, encoding='cp874', dtype=str)
-                    else:
-                        header_idx = find_header_row(data, ['Order ID', 'Settlement Amount', 'Affiliate Commission'])
-                        df = pd.read_excel(data, header=header_idx, dtype=str)
-                    
-                    inc = pd.DataFrame()
-                    oid = get_col_data(df, ['Order ID', 'Order No', 'หมายเลขคำสั่งซื้อ'])
-                    if oid is None: continue
-                    inc['order_id'] = oid
-                    
-                    settle = get_col_data(df, ['Settlement Amount', 'Payout Amount', 'ยอดเงินที่ได้รับ'])
-                    inc['settlement_amount'] = pd.to_numeric(settle, errors='coerce').fillna(0)
-                    
-                    aff = get_col_data(df, ['Affiliate Commission', 'Affiliate Fee', 'ค่าคอมมิชชั่น'])
-                    inc['affiliate'] = pd.to_numeric(aff, errors='coerce').fillna(0)
-                    
-                    fee = get_col_data(df, ['Platform Fee', 'Transaction Fee', 'ค่าธรรมเนียม'])
-                    inc['fees'] = pd.to_numeric(fee, errors='coerce').fillna(0)
-                    
-                    inc['order_id'] = inc['order_id'].apply(clean_scientific_notation)
-                    income_dfs.append(inc)
-                except Exception as e:
-                    print(f"Error loading income {f['name']}: {e}")
-                    continue
-        
-        if income_dfs:
-            combined_inc = pd.concat(income_dfs, ignore_index=True)
-            return combined_inc.groupby('order_id')[['settlement_amount', 'affiliate', 'fees']].sum().reset_index()
-        return pd.DataFrame()
+        res = db.table("app_meta").select("key, value").like("key", "version:%").execute()
+        return {r['key'].split(':', 1)[1]: r['value'] for r in res.data}
+    except Exception:
+        return {}
+
+def latest_data_version(table):
+    """เวอร์ชันล่าสุดของตารางใน app_meta ตอนนี้ (ไม่ใช้ค่าใน Cache 1 นาที) ใช้ก่อน patch_snapshot
+    ถ้าใช้ค่าเก่าแล้วมีคนอื่น (sync_cli / session / เครื่องอื่น) เขียนไปก่อน จะ patch ทับ snapshot ที่ไม่มีข้อมูลของเขา"""
+    fetch_data_versions.clear()
+    return fetch_data_versions().get(table)
+
+def get_data_version(*tables):
+    """key สำหรับ Cache ที่คำนวณต่อจากข้อมูล: เปลี่ยนทุกครั้งที่ตารางใดตารางหนึ่งถูกเขียน"""
+    remote = fetch_data_versions(); local = data_versions()
+    return tuple((remote.get(t), local.get(t, 0)) for t in tables)
+
+def bump_data_version(*tables, stamp=None, report=st, versions=None):
+    """เรียกทุกครั้งที่เขียนข้อมูลตารางนั้น -> Cache / snapshot ที่ผูกกับเวอร์ชันเดิมจะไม่ถูกใช้อีก
+    report = ที่แจ้งเตือนเมื่อเขียน app_meta ไม่สำเร็จ (thread เบื้องหลังไม่มีหน้าเว็บ ให้ส่ง job มาแทน st)
+    versions = data_versions() ที่ดึงไว้แล้ว (thread เบื้องหลังเรียกฟังก์ชันที่ Cache เองไม่ได้)"""
+    versions = data_versions() if versions is None else versions
+    for t in tables: versions[t] = versions.get(t, 0) + 1
+    save_data_version(db, tables, report, stamp=stamp)
+    fetch_data_versions.clear()
+
+def snapshot_paths(table):
+    path = os.path.join(SNAPSHOT_DIR, f"{table}.arrow")
+    return path, path + ".version"
+
+def read_snapshot(table, version):
+    """อ่าน snapshot บนดิสก์แบบ memory-map ถ้าเป็นเวอร์ชันนี้ (ไม่ตรง / ไม่มีไฟล์ -> None)"""
+    path, version_path = snapshot_paths(table)
+    try:
+        with open(version_path, encoding='utf-8') as f:
+            if f.read() != f"{SNAPSHOT_FORMAT}:{version}": return None
+        return feather.read_table(path, memory_map=True).to_pandas()
+    except Exception:
+        return None
 
-    # --- Load Income Data ---
-    income_master = load_tiktok_income(income_files)
-
-    # --- Read Order Files ---
-    all_orders = []
-    for f in order_files:
-        if any(ext in f['name'].lower() for ext in ['xlsx', 'xls', 'csv']):
-            try:
-                data = download_file(f['id'])
-                if 'csv' in f['name'].lower():
-                    try: data.seek(0); df = pd.read_csv(data, dtype=str)
-                    except UnicodeDecodeError: data.seek(0); df = pd.read_csv(data, encoding='cp874', dtype=str)
-                else:
-                    header_idx = find_header_row(data, ['Order ID', 'Seller SKU', 'Product Name'])
-                    df = pd.read_excel(data, header=header_idx, dtype=str)
-                
-                extracted = pd.DataFrame()
-                oid = get_col_data(df, ['Order ID', 'หมายเลขคำสั่งซื้อ', 'Order Serial No.'])
-                if oid is None: continue
-                extracted['order_id'] = oid
-                extracted['status'] = get_col_data(df, ['Order Status', 'สถานะคำสั่งซื้อ'])
-                if 'status' not in extracted.columns: extracted['status'] = 'สำเร็จ'
-
-                sku = get_col_data(df, ['Seller SKU', 'รหัสสินค้าของผู้ขาย', 'SKU ID'])
-                extracted['sku'] = sku if sku is not None else '-'
-
-                qty = get_col_data(df, ['Quantity', 'จำนวน', 'Qty'])
-                extracted['quantity'] = pd.to_numeric(qty, errors='coerce').fillna(1) if qty is not None else 1
-
-                sales = get_col_data(df, ['SKU Subtotal After Discount', 'Order Amount', 'ยอดคำสั่งซื้อ'])
-                extracted['sales_amount'] = pd.to_numeric(sales, errors='coerce').fillna(0) if sales is not None else 0
-
-                extracted['created_date'] = get_col_data(df, ['Created Time', 'เวลาที่สร้าง'])
-                extracted['shipped_date'] = get_col_data(df, ['Shipped Time', 'เวลาจัดส่ง', 'RTS Time'])
-                
-                track = get_col_data(df, ['Tracking ID', 'หมายเลขติดตามพัสดุ'])
-                extracted['tracking_id'] = track if track is not None else '-'
-                
-                pname = get_col_data(df, ['Product Name', 'ชื่อสินค้า'])
-                extracted['product_name'] = pname if pname is not None else '-'
-
-                extracted['shop_name'] = shop_name
-                extracted['platform'] = 'TIKTOK'
-
-                extracted = clean_date(extracted, 'created_date')
-                extracted = clean_date(extracted, 'shipped_date')
-                extracted['order_id'] = extracted['order_id'].apply(clean_scientific_notation)
-                extracted = clean_text(extracted, 'sku')
-                all_orders.append(extracted)
-
-            except Exception as e:
-                st.error(f"❌ TikTok Order {f['name']}: {e}")
-                continue
-
-    if not all_orders: return pd.DataFrame()
-    final_orders = pd.concat(all_orders, ignore_index=True)
-    
-    # --- Merge with Income Data ---
-    if not income_master.empty:
-        final_orders['order_id'] = final_orders['order_id'].astype(str).str.strip()
-        income_master['order_id'] = income_master['order_id'].astype(str).str.strip()
-        merged = pd.merge(final_orders, income_master, on='order_id', how='left')
-        for col in ['settlement_amount', 'affiliate', 'fees']:
-            if col in merged.columns: merged[col] = merged[col].fillna(0)
-        return merged
-    else:
-        final_orders['settlement_amount'] = 0
-        final_orders['affiliate'] = 0
-        final_orders['fees'] = 0
-        return final_orders
-
-def process_shopee(order_files, income_files, shop_name):
-    all_orders = []
-    income_dfs = []
-
-    # --- Shopee Income ---
-    for f in income_files:
-        if any(x in f['name'].lower() for x in ['xls', 'xlsx']):
-            try:
-                data = download_file(f['id'])
-                header_idx = find_header_row(data, ['หมายเลขคำสั่งซื้อ', 'Order ID'], sheet_name='Income')
-                df = pd.read_excel(data, sheet_name='Income', header=header_idx, dtype=str)
-                
-                inc = pd.DataFrame()
-                inc['order_id'] = get_col_data(df, ['หมายเลขคำสั่งซื้อ', 'Order ID'])
-                inc['settlement_date'] = get_col_data(df, ['วันที่โอนชำระเงินสำเร็จ', 'Payout Completed Date'])
-                inc['settlement_amount'] = pd.to_numeric(get_col_data(df, ['จำนวนเงินทั้งหมดที่โอนแล้ว (฿)', 'Payout Amount']), errors='coerce')
-                inc['original_price'] = pd.to_numeric(get_col_data(df, ['สินค้าราคาปกติ', 'Original Price']), errors='coerce')
-                inc['affiliate'] = pd.to_numeric(get_col_data(df, ['ค่าคอมมิชชั่น', 'Commission Fee']), errors='coerce') 
-                
-                if not inc.empty and 'order_id' in inc.columns:
-                    inc['fees'] = (inc['original_price'].fillna(0) - inc['settlement_amount'].fillna(0))
-                    inc = clean_date(inc, 'settlement_date')
-                    inc['order_id'] = inc['order_id'].apply(clean_scientific_notation)
-                    income_dfs.append(inc)
-            except: pass
-    
-    income_master = pd.concat(income_dfs, ignore_index=True).drop_duplicates(subset=['order_id']) if income_dfs else pd.DataFrame()
-
-    # --- Shopee Orders ---
-    for f in order_files:
-        if any(x in f['name'].lower() for x in ['xls', 'xlsx']):
-            try:
-                data = download_file(f['id'])
-                header_idx = find_header_row(data, ['หมายเลขคำสั่งซื้อ', 'Order ID'])
-                df = pd.read_excel(data, header=header_idx, dtype=str)
-                
-                ext = pd.DataFrame()
-                oid = get_col_data(df, ['หมายเลขคำสั่งซื้อ', 'Order ID'])
-                if oid is None: continue
-                
-                ext['order_id'] = oid
-                ext['status'] = get_col_data(df, ['สถานะการสั่งซื้อ', 'Order Status'])
-                ext['sku'] = get_col_data(df, ['เลขอ้างอิง SKU (SKU Reference No.)', 'SKU Reference No.'])
-                ext['quantity'] = pd.to_numeric(get_col_data(df, ['จำนวน', 'Quantity']), errors='coerce').fillna(1)
-                ext['sales_amount'] = pd.to_numeric(get_col_data(df, ['ราคาขายสุทธิ', 'Net Price', 'ราคาต่อหน่วย']), errors='coerce').fillna(0)
-                ext['tracking_id'] = get_col_data(df, ['หมายเลขติดตามพัสดุ', 'Tracking Number*'])
-                ext['created_date'] = get_col_data(df, ['วันที่ทำการสั่งซื้อ', 'Order Creation Date'])
-                ext['shipped_date'] = get_col_data(df, ['เวลาการชำระสินค้า', 'Payment Time'])
-                ext['product_name'] = get_col_data(df, ['ชื่อสินค้า', 'Product Name'])
-
-                ext['shop_name'] = shop_name
-                ext['platform'] = 'SHOPEE'
-                
-                ext = clean_date(ext, 'created_date')
-                ext = clean_date(ext, 'shipped_date')
-                ext['order_id'] = ext['order_id'].apply(clean_scientific_notation)
-                ext = clean_text(ext, 'sku')
-                
-                all_orders.append(ext)
-            except Exception as e:
-                st.error(f"❌ Shopee {f['name']}: {e}")
-
-    if not all_orders: return pd.DataFrame()
-    final = pd.concat(all_orders, ignore_index=True)
-    
-    if not income_master.empty:
-        return pd.merge(final, income_master, on='order_id', how='left')
-    return final
-
-def process_lazada(order_files, income_files, shop_name):
-    all_orders = []
-    income_dfs = []
-
-    # --- Lazada Income ---
-    for f in income_files:
-        if any(ext in f['name'].lower() for ext in ['xlsx', 'xls']):
-            try:
-                data = download_file(f['id'])
-                header_idx = find_header_row(data, ['Order No.', 'หมายเลขคำสั่งซื้อ', 'Transaction Date', 'วันที่ทำรายการ'])
-                df = pd.read_excel(data, header=header_idx, dtype=str)
-                
-                inc = pd.DataFrame()
-                oid = get_col_data(df, ['Order No.', 'หมายเลขคำสั่งซื้อ', 'Order ID'])
-                if oid is None: continue 
-                inc['order_id'] = oid
-                
-                inc['settlement_date'] = get_col_data(df, ['Transaction Date', 'วันที่ทำรายการ'])
-                amt_col = get_col_data(df, ['Amount (incl. VAT)', 'Amount', 'จำนวนเงิน(รวมภาษี)'])
-                inc['settlement_amount'] = pd.to_numeric(amt_col, errors='coerce').fillna(0)
-                
-                inc['order_id'] = inc['order_id'].apply(clean_scientific_notation)
-                income_dfs.append(inc)
-            except: pass
-
-    income_master = pd.DataFrame()
-    if income_dfs:
-        raw_income = pd.concat(income_dfs, ignore_index=True)
-        income_master = raw_income.groupby('order_id').agg(
-            settlement_amount=('settlement_amount', lambda x: x[x > 0].sum()),
-            fees=('settlement_amount', lambda x: abs(x[x < 0].sum())),
-            settlement_date=('settlement_date', 'first')
-        ).reset_index()
-        income_master = clean_date(income_master, 'settlement_date')
-        income_master['original_price'] = 0
-        income_master['affiliate'] = 0
-        
-    # --- Lazada Orders ---
-    for f in order_files:
-        if any(ext in f['name'].lower() for ext in ['xlsx', 'xls']):
-            try:
-                data = download_file(f['id'])
-                header_idx = find_header_row(data, ['Order Item Id', 'orderNumber', 'หมายเลขคำสั่งซื้อ'])
-                df = pd.read_excel(data, header=header_idx, dtype=str)
-                
-                ext = pd.DataFrame()
-                oid = get_col_data(df, ['orderNumber', 'หมายเลขคำสั่งซื้อ', 'Order Number'])
-                if oid is None: continue
-                
-                ext['order_id'] = oid
-                ext['status'] = get_col_data(df, ['status', 'สถานะ'])
-                ext['sku'] = get_col_data(df, ['sellerSku', 'Seller SKU', 'รหัสสินค้าของร้านค้า'])
-                ext['sales_amount'] = pd.to_numeric(get_col_data(df, ['paidPrice', 'ราคาที่ชำระ', 'Paid Price']), errors='coerce').fillna(0)
-                ext['tracking_id'] = get_col_data(df, ['trackingCode', 'Tracking Code', 'รหัสติดตามพัสดุ'])
-                ext['created_date'] = get_col_data(df, ['createTime', 'Created at', 'เวลาที่สั่งซื้อ'])
-                ext['shipped_date'] = get_col_data(df, ['updateTime', 'Updated at', 'เวลาที่ปรับปรุงล่าสุด']) 
-                ext['product_name'] = get_col_data(df, ['itemName', 'Item Name', 'ชื่อสินค้า'])
-                
-                ext['quantity'] = 1 
-                ext['shop_name'] = shop_name
-                ext['platform'] = 'LAZADA'
-                
-                ext = clean_date(ext, 'created_date')
-                ext = clean_date(ext, 'shipped_date')
-                ext['order_id'] = ext['order_id'].apply(clean_scientific_notation)
-                ext = clean_text(ext, 'sku')
-                all_orders.append(ext)
-            except Exception as e:
-                st.error(f"❌ Lazada Order {f['name']}: {e}")
-
-    if not all_orders: return pd.DataFrame()
-    final_orders = pd.concat(all_orders, ignore_index=True)
-    
-    if not income_master.empty:
-        final_orders['order_id'] = final_orders['order_id'].astype(str).str.strip()
-        income_master['order_id'] = income_master['order_id'].astype(str).str.strip()
-        merged = pd.merge(final_orders, income_master, on='order_id', how='left')
-        for col in ['settlement_amount', 'affiliate', 'fees', 'original_price']:
-            if col in merged.columns: merged[col] = merged[col].fillna(0)
-        return merged
+def write_snapshot(table, version, df):
+    path, version_path = snapshot_paths(table)
+    try:
+        # ลบไฟล์เวอร์ชันก่อน แล้วค่อยเขียนข้อมูล -> ถ้าเขียนไม่จบ รอบหน้าจะดึงใหม่ ไม่ใช้ไฟล์ครึ่งๆ กลางๆ
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        if os.path.exists(version_path): os.remove(version_path)
+        feather.write_feather(df, path + ".tmp", compression='uncompressed')
+        os.replace(path + ".tmp", path)
+        with open(version_path, 'w', encoding='utf-8') as f: f.write(f"{SNAPSHOT_FORMAT}:{version}")
+    except Exception: pass  # เขียนดิสก์ไม่ได้ก็ยังใช้ข้อมูลที่ดึงมาแล้วได้
+
+@st.cache_resource(max_entries=6)
+def load_snapshot(table, version):
+    """ทั้งตารางของเวอร์ชันนี้: อ่านจาก .cache ถ้าเวอร์ชันตรง ไม่งั้นดึงใหม่จาก Supabase แล้วเขียน snapshot ทับ
+    DataFrame ที่ได้ใช้ร่วมกันทุก session ห้ามแก้ค่าในตัวมันโดยตรง"""
+    with _snapshot_lock:
+        df = read_snapshot(table, version)
+        if df is not None: return df
+        query, to_frame = SNAPSHOT_SOURCES[table]
+        df = to_frame(query.fetch(db))
+        write_snapshot(table, version, df)
+        return df
+
+def patch_snapshot(table, old_version, new_version, rows, key):
+    """snapshot เวอร์ชันใหม่ = เวอร์ชันเดิม + แถวที่เพิ่งบันทึก (แทนที่แถว key เดียวกัน) ไม่ต้องดึงทั้งตารางใหม่
+    ถ้าไม่มี snapshot เวอร์ชันเดิมบนดิสก์ก็ไม่ทำอะไร (ครั้งหน้าจะดึงใหม่ตามปกติ)"""
+    with _snapshot_lock:
+        base = read_snapshot(table, old_version) if old_version else None
+        if base is None: return
+        patched = pd.concat([base, rows], ignore_index=True).drop_duplicates(subset=key, keep='last')
+        for c in base.columns[base.dtypes == 'category']: patched[c] = patched[c].astype('category')
+        write_snapshot(table, new_version, patched.sort_values(key, ignore_index=True))
+
+def get_snapshot(table):
+    """snapshot ของตารางตามเวอร์ชันล่าสุดใน app_meta (None = ไม่รู้เวอร์ชัน ให้ดึงจาก Database ตามปกติ)"""
+    version = fetch_data_versions().get(table)
+    if not version: return None
+    try: return load_snapshot(table, version)
+    except Exception: return None
+
+def clear_data_caches():
+    """ล้าง Cache ข้อมูลทั้งหมด (หลัง Sync / กดรีเฟรช) เพื่อให้ดึงข้อมูลใหม่ทันที
+    snapshot บนดิสก์จะถูกดึงใหม่เฉพาะตารางที่เวอร์ชันใน app_meta เปลี่ยนไปแล้ว"""
+    fetch_data_versions.clear()
+    fetch_orders_data.clear()
+    fetch_daily_summary.clear()
+    load_dashboard_cube.clear()
+    fetch_ads_data.clear()
+    fetch_ads_by_day.clear()
+    load_cost_data.clear()
+    build_data_context.clear()
+    load_order_details.clear()
+    dashboard_report_html.clear()
+
+# --- SHARED DATA CONTEXT ---
+# ข้อมูลชุดเดียวที่ทุกแท็บใช้ร่วมกัน สร้างครั้งเดียวต่อ (เวอร์ชันข้อมูล, ช่วงวันที่) และใช้ร่วมกันทุก session
+# DataFrame ในนี้ห้ามแก้ค่าโดยตรง ให้กรองแถว / .assign() เป็นตัวใหม่แทน (copy-on-write ไม่ copy ข้อมูลจริงจนกว่าจะแก้)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)  # pandas 3 เปิดไว้อยู่แล้ว
+
+@st.cache_resource(max_entries=8)
+def build_data_context(versions, start_date, end_date):
+    orders = fetch_orders_data(versions, OrderQuery(start_date, end_date))
+    shops = sorted(orders['shop_name'].dropna().unique().tolist()) if 'shop_name' in orders.columns else []
+    return MappingProxyType({'versions': versions, 'orders': orders, 'order_shops': shops})
+
+def data_context(start_date, end_date):
+    """orders ของช่วงวันที่ + รายชื่อร้าน (อ่านอย่างเดียว)"""
+    return build_data_context(get_data_version("orders"), start_date, end_date)
+
+# --- 4. SYNC & COST UPDATE ---
+# ขั้นตอน Sync ทั้งหมด (อ่านไฟล์ / ประมวลผล / เขียน Database) อยู่ใน sync_pipeline.py ใช้ร่วมกับ sync_cli.py
+# ส่วนนี้มีแค่งานที่ผูกกับแอป: รัน Sync ใน thread เบื้องหลัง และคำนวณกำไรใหม่ตอนแก้ต้นทุน
+# จบทุกรอบจะเขียนเวลา / จำนวนแถวของแต่ละขั้น (job.profile) เป็น JSON ไว้ที่ .cache/sync_reports ไว้เทียบข้ามรอบ
+
+SYNC_POLL_SECONDS = 2
+SYNC_REPORT_DIR = os.path.join(SNAPSHOT_DIR, "sync_reports")
+PROFILE_LABELS = {'stage': 'ขั้น', 'shop': 'ร้าน', 'count': 'ครั้ง', 'seconds': 'วินาที', 'rows_in': 'แถวเข้า', 'rows_out': 'แถวออก', 'peak_mb': 'Peak MB'}
+
+def diff_costs(old, new):
+    """เทียบตารางต้นทุนก่อน/หลังแก้ไข key = (sku, platform)
+    คืน (แถวที่เพิ่มใหม่หรือราคาเปลี่ยน, แถว sku/platform ที่ถูกลบออกจากตาราง)"""
+    key = lambda df: pd.MultiIndex.from_arrays([df['sku'].astype(str), df['platform'].fillna('').astype(str)])
+    new = new.drop_duplicates(subset=['sku', 'platform'], keep='last')
+    old_cost = pd.Series(pd.to_numeric(old['unit_cost'], errors='coerce').fillna(0).to_numpy(dtype=float), index=key(old))
+    old_cost = old_cost[~old_cost.index.duplicated(keep='last')]
+    new_cost = pd.to_numeric(new['unit_cost'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    prev = old_cost.reindex(key(new)).to_numpy()
+    mask = np.isnan(prev) | ~np.isclose(new_cost, np.nan_to_num(prev))
+    changed = new.loc[mask].assign(unit_cost=new_cost[mask])
+    removed = old.loc[~key(old).isin(key(new)), ['sku', 'platform']].drop_duplicates()
+    return changed[['sku', 'platform', 'unit_cost']], removed
+
+def apply_cost_changes(costs):
+    """คำนวณ total_cost / net_profit ใหม่เฉพาะแถว orders ที่มี sku/platform ตาม costs (sku, platform, unit_cost)
+    สูตรเดียวกับตอน Sync: total_cost = quantity x unit_cost, net_profit = settlement_amount - total_cost
+    เขียนกลับเฉพาะแถวที่ค่าเปลี่ยนจริง (ล้าง row_hash) แล้วอัปเดต daily_summary ของวัน/ร้านนั้น คืนแถวที่เขียน (ทั้งแถว)"""
+    skus = costs['sku'].astype(str).unique().tolist()
+    rows = []
+    for i in range(0, len(skus), IN_FILTER_CHUNK):
+        chunk = skus[i:i+IN_FILTER_CHUNK]
+        rows += fetch_all_rows(lambda: db.table("orders").select("*").in_("sku", chunk).order("id"))
+    orders = pd.DataFrame(rows)
+    if orders.empty: return orders
+    new_cost = costs.drop_duplicates(subset=['sku', 'platform'], keep='last').rename(columns={'unit_cost': 'new_unit_cost'})
+    orders = orders.merge(new_cost[['sku', 'platform', 'new_unit_cost']], on=['sku', 'platform'], how='inner')
+    num = lambda c: pd.to_numeric(orders[c], errors='coerce').fillna(0).astype(float) if c in orders.columns else pd.Series(0.0, index=orders.index)
+    unit_cost = orders.pop('new_unit_cost').astype(float)
+    total_cost = num('quantity') * unit_cost
+    net_profit = num('settlement_amount') - total_cost
+    same = np.isclose(unit_cost, num('unit_cost')) & np.isclose(total_cost, num('total_cost')) & np.isclose(net_profit, num('net_profit'))
+    orders = orders.assign(unit_cost=unit_cost, total_cost=total_cost, net_profit=net_profit).loc[~same]
+    if orders.empty: return orders
+    # row_hash เดิมเป็นของค่าก่อนแก้ต้นทุน -> ล้างทิ้ง Sync รอบหน้าจะเขียนแถวนี้ใหม่พร้อม hash ที่ถูกต้อง (ไม่เทียบกับ hash เก่า)
+    if 'row_hash' in orders.columns: orders = orders.assign(row_hash=None)
+
+    records = orders_to_records(orders)
+    for i in range(0, len(records), WRITE_CHUNK):
+        db.table("orders").upsert(records[i:i+WRITE_CHUNK], on_conflict=",".join(ORDER_KEY)).execute()
+    refresh_daily_summary(db, orders[['created_date', 'shop_name']])
+    return orders
+
+@st.cache_resource
+def sync_jobs():
+    """งาน Sync ล่าสุดของทั้งแอป (ใช้ร่วมกันทุก session): {'current': SyncJob, 'lock': Lock}"""
+    return {'current': None, 'lock': threading.Lock()}
+
+def start_sync_job(full, max_workers, trace_memory=False):
+    """เริ่ม Sync ใน thread เบื้องหลัง (ได้ทีละงาน ถ้ามีงานที่กำลังรันอยู่จะคืนงานนั้นแทน)
+    ปิด / รีเฟรชหน้าเว็บระหว่าง Sync งานก็ยังเดินต่อจนจบ
+    ต้นทุน / เวอร์ชันข้อมูลโหลดที่นี่ (thread ของหน้าเว็บ) แล้วส่งเป็นค่าธรรมดา เพราะ thread เบื้องหลังไม่มี ScriptRunContext
+    เรียกฟังก์ชันที่ st.cache_data / st.cache_resource ไม่ได้ (ล้าง Cache ด้วย .clear() ได้)"""
+    jobs = sync_jobs()
+    with jobs['lock']:
+        job = jobs['current']
+        if job is not None and job.state == 'running': return job
+        job = SyncJob(full, max_workers, trace_memory=trace_memory)
+        jobs['current'] = job
+    args = (job, load_cost_data(), data_versions())
+    threading.Thread(target=run_sync_job, args=args, name="sync-job", daemon=True).start()
+    return job
+
+def run_sync_job(job, cost_df, versions):
+    try:
+        if SYNC_SOURCE_DIR:
+            source = LocalFolderSource(SYNC_SOURCE_DIR)
+        else:
+            job.text("⏳ กำลังเชื่อมต่อ Google Drive...")
+            source = DriveSource(drive_credentials, PARENT_FOLDER_ID, service=drive_service)
+        plan = collect_sync_files(source.folders())
+        job.text("⏳ กำลังตรวจสอบไฟล์ที่เปลี่ยน...")
+        job.stats = run_sync(db, source, plan, job, job.full, job.max_workers, cost_df=cost_df)
+        job.state = 'failed' if any(level == 'error' for level, _ in job.logs) else 'done'
+        if job.state == 'done' and job.stats is not None: job.text("✅ Sync สำเร็จ!")
+    except SyncCancelled:
+        for shop_name in job.shops:
+            if shop_name not in job.finished_shops: job.set_shop(shop_name, "⏹️ ยกเลิก")
+        job.state = 'cancelled'
+        job.text("⏹️ ยกเลิกแล้ว (ร้านที่บันทึกเสร็จแล้วจะถูกข้ามในการ Sync รอบถัดไป)")
+    except Exception as e:
+        job.state = 'failed'
+        job.error(f"❌ {e}")
+    finally:
+        if job.committed:
+            # ข้อมูลเปลี่ยนแล้ว (แม้จะไม่ครบทุกร้าน) -> ทุก session ต้องเห็นข้อมูลใหม่
+            bump_data_version("orders", report=job, versions=versions)
+            clear_data_caches()
+        job.profile.finish()
+        job.finished_at = datetime.datetime.now()
+        try: job.report_path = save_sync_report(job, os.path.join(SYNC_REPORT_DIR, f"sync_{job.started_at:%Y%m%d_%H%M%S}.json"))
+        except Exception as e: job.warning(f"⚠️ บันทึกรายงานเวลา Sync ไม่สำเร็จ: {e}")
+
+# --- 5. REPORT RENDERING ---
+# จัดรูปแบบตัวเลขทีละคอลัมน์ แล้วต่อ HTML ทั้งตารางในครั้งเดียว (ไม่วน iterrows ทีละแถว / ทีละช่อง)
+# ผลลัพธ์ Cache ตามเวอร์ชันข้อมูล + ตัวกรอง rerun ด้วยค่าเดิมจึงไม่ต้อง render ใหม่เลย
+
+H_BLUE = "#1e3c72"; H_CYAN = "#22b8e6"; H_ORANGE = "#e67e22"; H_GREEN = "#27ae60"
+OPS_COST_PER_ORDER = 10.0  # ค่าดำเนินการต่อออเดอร์ (บาท)
+DASHBOARD_ADS_COLUMNS = ['date', 'ads_amount', 'roas_ads']  # คอลัมน์ที่ Dashboard ใช้จริง (ดึงเฉพาะนี้)
+DETAIL_ORDER_COLUMNS = ['order_id', 'product_name', 'sku', 'created_date', 'settlement_date', 'sales_amount',
+                        'settlement_amount', 'fees', 'affiliate', 'unit_cost', 'total_cost']
+DETAIL_PAGE_SIZES = [25, 50, 100, 200]
+DETAIL_SORTS = {  # ชื่อที่แสดง -> (คอลัมน์, ascending)
+    "วันที่ล่าสุดก่อน": (['created_date', 'order_id'], [False, False]),
+    "วันที่เก่าสุดก่อน": (['created_date', 'order_id'], [True, True]),
+    "ยอดขายมากสุดก่อน": (['sales'], [False]),
+    "กำไรสุทธิมากสุดก่อน": (['net_profit'], [False]),
+    "กำไรสุทธิน้อยสุดก่อน": (['net_profit'], [True]),
+}
+
+def red_negatives(values, text):
+    """ครอบค่าติดลบด้วย span สีแดง (ทั้งคอลัมน์)"""
+    return text.where(~(values < 0), '<span class="text-red">' + text + '</span>')
+
+def fmt_money_col(values):
+    """1,234.50 ทั้งคอลัมน์ ติดลบเป็นตัวแดง"""
+    v = pd.Series(values, dtype=float).reset_index(drop=True)
+    return red_negatives(v, v.map('{:,.2f}'.format))
+
+def fmt_pct_col(num, div):
+    """num / div เป็น % ทั้งคอลัมน์ (div <= 0 -> 0.0%) ติดลบเป็นตัวแดง"""
+    num = np.asarray(num, dtype=float); div = np.asarray(div, dtype=float)
+    v = pd.Series(np.divide(num * 100, div, out=np.zeros_like(num), where=div > 0))
+    return red_negatives(v, v.map('{:.1f}%'.format))
+
+def fmt_thai_date_col(values):
+    """dd/mm/yyyy ทั้งคอลัมน์ (ค่าว่าง -> "-") แบบเดียวกับ format_thai_date"""
+    return pd.to_datetime(pd.Series(values).reset_index(drop=True), errors='coerce').dt.strftime('%d/%m/%Y').fillna("-")
+
+def html_rows(cells, row_open="<tr>"):
+    """ต่อ list ของคอลัมน์ (Series ของ '<td>...</td>') เป็น HTML ทุกแถวในครั้งเดียว"""
+    rows = pd.Series(row_open, index=cells[0].index)
+    for c in cells: rows = rows + c
+    return "".join((rows + "</tr>").tolist())
+
+def td(text, cls="num"):
+    return f'<td class="{cls}">' + text + '</td>'
+
+def build_dashboard_calc(orders_version, start_date, end_date, shops, platforms):
+    """ตัวเลขรายวันของ Dashboard ตามตัวกรอง (คืน None ถ้าไม่มีข้อมูลในช่วงนี้)"""
+    summary_df = load_dashboard_cube(orders_version, start_date, end_date)
+    if summary_df.empty: return None
+    # A. เตรียมข้อมูล Ads (กรองช่วงวันที่ / ร้านที่ Database แล้ว)
+    ads_grouped = fetch_ads_by_day(AdsQuery(start_date, end_date, shops=shops, columns=DASHBOARD_ADS_COLUMNS)) \
+        .rename(columns={'date': 'created_date', 'ads_amount': 'manual_ads', 'roas_ads': 'manual_roas'})
+
+    # B. ยอดสรุปรายวันของร้าน/Platform ที่เลือก (ชื่อเป็นตัวพิมพ์ใหญ่ตั้งแต่ตอนสรุปแล้ว)
+    mask = (summary_df['created_date'] >= start_date) & (summary_df['created_date'] <= end_date) & \
+           summary_df['platform'].isin(platforms)
+    if shops: mask &= summary_df['shop_name'].isin(shops)
+    dates_df = pd.DataFrame({'created_date': pd.date_range(start=start_date, end=end_date).date})
+    daily = summary_df.loc[mask].groupby('created_date')[SUMMARY_VALUE_COLUMNS].sum().reset_index()
+
+    # Merge Everything
+    calc = pd.merge(dates_df, daily, on='created_date', how='left').fillna(0)
+    if not ads_grouped.empty:
+        calc = pd.merge(calc, ads_grouped, on='created_date', how='left').fillna(0)
     else:
-        for col in ['settlement_amount', 'affiliate', 'fees', 'original_price']:
-            final_orders[col] = 0
-        return final_orders
+        calc['manual_ads'] = 0
+        calc['manual_roas'] = 0
+
+    # C. Calculations (สูตรคำนวณ ทำทีละคอลัมน์ทั้งตาราง)
+    calc['total_orders'] = calc[list(SUMMARY_STATUS_COUNTS)].sum(axis=1)
+    calc['กำไร'] = calc['sales_sum'] - calc['cost_sum'] - calc['fees_sum'] - calc['affiliate_sum']
+    calc['ADS VAT 7%'] = calc['manual_ads'] * 0.07
+    calc['ค่าแอดรวม'] = calc['manual_ads'] + calc['manual_roas'] + calc['ADS VAT 7%']
+    has_ads = calc['ค่าแอดรวม'] > 0
+    calc['ROAS'] = np.where(has_ads, calc['sales_sum'] / calc['ค่าแอดรวม'].where(has_ads), 0)
+    calc['ค่าดำเนินการ'] = calc['total_orders'] * OPS_COST_PER_ORDER
+    calc['กำไรสุทธิ'] = calc['กำไร'] - calc['ค่าแอดรวม'] - calc['ค่าดำเนินการ']
+    return calc
+
+def dashboard_cells(calc, net_profit_cell):
+    """คอลัมน์ของตาราง Dashboard ตามลำดับหัวตาราง (ใช้ทั้งแถวรายวันและแถวรวม)"""
+    sales = calc['sales_sum']
+    money = lambda c: td(fmt_money_col(calc[c]))
+    pct = lambda c: td(fmt_pct_col(calc[c], sales))
+    count = lambda c: td(calc[c].astype(int).astype(str).reset_index(drop=True))
+    return [
+        count('total_orders'), count('success_count'), count('pending_count'), count('return_count'), count('cancel_count'),
+        money('sales_sum'), money('ROAS'), money('manual_roas'),
+        money('cost_sum'), pct('cost_sum'), money('fees_sum'), pct('fees_sum'),
+        money('affiliate_sum'), pct('affiliate_sum'), money('กำไร'), pct('กำไร'),
+        money('manual_ads'), money('ADS VAT 7%'), money('ค่าแอดรวม'), pct('ค่าแอดรวม'),
+        money('ค่าดำเนินการ'), pct('ค่าดำเนินการ'),
+        net_profit_cell, pct('กำไรสุทธิ'),
+    ]
+
+def render_dashboard_html(calc):
+    """HTML ตาราง Dashboard ทั้งตาราง (แถวรายวัน + แถวรวม)"""
+    header = f"""
+    <div class="custom-table-wrapper">
+    <table class="report-table">
+        <thead>
+            <tr>
+                <th style="background-color: {H_BLUE}; min-width: 85px;">วันที่</th>
+                <th style="background-color: {H_BLUE};">จำนวนออเดอร์</th>
+                <th style="background-color: {H_BLUE};">ออเดอร์สำเร็จ</th>
+                <th style="background-color: {H_BLUE};">รอดำเนินการ</th>
+                <th style="background-color: {H_BLUE};">ตีกลับ</th>
+                <th style="background-color: {H_BLUE};">ยกเลิก</th>
+                <th style="background-color: {H_BLUE};">ยอดขายรวม</th>
+                <th style="background-color: {H_CYAN};">ROAS</th>
+                <th style="background-color: {H_CYAN};">ROAS ADS</th>
+                <th style="background-color: {H_BLUE};">ทุนรวม</th>
+                <th style="background-color: {H_BLUE};">%ทุนรวม</th>
+                <th style="background-color: {H_BLUE};">ค่าธรรมเนียม</th>
+                <th style="background-color: {H_BLUE};">%ค่าธรรมเนียม</th>
+                <th style="background-color: {H_BLUE};">ค่าแอฟฟิลิเอต</th>
+                <th style="background-color: {H_BLUE};">%ค่าแอฟฟิลิเอต</th>
+                <th style="background-color: {H_BLUE};">กำไร</th>
+                <th style="background-color: {H_BLUE};">%กำไร</th>
+                <th style="background-color: {H_ORANGE};">ค่าADS</th>
+                <th style="background-color: {H_ORANGE};">ADS VAT 7%</th>
+                <th style="background-color: {H_ORANGE};">ค่าแอดรวม</th>
+                <th style="background-color: {H_BLUE};">%ค่าแอด</th>
+                <th style="background-color: {H_BLUE};">ค่าดำเนินการ</th>
+                <th style="background-color: {H_BLUE};">%ค่าดำเนินการ</th>
+                <th style="background-color: {H_GREEN}; min-width: 120px;">กำไรสุทธิ</th>
+                <th style="background-color: {H_BLUE};">%กำไรสุทธิ</th>
+            </tr>
+        </thead>
+        <tbody>
+    """
+
+    # แถวรายวัน: กำไรสุทธิมีแถบสีเขียวตามสัดส่วนกับวันที่กำไรสูงสุด
+    net_profit = calc['กำไรสุทธิ'].reset_index(drop=True)
+    max_profit = net_profit.max()
+    if max_profit <= 0: max_profit = 1
+    bar_width = (net_profit / max_profit * 100).clip(upper=100).where(net_profit > 0, 0)
+    bar_html = ('<div class="bar-container" style="width: ' + bar_width.astype(str) + '%;"></div>').where(bar_width > 0, "")
+    net_cell = '<td class="num font-bold relative-cell"><span class="cell-content">' + fmt_money_col(net_profit) + '</span>' + bar_html + '</td>'
+    body = html_rows([td(fmt_thai_date_col(calc['created_date']), "txt")] + dashboard_cells(calc, net_cell))
+
+    # แถวรวม: ยอดรวมทุกคอลัมน์ ยกเว้น ROAS (คิดจากยอดรวม) และ ROAS ADS (ค่าเฉลี่ย)
+    totals = calc.drop(columns=['created_date']).sum().to_frame().T
+    sum_ads_total = totals.at[0, 'ค่าแอดรวม']
+    totals['ROAS'] = (totals['sales_sum'] / sum_ads_total) if sum_ads_total > 0 else 0
+    totals['manual_roas'] = calc['manual_roas'].mean() if len(calc) > 0 else 0
+    total_cells = [td(pd.Series(["รวม"]), "txt")] + dashboard_cells(totals, td(fmt_money_col(totals['กำไรสุทธิ'])))
+    total_row = html_rows(total_cells, '<tr class="total-row">')
+
+    return header.replace('\n', '') + body + total_row + "</tbody></table></div>"
+
+def fmt_ratio_col(num, div):
+    """num / div เป็น % ทั้งคอลัมน์แบบตารางรายละเอียด (div = 0 -> 0.0%, ไม่ทำตัวแดง)"""
+    num = np.asarray(num, dtype=float); div = np.asarray(div, dtype=float)
+    return pd.Series(np.divide(num * 100, div, out=np.zeros_like(num), where=div != 0)).map('{:,.1f}%'.format)
+
+@st.cache_resource(max_entries=16)
+def load_order_details(versions, start_date, end_date, platform):
+    """รายการสินค้า + ยอดรวมต่อออเดอร์ของ Platform / ช่วงวันที่ (Cached ร่วมกันทุก session อ่านอย่างเดียว)
+    ยอดต่อออเดอร์คิดครั้งเดียวด้วย groupby เปลี่ยนหน้า / การเรียงไม่ต้องคำนวณใหม่"""
+    items = fetch_orders_data(versions, OrderQuery(start_date, end_date, platforms=(platform,), columns=DETAIL_ORDER_COLUMNS))
+    if items.empty: return items, pd.DataFrame()
+    items = items.astype({c: 'float64' for c in ORDER_MONEY_COLUMNS if c in items.columns})  # รวมยอดด้วย float64
+
+    orders = items.groupby('order_id', sort=False).agg(
+        created_date=('created_date', 'first'),
+        settlement_date=('settlement_date', 'first'),
+        sales=('sales_amount', 'sum'),
+        fees=('fees', 'sum'),
+        affiliate=('affiliate', 'sum'),
+        settlement=('settlement_amount', 'sum'),
+        cost=('total_cost', 'sum'),
+        num_items=('order_id', 'size'),
+    ).reset_index()
+    orders['ops_cost'] = OPS_COST_PER_ORDER
+    orders['net_profit'] = orders['sales'] - orders['cost'] - orders['fees'] - orders['affiliate'] - orders['ops_cost']
+    return items, orders
+
+def render_order_details_html(items, page_orders, total_sales, total_net_profit):
+    """HTML ตารางรายละเอียดเฉพาะออเดอร์ในหน้านี้ (1 แถวต่อสินค้า ช่องยอดรวมของออเดอร์ใช้ rowspan)"""
+    cell = 'border:1px solid #333;'
+    html = f"""
+    <table style="width:100%; border-collapse: collapse; font-size: 13px; color: white;">
+        <thead>
+            <tr>
+                <th style="background-color: {H_BLUE}; padding: 8px; border: 1px solid #444;">วันที่ทำการสั่งซื้อ</th>
+                <th style="background-color: {H_BLUE}; padding: 8px; border: 1px solid #444;">เลขคำสั่งซื้อ</th>
+                <th style="background-color: {H_BLUE}; padding: 8px; border: 1px solid #444;">ชื่อสินค้า</th>
+                <th style="background-color: {H_BLUE}; padding: 8px; border: 1px solid #444;">รหัสสินค้า</th>
+                <th style="background-color: {H_BLUE}; padding: 8px; border: 1px solid #444;">ยอดขาย</th>
+                <th style="background-color: {H_CYAN}; padding: 8px; border: 1px solid #444;">ทุน</th>
+                <th style="background-color: {H_BLUE}; padding: 8px; border: 1px solid #444;">%ทุน</th>
+                <th style="background-color: {H_BLUE}; padding: 8px; border: 1px solid #444;">ค่าธรรมเนียม</th>
+                <th style="background-color: {H_BLUE}; padding: 8px; border: 1px solid #444;">%ค่าธรรมเนียม</th>
+                <th style="background-color: {H_BLUE}; padding: 8px; border: 1px solid #444;">ค่าแอฟฟิลิเอต</th>
+                <th style="background-color: {H_BLUE}; padding: 8px; border: 1px solid #444;">%ค่าแอฟฟิลิเอต</th>
+                <th style="background-color: {H_BLUE}; padding: 8px; border: 1px solid #444;">ค่าดำเนินการ</th>
+                <th style="background-color: {H_BLUE}; padding: 8px; border: 1px solid #444;">%ค่าดำเนินการ</th>
+                <th style="background-color: {H_BLUE}; padding: 8px; border: 1px solid #444;">วันที่ได้รับเงิน</th>
+                <th style="background-color: {H_BLUE}; padding: 8px; border: 1px solid #444;">ยอดเงินที่ได้รับจริง</th>
+                <th style="background-color: {H_GREEN}; padding: 8px; border: 1px solid #444;">กำไรสุทธิ</th>
+                <th style="background-color: {H_GREEN}; padding: 8px; border: 1px solid #444;">%กำไรสุทธิ</th>
+            </tr>
+        </thead>
+        <tbody>
+    """.replace('\n', '')
+
+    # สินค้าของออเดอร์ในหน้านี้ เรียงตามลำดับออเดอร์ในหน้า แล้วตามลำดับเดิมในออเดอร์
+    page_orders = page_orders.reset_index(drop=True)
+    rank = pd.Series(page_orders.index, index=page_orders['order_id'])
+    rows = items[items['order_id'].isin(rank.index)].copy()
+    rows['_rank'] = rows['order_id'].map(rank)
+    rows = rows.sort_values('_rank', kind='stable').reset_index(drop=True)
+    o = page_orders.loc[rows['_rank']].reset_index(drop=True)  # ยอดของออเดอร์ ต่อแถวสินค้า
+    first = ~rows['_rank'].duplicated()
+
+    span = '<td rowspan="' + o['num_items'].astype(str) + '" style="' + cell
+    only_first = lambda text: text.where(first, "")
+    bg = pd.Series(np.where(rows['_rank'] % 2 == 0, "#1c1c1c", "#262626"))
+    cells = [
+        only_first(span + ' text-align:center; vertical-align:middle;">' + fmt_thai_date_col(o['created_date']) + '</td>'),
+        only_first(span + ' text-align:center; vertical-align:middle;">' + o['order_id'].astype(str) + '</td>'),
+        f'<td style="{cell} padding:5px;">' + rows['product_name'].astype(object).fillna('-').astype(str) + '</td>',
+        f'<td style="{cell} text-align:center;">' + rows['sku'].astype(object).fillna('-').astype(str) + '</td>',
+        only_first(span + ' text-align:right;">' + fmt_money_col(o['sales']) + '</td>'),
+        f'<td style="{cell} text-align:right;">' + fmt_money_col(rows['unit_cost']) + '</td>',
+        f'<td style="{cell} text-align:center;">' + fmt_ratio_col(rows['unit_cost'], rows['sales_amount']) + '</td>',
+        only_first(
+            span + ' text-align:right;">' + fmt_money_col(o['fees']) + '</td>'
+            + span + ' text-align:center;">' + fmt_ratio_col(o['fees'], o['sales']) + '</td>'
+            + span + ' text-align:right;">' + fmt_money_col(o['affiliate']) + '</td>'
+            + span + ' text-align:center;">' + fmt_ratio_col(o['affiliate'], o['sales']) + '</td>'
+            + span + ' text-align:right;">' + fmt_money_col(o['ops_cost']) + '</td>'
+            + span + ' text-align:center;">' + fmt_ratio_col(o['ops_cost'], o['sales']) + '</td>'
+            + span + ' text-align:center;">' + fmt_thai_date_col(o['settlement_date']) + '</td>'
+            + span + ' text-align:right;">' + fmt_money_col(o['settlement']) + '</td>'
+            + span + ' text-align:right; font-weight:bold;">' + fmt_money_col(o['net_profit']) + '</td>'
+            + span + ' text-align:center;">' + fmt_ratio_col(o['net_profit'], o['sales']) + '</td>'
+        ),
+    ]
+    row_open = '<tr style="background-color: ' + bg + ';" onmouseover="this.style.backgroundColor=\'#333333\'" onmouseout="this.style.backgroundColor=\'' + bg + '\'">'
+    body = html_rows(cells, row_open)
+
+    total_row = f"""
+    <tr style="background-color: #010538; font-weight: bold;">
+        <td colspan="4" style="text-align: center; padding: 10px; border-top: 2px solid #555;">รวมทั้งหมด</td>
+        <td style="text-align: right; border-top: 2px solid #555;">{fmt_money_col([total_sales])[0]}</td>
+        <td colspan="10" style="border-top: 2px solid #555;"></td>
+        <td style="text-align: right; border-top: 2px solid #555;">{fmt_money_col([total_net_profit])[0]}</td>
+        <td style="text-align: center; border-top: 2px solid #555;">{fmt_ratio_col([total_net_profit], [total_sales])[0]}</td>
+    </tr>
+    """.replace('\n', '')
+    return html + body + total_row + "</tbody></table>"
+
+@st.cache_data(ttl=3600, max_entries=64)
+def dashboard_report_html(orders_version, ads_version, start_date, end_date, shops, platforms):
+    """HTML ตาราง Dashboard (Cached ตามเวอร์ชันข้อมูล + ตัวกรอง) คืน None ถ้าไม่มีข้อมูล
+    เวอร์ชันใช้เป็นแค่ key ของ Cache: ข้อมูลถูกเขียนใหม่ -> เวอร์ชันเปลี่ยน -> render ใหม่
+    ก้อนยอดสรุป (load_dashboard_cube) ผูกกับเวอร์ชันของ orders อย่างเดียว บันทึก Ads แล้วไม่ต้องดึงยอดสรุปใหม่"""
+    calc = build_dashboard_calc(orders_version, start_date, end_date, shops, platforms)
+    if calc is None: return None
+    return render_dashboard_html(calc)
 
 # ==========================================
 # SIDEBAR: SYNC SYSTEM
 # ==========================================
+def render_sync_job(job):
+    """สถานะงาน Sync ล่าสุด: ระหว่างรันจะอ่านสถานะใหม่ทุก SYNC_POLL_SECONDS วินาที (เฉพาะส่วนนี้ ไม่ rerun ทั้งหน้า)"""
+    @st.fragment(run_every=SYNC_POLL_SECONDS if job.state == 'running' else None)
+    def sync_status():
+        total = len(job.shops)
+        if job.state == 'running':
+            st.progress(len(job.finished_shops) / total if total else 0.0, text=job.message)
+            if st.button("⏹️ ยกเลิก Sync", use_container_width=True, disabled=job.cancelled):
+                job.cancel()
+                job.text("⏹️ กำลังยกเลิก (รอร้านที่กำลังบันทึกให้เสร็จก่อน)...")
+        elif job.state == 'done' and job.stats is not None:
+            last = job.stats
+            st.success(
+                f"✅ Sync สำเร็จ! ({last['rows']} รายการ)\n\n"
+                f"เพิ่ม {last['inserted']} · แก้ไข {last['updated']} · ลบ {last['deleted']} · ไม่เปลี่ยน {last['unchanged']}"
+            )
+        elif job.state == 'done': st.success(job.message)
+        else: st.warning(job.message if job.state == 'cancelled' else "⚠️ Sync ไม่สำเร็จ (กด Sync อีกครั้งเพื่อทำต่อเฉพาะร้านที่ยังไม่เสร็จ)")
+
+        if total:
+            st.dataframe(pd.DataFrame(list(job.shops.items()), columns=['ร้าน', 'สถานะ']), hide_index=True, use_container_width=True)
+        for level, msg in job.logs[-10:]:
+            (st.error if level == 'error' else st.warning)(msg)
+        if job.state != 'running' and job.profile.records: render_sync_profile(job)
+
+        # งานจบระหว่างที่หน้านี้เปิดอยู่ -> rerun ทั้งหน้าครั้งเดียวเพื่อโหลดข้อมูลใหม่
+        finished_key = f"sync_seen_{job.started_at.isoformat()}"
+        if job.state != 'running' and st.session_state.get('sync_polling') == finished_key:
+            st.session_state.sync_polling = None
+            st.rerun()
+        if job.state == 'running': st.session_state.sync_polling = finished_key
+    sync_status()
+
+def render_sync_profile(job):
+    """ตารางเวลาแต่ละขั้นของรอบที่จบแล้ว (รวมต่อขั้น / ต่อร้าน) + ปุ่มดาวน์โหลดรายงาน JSON"""
+    st.caption("⏱️ เวลาแต่ละขั้น (วินาที รวมทุก thread ขั้นที่รันพร้อมกันจึงรวมได้มากกว่าเวลาจริง)")
+    tab_stage, tab_shop = st.tabs(["ต่อขั้น", "ต่อร้าน"])
+    with tab_stage:
+        table = job.profile.summary().drop(columns=[] if job.profile.memory else ['peak_mb'])
+        st.dataframe(table.round(2).rename(columns=PROFILE_LABELS), hide_index=True, use_container_width=True)
+    with tab_shop:
+        st.dataframe(job.profile.by_shop().round(2).rename(columns={'shop': 'ร้าน'}), hide_index=True, use_container_width=True)
+    st.download_button(
+        "📥 รายงาน JSON", json.dumps(job.report(), ensure_ascii=False, indent=2, default=str),
+        file_name=os.path.basename(job.report_path or f"sync_{job.started_at:%Y%m%d_%H%M%S}.json"),
+        mime="application/json", use_container_width=True, key=f"sync_report_{job.started_at.isoformat()}",
+    )
+
 with st.sidebar:
     st.header("🔄 ระบบดึงข้อมูล")
-    st.caption("Google Drive > Database")
+    st.caption(f"{SYNC_SOURCE_DIR or 'Google Drive'} > {'SQLite' if isinstance(db, SQLiteStorage) else 'Database'}")
     
     st.link_button(
         "📂 ไปยังไดร์ฟข้อมูล", 
@@ -546,102 +819,25 @@ with st.sidebar:
     st.markdown("---")
     
     with st.expander("🛠️ เครื่องมือ Sync", expanded=True):
-        start_sync = st.button("🚀 Sync Data (ล้างเก่าลงใหม่)", type="primary", use_container_width=True)
-        
-        if start_sync:
-            status_box = st.empty()
-            status_box.info("⏳ กำลังเชื่อมต่อ Google Drive...")
-            
-            root_files = list_files_in_folder(PARENT_FOLDER_ID)
-            if not root_files:
-                st.error("❌ ไม่พบไฟล์ในโฟลเดอร์หลัก")
-            else:
-                folder_map = {f['name']: f['id'] for f in root_files if f['mimeType'] == 'application/vnd.google-apps.folder'}
-                shops = {'TIKTOK': ['TIKTOK 1', 'TIKTOK 2', 'TIKTOK 3'], 'SHOPEE': ['SHOPEE 1', 'SHOPEE 2', 'SHOPEE 3'], 'LAZADA': ['LAZADA 1', 'LAZADA 2', 'LAZADA 3']}
-                inc_folders = {'TIKTOK': 'INCOME TIKTOK', 'SHOPEE': 'INCOME SHOPEE', 'LAZADA': 'INCOME LAZADA'}
-                
-                all_data = []
-                for platform, shop_list in shops.items():
-                    inc_id = folder_map.get(inc_folders.get(platform), '')
-                    inc_files = list_files_in_folder(inc_id)
-                    for shop_name in shop_list:
-                        if shop_name in folder_map:
-                            status_box.text(f"กำลังโหลด: {shop_name}...")
-                            order_files = list_files_in_folder(folder_map[shop_name])
-                            df_res = pd.DataFrame()
-                            if platform == 'TIKTOK': df_res = process_tiktok(order_files, inc_files, shop_name)
-                            elif platform == 'SHOPEE': df_res = process_shopee(order_files, inc_files, shop_name)
-                            elif platform == 'LAZADA': df_res = process_lazada(order_files, inc_files, shop_name)
-                            if not df_res.empty: all_data.append(df_res)
-
-                if all_data:
-                    status_box.text("📊 กำลังประมวลผล...")
-                    master_df = pd.concat(all_data, ignore_index=True)
-                    
-                    # Numeric Convert
-                    for c in ['quantity', 'sales_amount', 'settlement_amount', 'fees', 'affiliate', 'unit_cost']:
-                        if c in master_df.columns: master_df[c] = pd.to_numeric(master_df[c], errors='coerce').fillna(0)
-                        else: master_df[c] = 0.0
-
-                    # --- PRO-RATE LOGIC ---
-                    totals = master_df.groupby('order_id')['sales_amount'].transform('sum')
-                    ratio = master_df['sales_amount'] / totals.replace(0, 1)
-                    master_df['settlement_amount'] *= ratio
-                    master_df['fees'] *= ratio
-                    master_df['affiliate'] *= ratio
-                    
-                    # Cost Mapping
-                    cost_df = load_cost_data()
-                    if not cost_df.empty:
-                        master_df = pd.merge(master_df, cost_df, on=['sku', 'platform'], how='left')
-                        if 'unit_cost_y' in master_df.columns:
-                            master_df['unit_cost'] = master_df['unit_cost_y'].fillna(0)
-                            master_df = master_df.drop(columns=['unit_cost_x', 'unit_cost_y'], errors='ignore')
-                    
-                    master_df['unit_cost'] = master_df['unit_cost'].fillna(0)
-                    master_df['total_cost'] = master_df['quantity'] * master_df['unit_cost']
-                    master_df['net_profit'] = master_df['settlement_amount'] - master_df['total_cost']
-                    master_df['status'] = master_df.apply(get_standard_status, axis=1)
-
-                    if 'product_name' not in master_df.columns: master_df['product_name'] = "-"
-                    master_df['product_name'] = master_df['product_name'].fillna("-")
-
-                    # Date to String for DB
-                    for c in ['created_date', 'shipped_date', 'settlement_date']:
-                        if c in master_df.columns: 
-                            master_df[c] = master_df[c].astype(str).replace({'nan': None, 'None': None, 'NaT': None})
-                    
-                    # Upload to Database
-                    status_box.text("☁️ อัปโหลดขึ้น Database...")
-                    cols = ['order_id', 'status', 'sku', 'product_name', 'quantity', 'sales_amount', 'settlement_amount', 'fees', 'affiliate', 'net_profit', 'total_cost', 'unit_cost', 'settlement_date', 'created_date', 'shipped_date', 'tracking_id', 'shop_name', 'platform']
-                    master_df = master_df[[c for c in cols if c in master_df.columns]]
-                    master_df = master_df.drop_duplicates(subset=['order_id', 'sku'], keep='first')
-
-                    try: supabase.table("orders").delete().neq("id", 0).execute()
-                    except: pass
-                    
-                    records = master_df.to_dict('records')
-                    clean_records = []
-                    for r in records:
-                        new_r = {}
-                        for k, v in r.items():
-                            if isinstance(v, float) and (math.isnan(v) or math.isinf(v)): new_r[k] = 0.0
-                            else: new_r[k] = v
-                        clean_records.append(new_r)
-
-                    chunk_size = 500
-                    for i in range(0, len(clean_records), chunk_size):
-                        supabase.table("orders").insert(clean_records[i:i+chunk_size]).execute()
-                    
-                    # ---------------------------------------------------------
-                    # [ใส่โค้ดตรงนี้] สั่งล้าง Cache ทั้งหมดเพื่อให้ดึงข้อมูลใหม่ทันที
-                    # ---------------------------------------------------------
-                    fetch_orders_data.clear()  # ล้าง Cache ออเดอร์
-                    fetch_ads_data.clear()     # ล้าง Cache โฆษณา (เผื่อไว้)
-                    load_cost_data.clear()     # ล้าง Cache ต้นทุน (เผื่อไว้)
-                    
-                    status_box.success(f"✅ Sync สำเร็จ! ({len(master_df)} รายการ)")
-                    st.rerun()
+        sync_mode = st.radio(
+            "โหมด Sync",
+            ["⚡ เฉพาะไฟล์ใหม่/ที่แก้ไข", "🔁 ประมวลผลใหม่ทุกไฟล์"],
+            key="sync_mode",
+            help="โหมดแรกจะดาวน์โหลดและประมวลผลเฉพาะไฟล์ที่เปลี่ยนไปจากรอบก่อน (ดูจาก sync_manifest)"
+        )
+        max_workers = st.number_input(
+            "ดาวน์โหลดพร้อมกัน (ไฟล์)", min_value=1, max_value=SYNC_WORKERS_LIMIT, value=SYNC_MAX_WORKERS, key="sync_workers",
+            help="จำนวนไฟล์ที่ดาวน์โหลด/ประมวลผลพร้อมกัน ถ้า Google Drive ตอบ 429 บ่อยให้ลดลง"
+        )
+        trace_memory = st.checkbox(
+            "📏 วัด memory แต่ละขั้น", key="sync_trace_memory",
+            help="บันทึก peak memory ของแต่ละขั้นลงรายงานด้วย (Sync ช้าลงหลายเท่า ใช้ตอนหาสาเหตุที่ Sync ช้า/กิน RAM)"
+        )
+        job = sync_jobs()['current']
+        running = job is not None and job.state == 'running'
+        if st.button("🚀 Sync Data", type="primary", use_container_width=True, disabled=running):
+            job = start_sync_job(sync_mode.startswith("🔁"), max_workers, trace_memory)
+        if job is not None: render_sync_job(job)
 
     # ---------------------------------------------------------------------
     # 👇 แก้ไขตรงนี้: ลบช่องว่างข้างหน้าให้เหลือแค่ 4 เคาะ (ให้ตรงกับ st.write)
@@ -649,9 +845,7 @@ with st.sidebar:
     st.write("") # เว้นบรรทัดนิดนึงให้สวยงาม
     if st.button("🔄 รีเฟรชข้อมูล", use_container_width=True):
         # สั่งล้าง Cache
-        fetch_orders_data.clear()
-        fetch_ads_data.clear()
-        load_cost_data.clear()
+        clear_data_caches()
         
         # รีโหลดหน้าจอ
         st.success("รีเฟรชข้อมูลเรียบร้อย!")
@@ -663,6 +857,12 @@ with st.sidebar:
 thai_months = ["มกราคม", "กุมภาพันธ์", "มีนาคม", "เมษายน", "พฤษภาคม", "มิถุนายน", "กรกฎาคม", "สิงหาคม", "กันยายน", "ตุลาคม", "พฤศจิกายน", "ธันวาคม"]
 today = datetime.datetime.now().date()
 
+# ช่วงวันที่หลัก (ต้องตั้งค่าเริ่มต้นก่อนดึงข้อมูล) + ข้อมูลชุดเดียวที่ทุกแท็บใช้ร่วมกัน
+if "d_start" not in st.session_state:
+    st.session_state.d_start = today.replace(day=1)
+    st.session_state.d_end = today
+ctx = data_context(st.session_state.d_start, st.session_state.d_end)
+
 tab_dash, tab_details, tab_ads, tab_cost, tab_old = st.tabs(["📊 สรุปยอดขาย (Dashboard)", "📦 รายละเอียดออเดอร์", "📢 บันทึกค่าโฆษณา", "💰 จัดการต้นทุน", "📂 ตารางข้อมูลเดิม"])
 
 # --- TAB 1: DASHBOARD (HTML Table) ---
@@ -689,15 +889,14 @@ with tab_dash:
     """, unsafe_allow_html=True)
     
     # 1. Load Data
-    raw_df = fetch_orders_data()
-    ads_all = fetch_ads_data()
+    # Dashboard ใช้แค่ยอดสรุปรายวันต่อร้าน (daily_summary) ไม่ต้องดึง orders ทีละแถว
+    summary_df = load_dashboard_cube(get_data_version("orders"), st.session_state.d_start, st.session_state.d_end)
     
     # เตรียม Shop Name (ดึงทั้งหมดที่มีใน DB ออกมาโชว์ก่อน)
     available_shops = []
-    if not raw_df.empty and 'shop_name' in raw_df.columns:
-        # ⚠️ แก้ปัญหาข้อ 2: แปลงเป็นตัวพิมพ์ใหญ่และตัดช่องว่าง ป้องกัน TikTok 1 vs TIKTOK 1
-        raw_df['shop_name'] = raw_df['shop_name'].astype(str).str.upper().str.strip()
-        available_shops = sorted(raw_df['shop_name'].unique().tolist())
+    if not summary_df.empty:
+        # ⚠️ แก้ปัญหาข้อ 2: ชื่อร้านถูกแปลงเป็นตัวพิมพ์ใหญ่ตอนสรุปแล้ว ป้องกัน TikTok 1 vs TIKTOK 1
+        available_shops = sorted(summary_df['shop_name'].unique().tolist())
     
     # ถ้ายังไม่มีข้อมูลเลย ให้ใส่ค่า Default หลอกๆ ไว้กัน Error
     if not available_shops:
@@ -729,10 +928,6 @@ with tab_dash:
     # 2. Date Filter
     col_date_1, col_date_2, col_date_3, col_date_4 = st.columns(4)
 
-    if "d_start" not in st.session_state:
-        st.session_state.d_start = today.replace(day=1)
-        st.session_state.d_end = today
-
     def update_dates():
         y = st.session_state.sel_year; m_str = st.session_state.sel_month
         try:
@@ -744,8 +939,9 @@ with tab_dash:
 
     with col_date_1: st.selectbox("ปี", [2024, 2025, 2026], index=1, key="sel_year", on_change=update_dates)
     with col_date_2: st.selectbox("เดือน", thai_months, index=today.month-1, key="sel_month", on_change=update_dates)
-    with col_date_3: st.session_state.d_start = st.date_input("📅 วันที่เริ่ม", st.session_state.d_start)
-    with col_date_4: st.session_state.d_end = st.date_input("📅 ถึงวันที่", st.session_state.d_end)
+    # ผูก widget กับ key ใน session_state โดยตรง ค่าใหม่จึงถูกใช้ดึงข้อมูลตั้งแต่ต้นรอบ rerun
+    with col_date_3: st.date_input("📅 วันที่เริ่ม", key="d_start")
+    with col_date_4: st.date_input("📅 ถึงวันที่", key="d_end")
 
     # 3. Platform Checkboxes (แก้ปัญหาข้อ 3: Big & Distinct)
     st.write("")
@@ -780,256 +976,29 @@ with tab_dash:
     if is_sp: sel_plats.append('SHOPEE')
     if is_lz: sel_plats.append('LAZADA')
 
-    # --- PROCESS DATA ---
+    # --- PROCESS DATA + HTML RENDER ---
     try:
-        # A. เตรียมข้อมูล Ads
-        ads_grouped = pd.DataFrame()
-        
-        if not ads_all.empty:
-            ads_temp = ads_all.copy()
-            ads_temp['date'] = pd.to_datetime(ads_temp['date']).dt.date
-            
-            # Filter Ads
-            mask_ads = (ads_temp['date'] >= st.session_state.d_start) & \
-                       (ads_temp['date'] <= st.session_state.d_end)
-            
-            if 'shop_name' in ads_temp.columns and sel_shops:
-                # แปลง shop_name ใน Ads ให้เป็นตัวใหญ่ด้วยเพื่อความชัวร์
-                ads_temp['shop_name'] = ads_temp['shop_name'].astype(str).str.upper().str.strip()
-                mask_ads &= ads_temp['shop_name'].isin(sel_shops)
-            
-            ads_filtered = ads_temp[mask_ads].copy()
-            
-            ads_filtered['ads_amount'] = pd.to_numeric(ads_filtered['ads_amount'], errors='coerce').fillna(0)
-            ads_filtered['roas_ads'] = pd.to_numeric(ads_filtered['roas_ads'], errors='coerce').fillna(0)
-            
-            ads_grouped = ads_filtered.groupby('date').agg(
-                manual_ads=('ads_amount', 'sum'),
-                manual_roas=('roas_ads', 'mean') 
-            ).reset_index().rename(columns={'date': 'created_date'})
-
-        # B. เตรียมข้อมูล Orders
-        if not raw_df.empty:
-            raw_df['created_date'] = pd.to_datetime(raw_df['created_date']).dt.date
-            
-            # Filter: Date + Platform + Shop Name
-            mask = (raw_df['created_date'] >= st.session_state.d_start) & \
-                   (raw_df['created_date'] <= st.session_state.d_end)
-            
-            if 'platform' in raw_df.columns: 
-                # แปลง Platform เป็นตัวใหญ่ แล้วเทียบกับ sel_plats
-                mask &= raw_df['platform'].str.upper().isin(sel_plats)
-            
-            if 'shop_name' in raw_df.columns and sel_shops:
-                # Shop Name ถูกแปลงเป็น Upper ตั้งแต่บรรทัดโหลดข้อมูลแล้ว
-                mask &= raw_df['shop_name'].isin(sel_shops)
-                
-            df = raw_df.loc[mask].copy()
-
-            # Convert Numbers
-            for c in ['sales_amount', 'total_cost', 'fees', 'affiliate']:
-                if c in df.columns: df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0)
-
-            # Generate Date Range for Table
-            date_range = pd.date_range(start=st.session_state.d_start, end=st.session_state.d_end)
-            dates_df = pd.DataFrame({'created_date': date_range.date})
-            
-            # Group by Date
-            daily = df.groupby('created_date').agg(
-                success_count=('status', lambda x: (x == 'ออเดอร์สำเร็จ').sum()),
-                pending_count=('status', lambda x: (x == 'รอดำเนินการ').sum()),
-                return_count=('status', lambda x: (x == 'ตีกลับ').sum()),
-                cancel_count=('status', lambda x: (x == 'ยกเลิก').sum()),
-                sales_sum=('sales_amount', 'sum'),
-                cost_sum=('total_cost', 'sum'),
-                fees_sum=('fees', 'sum'),
-                affiliate_sum=('affiliate', 'sum')
-            ).reset_index()
-            
-            # Merge Everything
-            step1 = pd.merge(dates_df, daily, on='created_date', how='left').fillna(0)
-            
-            if not ads_grouped.empty:
-                final_df = pd.merge(step1, ads_grouped, on='created_date', how='left').fillna(0)
-            else:
-                final_df = step1.copy()
-                final_df['manual_ads'] = 0
-                final_df['manual_roas'] = 0
-
-            # C. Calculations (สูตรคำนวณ)
-            calc = final_df.copy()
-            calc['total_orders'] = calc['success_count'] + calc['pending_count'] + calc['return_count'] + calc['cancel_count']
-            calc['กำไร'] = calc['sales_sum'] - calc['cost_sum'] - calc['fees_sum'] - calc['affiliate_sum']
-            calc['ADS VAT 7%'] = calc['manual_ads'] * 0.07
-            calc['ค่าแอดรวม'] = calc['manual_ads'] + calc['manual_roas'] + calc['ADS VAT 7%']
-            
-            calc['ROAS'] = calc.apply(lambda x: (x['sales_sum']/x['ค่าแอดรวม']) if x['ค่าแอดรวม'] > 0 else 0, axis=1)
-            calc['ค่าดำเนินการ'] = calc['total_orders'] * 10
-            calc['กำไรสุทธิ'] = calc['กำไร'] - calc['ค่าแอดรวม'] - calc['ค่าดำเนินการ']
-
-            # --- D. HTML RENDER ---
-            # (ส่วน CSS และ HTML Table ยังคงเดิมตามที่เคยให้ไป ใส่ไว้ครบถ้วนด้านล่างนี้)
-            
-            st.markdown("""
-            <style>
-                table.report-table { border-collapse: collapse; width: 100%; font-size: 13px; }
-                table.report-table th { color: #ffffff !important; font-weight: bold !important; border: 1px solid #444 !important; padding: 8px; text-align: center; }
-                table.report-table td { color: #ffffff !important; border: 1px solid #333; padding: 6px; vertical-align: middle; text-align: center !important; }
-                table.report-table tbody tr:nth-of-type(odd) { background-color: #1c1c1c; }
-                table.report-table tbody tr:nth-of-type(even) { background-color: #262626; }
-                table.report-table tbody tr:hover { background-color: #333333 !important; }
-                tr.total-row td { background-color: #010538 !important; color: #ffffff !important; font-weight: bold; border-top: 2px solid #555; }
-                .text-red { color: #fa0000 !important; font-weight: bold; }
-                .bar-container { position: absolute; bottom: 0; left: 0; height: 4px; background-color: #27ae60; opacity: 0.7; z-index: 1; }
-                .cell-content { position: relative; z-index: 2; }
-                td.relative-cell { position: relative; padding-bottom: 8px; }
-            </style>
-            """, unsafe_allow_html=True)
-
-            h_blue = "#1e3c72"; h_cyan = "#22b8e6"; h_orange = "#e67e22"; h_green = "#27ae60"
-
-            html_parts = []
-            html_parts.append(f"""
-            <div class="custom-table-wrapper">
-            <table class="report-table">
-                <thead>
-                    <tr>
-                        <th style="background-color: {h_blue}; min-width: 85px;">วันที่</th>
-                        <th style="background-color: {h_blue};">จำนวนออเดอร์</th>
-                        <th style="background-color: {h_blue};">ออเดอร์สำเร็จ</th>
-                        <th style="background-color: {h_blue};">รอดำเนินการ</th>
-                        <th style="background-color: {h_blue};">ตีกลับ</th>
-                        <th style="background-color: {h_blue};">ยกเลิก</th>
-                        <th style="background-color: {h_blue};">ยอดขายรวม</th>
-                        <th style="background-color: {h_cyan};">ROAS</th>
-                        <th style="background-color: {h_cyan};">ROAS ADS</th>
-                        <th style="background-color: {h_blue};">ทุนรวม</th>
-                        <th style="background-color: {h_blue};">%ทุนรวม</th>
-                        <th style="background-color: {h_blue};">ค่าธรรมเนียม</th>
-                        <th style="background-color: {h_blue};">%ค่าธรรมเนียม</th>
-                        <th style="background-color: {h_blue};">ค่าแอฟฟิลิเอต</th>
-                        <th style="background-color: {h_blue};">%ค่าแอฟฟิลิเอต</th>
-                        <th style="background-color: {h_blue};">กำไร</th>
-                        <th style="background-color: {h_blue};">%กำไร</th>
-                        <th style="background-color: {h_orange};">ค่าADS</th>
-                        <th style="background-color: {h_orange};">ADS VAT 7%</th>
-                        <th style="background-color: {h_orange};">ค่าแอดรวม</th>
-                        <th style="background-color: {h_blue};">%ค่าแอด</th>
-                        <th style="background-color: {h_blue};">ค่าดำเนินการ</th>
-                        <th style="background-color: {h_blue};">%ค่าดำเนินการ</th>
-                        <th style="background-color: {h_green}; min-width: 120px;">กำไรสุทธิ</th>
-                        <th style="background-color: {h_blue};">%กำไรสุทธิ</th>
-                    </tr>
-                </thead>
-                <tbody>
-            """)
-
-            def fmt_val(val, is_percent=False):
-                s_val = f"{val:,.1f}%" if is_percent else f"{val:,.2f}"
-                if is_percent: s_val = f"{val:.1f}%"
-                if val < 0: return f'<span class="text-red">{s_val}</span>'
-                return s_val
-            
-            def safe_div(a, b): return (a/b*100) if b > 0 else 0
-
-            max_profit = calc['กำไรสุทธิ'].max()
-            if max_profit <= 0: max_profit = 1
-
-            for _, r in calc.iterrows():
-                sales = r['sales_sum']
-                net_profit = r['กำไรสุทธิ']
-                date_str = format_thai_date(r['created_date'])
-
-                bar_width = 0
-                if net_profit > 0: 
-                    bar_width = min((net_profit / max_profit) * 100, 100)
-                
-                bar_html = ""
-                if bar_width > 0:
-                    bar_html = f'<div class="bar-container" style="width: {bar_width}%;"></div>'
-
-                row_html = f"""
-                <tr>
-                    <td class="txt">{date_str}</td>
-                    <td class="num">{int(r['total_orders'])}</td>
-                    <td class="num">{int(r['success_count'])}</td>
-                    <td class="num">{int(r['pending_count'])}</td>
-                    <td class="num">{int(r['return_count'])}</td>
-                    <td class="num">{int(r['cancel_count'])}</td>
-                    <td class="num">{fmt_val(sales)}</td>
-                    <td class="num">{fmt_val(r['ROAS'])}</td>
-                    <td class="num">{fmt_val(r['manual_roas'])}</td>
-                    <td class="num">{fmt_val(r['cost_sum'])}</td>
-                    <td class="num">{fmt_val(safe_div(r['cost_sum'], sales), True)}</td>
-                    <td class="num">{fmt_val(r['fees_sum'])}</td>
-                    <td class="num">{fmt_val(safe_div(r['fees_sum'], sales), True)}</td>
-                    <td class="num">{fmt_val(r['affiliate_sum'])}</td>
-                    <td class="num">{fmt_val(safe_div(r['affiliate_sum'], sales), True)}</td>
-                    <td class="num">{fmt_val(r['กำไร'])}</td>
-                    <td class="num">{fmt_val(safe_div(r['กำไร'], sales), True)}</td>
-                    <td class="num">{fmt_val(r['manual_ads'])}</td>
-                    <td class="num">{fmt_val(r['ADS VAT 7%'])}</td>
-                    <td class="num">{fmt_val(r['ค่าแอดรวม'])}</td>
-                    <td class="num">{fmt_val(safe_div(r['ค่าแอดรวม'], sales), True)}</td>
-                    <td class="num">{fmt_val(r['ค่าดำเนินการ'])}</td>
-                    <td class="num">{fmt_val(safe_div(r['ค่าดำเนินการ'], sales), True)}</td>
-                    <td class="num font-bold relative-cell">
-                        <span class="cell-content">{fmt_val(net_profit)}</span>
-                        {bar_html}
-                    </td>
-                    <td class="num">{fmt_val(safe_div(net_profit, sales), True)}</td>
-                </tr>"""
-                html_parts.append(row_html.replace('\n', ''))
-
-            # --- TOTAL ROW ---
-            sum_sales = calc['sales_sum'].sum()
-            sum_cost = calc['cost_sum'].sum()
-            sum_fee = calc['fees_sum'].sum()
-            sum_aff = calc['affiliate_sum'].sum()
-            sum_profit_gross = calc['กำไร'].sum()
-            sum_ads = calc['manual_ads'].sum()
-            sum_ads_vat = calc['ADS VAT 7%'].sum()
-            sum_ads_total = calc['ค่าแอดรวม'].sum()
-            sum_ops = calc['ค่าดำเนินการ'].sum()
-            sum_net_profit = calc['กำไรสุทธิ'].sum()
-            
-            total_roas = (sum_sales / sum_ads_total) if sum_ads_total > 0 else 0
-            avr_ROAS_ADS = calc['manual_roas'].mean() if len(calc) > 0 else 0
-            
-            total_html = f"""
-            <tr class="total-row">
-                <td class="txt">รวม</td>
-                <td class="num">{int(calc['total_orders'].sum())}</td>
-                <td class="num">{int(calc['success_count'].sum())}</td>
-                <td class="num">{int(calc['pending_count'].sum())}</td>
-                <td class="num">{int(calc['return_count'].sum())}</td>
-                <td class="num">{int(calc['cancel_count'].sum())}</td>
-                <td class="num">{fmt_val(sum_sales)}</td>
-                <td class="num">{fmt_val(total_roas)}</td>
-                <td class="num">{fmt_val(avr_ROAS_ADS)}</td>
-                <td class="num">{fmt_val(sum_cost)}</td>
-                <td class="num">{fmt_val(safe_div(sum_cost, sum_sales), True)}</td>
-                <td class="num">{fmt_val(sum_fee)}</td>
-                <td class="num">{fmt_val(safe_div(sum_fee, sum_sales), True)}</td>
-                <td class="num">{fmt_val(sum_aff)}</td>
-                <td class="num">{fmt_val(safe_div(sum_aff, sum_sales), True)}</td>
-                <td class="num">{fmt_val(sum_profit_gross)}</td>
-                <td class="num">{fmt_val(safe_div(sum_profit_gross, sum_sales), True)}</td>
-                <td class="num">{fmt_val(sum_ads)}</td>
-                <td class="num">{fmt_val(sum_ads_vat)}</td>
-                <td class="num">{fmt_val(sum_ads_total)}</td>
-                <td class="num">{fmt_val(safe_div(sum_ads_total, sum_sales), True)}</td>
-                <td class="num">{fmt_val(sum_ops)}</td>
-                <td class="num">{fmt_val(safe_div(sum_ops, sum_sales), True)}</td>
-                <td class="num">{fmt_val(sum_net_profit)}</td>
-                <td class="num">{fmt_val(safe_div(sum_net_profit, sum_sales), True)}</td>
-            </tr>
-            """
-            html_parts.append(total_html.replace('\n', ''))
-
-            html_parts.append("</tbody></table></div>")
-            st.markdown("".join(html_parts), unsafe_allow_html=True)
-
+        st.markdown("""
+        <style>
+            table.report-table { border-collapse: collapse; width: 100%; font-size: 13px; }
+            table.report-table th { color: #ffffff !important; font-weight: bold !important; border: 1px solid #444 !important; padding: 8px; text-align: center; }
+            table.report-table td { color: #ffffff !important; border: 1px solid #333; padding: 6px; vertical-align: middle; text-align: center !important; }
+            table.report-table tbody tr:nth-of-type(odd) { background-color: #1c1c1c; }
+            table.report-table tbody tr:nth-of-type(even) { background-color: #262626; }
+            table.report-table tbody tr:hover { background-color: #333333 !important; }
+            tr.total-row td { background-color: #010538 !important; color: #ffffff !important; font-weight: bold; border-top: 2px solid #555; }
+            .text-red { color: #fa0000 !important; font-weight: bold; }
+            .bar-container { position: absolute; bottom: 0; left: 0; height: 4px; background-color: #27ae60; opacity: 0.7; z-index: 1; }
+            .cell-content { position: relative; z-index: 2; }
+            td.relative-cell { position: relative; padding-bottom: 8px; }
+        </style>
+        """, unsafe_allow_html=True)
+
+        report_html = dashboard_report_html(
+            get_data_version("orders"), get_data_version("daily_ads"),
+            st.session_state.d_start, st.session_state.d_end, tuple(sel_shops), tuple(sel_plats),
+        )
+        if report_html is not None: st.markdown(report_html, unsafe_allow_html=True)
         else: st.info("ไม่พบข้อมูลในช่วงเวลานี้")
     except Exception as e: st.error(f"Error Processing: {e}")
 
@@ -1045,137 +1014,36 @@ with tab_details:
     with col_d2: d_end_det = st.date_input("ถึงวันที่", st.session_state.d_end, key="det_end")
 
     try:
-        # Use cached function
-        raw_df = fetch_orders_data()
+        # Use cached function (ดึงเฉพาะช่วงวันที่และ Platform ที่เลือก + ยอดต่อออเดอร์คิดไว้แล้ว)
+        items, orders = load_order_details(get_data_version("orders"), d_start_det, d_end_det, selected_platform)
         
-        if not raw_df.empty:
-            raw_df['created_date'] = pd.to_datetime(raw_df['created_date'], errors='coerce').dt.date
-            st.info(f"Raw Query = {len(raw_df)}")
-            mask = (raw_df['created_date'] >= d_start_det) & \
-                   (raw_df['created_date'] <= d_end_det) & \
-                   (raw_df['platform'] == selected_platform)
-            df = raw_df.loc[mask].copy()
-            
-            if df.empty:
-                st.info(f"ไม่พบข้อมูล {selected_platform} ในช่วงวันที่เลือก")
-            else:
-                for c in ['sales_amount', 'total_cost', 'fees', 'affiliate', 'settlement_amount', 'unit_cost']:
-                    df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0)
-                
-                df = df.sort_values(by=['created_date', 'order_id'], ascending=[False, False])
-                
-                # ... HTML Table (Same as before) ...
-                h_blue = "#1e3c72"; h_cyan = "#22b8e6"; h_green = "#27ae60"
-                html = f"""
-                <table style="width:100%; border-collapse: collapse; font-size: 13px; color: white;">
-                    <thead>
-                        <tr>
-                            <th style="background-color: {h_blue}; padding: 8px; border: 1px solid #444;">วันที่ทำการสั่งซื้อ</th>
-                            <th style="background-color: {h_blue}; padding: 8px; border: 1px solid #444;">เลขคำสั่งซื้อ</th>
-                            <th style="background-color: {h_blue}; padding: 8px; border: 1px solid #444;">ชื่อสินค้า</th>
-                            <th style="background-color: {h_blue}; padding: 8px; border: 1px solid #444;">รหัสสินค้า</th>
-                            <th style="background-color: {h_blue}; padding: 8px; border: 1px solid #444;">ยอดขาย</th>
-                            <th style="background-color: {h_cyan}; padding: 8px; border: 1px solid #444;">ทุน</th>
-                            <th style="background-color: {h_blue}; padding: 8px; border: 1px solid #444;">%ทุน</th>
-                            <th style="background-color: {h_blue}; padding: 8px; border: 1px solid #444;">ค่าธรรมเนียม</th>
-                            <th style="background-color: {h_blue}; padding: 8px; border: 1px solid #444;">%ค่าธรรมเนียม</th>
-                            <th style="background-color: {h_blue}; padding: 8px; border: 1px solid #444;">ค่าแอฟฟิลิเอต</th>
-                            <th style="background-color: {h_blue}; padding: 8px; border: 1px solid #444;">%ค่าแอฟฟิลิเอต</th>
-                            <th style="background-color: {h_blue}; padding: 8px; border: 1px solid #444;">ค่าดำเนินการ</th>
-                            <th style="background-color: {h_blue}; padding: 8px; border: 1px solid #444;">%ค่าดำเนินการ</th>
-                            <th style="background-color: {h_blue}; padding: 8px; border: 1px solid #444;">วันที่ได้รับเงิน</th>
-                            <th style="background-color: {h_blue}; padding: 8px; border: 1px solid #444;">ยอดเงินที่ได้รับจริง</th>
-                            <th style="background-color: {h_green}; padding: 8px; border: 1px solid #444;">กำไรสุทธิ</th>
-                            <th style="background-color: {h_green}; padding: 8px; border: 1px solid #444;">%กำไรสุทธิ</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-                """
-                grouped = df.groupby('order_id', sort=False)
-                row_counter = 0
-                def fmt_num(val, color_neg=True):
-                    s = f"{val:,.2f}"
-                    if color_neg and val < 0: return f'<span class="text-red">{s}</span>'
-                    return s
-                def fmt_pct(num, div):
-                    if div == 0: return "0.0%"
-                    val = (num/div) * 100
-                    return f"{val:,.1f}%"
-
-                sum_sales = 0; sum_net_profit = 0
-                for order_id, group in grouped:
-                    row_counter += 1
-                    bg_color = "#1c1c1c" if row_counter % 2 != 0 else "#262626"
-                    hover_color = "#333333"
-                    
-                    order_sales = group['sales_amount'].sum()
-                    order_fees = group['fees'].sum()
-                    order_aff = group['affiliate'].sum()
-                    order_settle = group['settlement_amount'].sum()
-                    order_cost_total = group['total_cost'].sum()
-                    ops_cost = 10.0
-                    order_net_profit = order_sales - order_cost_total - order_fees - order_aff - ops_cost
-                    sum_sales += order_sales; sum_net_profit += order_net_profit
-
-                    created_date_str = format_thai_date(group.iloc[0]['created_date'])
-                    settle_date_str = format_thai_date(group.iloc[0]['settlement_date']) if group.iloc[0]['settlement_date'] else "-"
-                    num_items = len(group)
-                    
-                    for i, (idx, row) in enumerate(group.iterrows()):
-                        html += f'<tr style="background-color: {bg_color};" onmouseover="this.style.backgroundColor=\'{hover_color}\'" onmouseout="this.style.backgroundColor=\'{bg_color}\'">'
-                        if i == 0:
-                            html += f'<td rowspan="{num_items}" style="border:1px solid #333; text-align:center; vertical-align:middle;">{created_date_str}</td>'
-                            html += f'<td rowspan="{num_items}" style="border:1px solid #333; text-align:center; vertical-align:middle;">{order_id}</td>'
-                        
-                        prod_name = row.get('product_name', '-')
-                        sku = row.get('sku', '-')
-                        unit_cost = row.get('unit_cost', 0)
-                        item_sales = row.get('sales_amount', 0)
-                        pct_cost = fmt_pct(unit_cost, item_sales)
-                        
-                        html += f'<td style="border:1px solid #333; padding:5px;">{prod_name}</td>'
-                        html += f'<td style="border:1px solid #333; text-align:center;">{sku}</td>'
-                        
-                        if i == 0:
-                            html += f'<td rowspan="{num_items}" style="border:1px solid #333; text-align:right;">{fmt_num(order_sales)}</td>'
-                        
-                        html += f'<td style="border:1px solid #333; text-align:right;">{fmt_num(unit_cost)}</td>'
-                        html += f'<td style="border:1px solid #333; text-align:center;">{pct_cost}</td>'
-                        
-                        if i == 0:
-                            html += f'<td rowspan="{num_items}" style="border:1px solid #333; text-align:right;">{fmt_num(order_fees)}</td>'
-                            html += f'<td rowspan="{num_items}" style="border:1px solid #333; text-align:center;">{fmt_pct(order_fees, order_sales)}</td>'
-                            html += f'<td rowspan="{num_items}" style="border:1px solid #333; text-align:right;">{fmt_num(order_aff)}</td>'
-                            html += f'<td rowspan="{num_items}" style="border:1px solid #333; text-align:center;">{fmt_pct(order_aff, order_sales)}</td>'
-                            html += f'<td rowspan="{num_items}" style="border:1px solid #333; text-align:right;">{fmt_num(ops_cost)}</td>'
-                            html += f'<td rowspan="{num_items}" style="border:1px solid #333; text-align:center;">{fmt_pct(ops_cost, order_sales)}</td>'
-                            html += f'<td rowspan="{num_items}" style="border:1px solid #333; text-align:center;">{settle_date_str}</td>'
-                            html += f'<td rowspan="{num_items}" style="border:1px solid #333; text-align:right;">{fmt_num(order_settle)}</td>'
-                            html += f'<td rowspan="{num_items}" style="border:1px solid #333; text-align:right; font-weight:bold;">{fmt_num(order_net_profit)}</td>'
-                            html += f'<td rowspan="{num_items}" style="border:1px solid #333; text-align:center;">{fmt_pct(order_net_profit, order_sales)}</td>'
-                        html += "</tr>"
-
-                html += f"""
-                <tr style="background-color: #010538; font-weight: bold;">
-                    <td colspan="4" style="text-align: center; padding: 10px; border-top: 2px solid #555;">รวมทั้งหมด</td>
-                    <td style="text-align: right; border-top: 2px solid #555;">{fmt_num(sum_sales)}</td>
-                    <td colspan="10" style="border-top: 2px solid #555;"></td>
-                    <td style="text-align: right; border-top: 2px solid #555;">{fmt_num(sum_net_profit)}</td>
-                    <td style="text-align: center; border-top: 2px solid #555;">{fmt_pct(sum_net_profit, sum_sales)}</td>
-                </tr>
-                """
-                html += "</tbody></table>"
-                st.markdown(f'<div class="custom-table-wrapper">{html}</div>', unsafe_allow_html=True)
+        if orders.empty:
+            st.info(f"ไม่พบข้อมูล {selected_platform} ในช่วงวันที่เลือก")
+        else:
+            st.info(f"Raw Query = {len(items)}")
+
+            # แสดงทีละหน้า: เวลา render ขึ้นกับขนาดหน้า ไม่ใช่จำนวนออเดอร์ทั้งช่วง
+            col_p1, col_p2, col_p3 = st.columns([2, 1, 1])
+            with col_p1: sort_by = st.selectbox("เรียงตาม", list(DETAIL_SORTS), key="det_sort")
+            with col_p2: page_size = st.selectbox("ออเดอร์ต่อหน้า", DETAIL_PAGE_SIZES, index=1, key="det_page_size")
+            total_pages = max(1, -(-len(orders) // page_size))
+            if st.session_state.get("det_page", 1) > total_pages: st.session_state.det_page = 1
+            with col_p3: page = st.number_input(f"หน้า (จาก {total_pages})", min_value=1, max_value=total_pages, step=1, key="det_page")
+
+            sort_cols, ascending = DETAIL_SORTS[sort_by]
+            page_orders = orders.sort_values(sort_cols, ascending=ascending, kind='stable') \
+                                .iloc[(page - 1) * page_size : page * page_size]
+            st.caption(f"ออเดอร์ทั้งหมด {len(orders):,} รายการ · แสดง {len(page_orders):,} รายการในหน้านี้")
+
+            html = render_order_details_html(items, page_orders, orders['sales'].sum(), orders['net_profit'].sum())
+            st.markdown(f'<div class="custom-table-wrapper">{html}</div>', unsafe_allow_html=True)
     except Exception as e: st.error(f"Error Details: {e}")
 
 # ... (Tab ADS, Cost, Old ยังคงเหมือนเดิม) ...
 with tab_ads:
     st.header("📢 บันทึกค่าโฆษณา (ADS)")
-    # 1. Fetch Orders to get unique Shop Names
-    raw_orders = fetch_orders_data()
-    shop_list = []
-    if not raw_orders.empty and 'shop_name' in raw_orders.columns:
-        shop_list = sorted(raw_orders['shop_name'].dropna().unique().tolist())
+    # 1. รายชื่อร้านจาก Orders ของช่วงวันที่หลัก (ข้อมูลชุดเดียวกับทุกแท็บ)
+    shop_list = list(ctx['order_shops'])
     
     if not shop_list:
         st.warning("⚠️ ไม่พบรายชื่อร้านค้า (กรุณา Sync ข้อมูล Order ก่อน)")
@@ -1205,44 +1073,20 @@ with tab_ads:
         # แสดงวันที่ให้ดูเฉยๆ หรือปรับได้ถ้าต้องการ
         st.text_input("ช่วงวันที่", f"{d_start_ads} - {d_end_ads}", disabled=True)
 
-    # 3. Load Existing Ads Data for specific shop
+    # 3. Load Existing Ads Data for specific shop (กรองเดือน + ร้านที่ Database)
     try:
-        ads_all = fetch_ads_data()
-        db_ads = pd.DataFrame()
-        
-        if not ads_all.empty:
-            ads_all['date'] = pd.to_datetime(ads_all['date']).dt.date
-            
-            # Filter: Date Range AND Shop Name
-            mask_ads = (ads_all['date'] >= d_start_ads) & (ads_all['date'] <= d_end_ads)
-            
-            if 'shop_name' in ads_all.columns:
-                mask_ads &= (ads_all['shop_name'] == selected_shop_ads)
-                
-            db_ads = ads_all[mask_ads].set_index('date')
-            
+        db_ads = fetch_ads_data(AdsQuery(d_start_ads, d_end_ads, shops=(selected_shop_ads,), columns=('date', 'ads_amount', 'roas_ads')))
     except Exception as e:
         st.error(f"Error loading ads: {e}")
         db_ads = pd.DataFrame()
 
-    # 4. Prepare Editor Data
-    date_range_ads = pd.date_range(start=d_start_ads, end=d_end_ads)
-    editor_data = []
-    
-    for d in date_range_ads:
-        d_date = d.date()
-        current_ads = 0.0
-        current_roas = 0.0
-        
-        if not db_ads.empty and d_date in db_ads.index:
-            current_ads = float(db_ads.loc[d_date, 'ads_amount'])
-            current_roas = float(db_ads.loc[d_date, 'roas_ads'])
-            
-        editor_data.append({
-            'วันที่': d_date, 
-            'ค่า ADS': current_ads, 
-            'ROAS ADS': current_roas
-        })
+    # 4. Prepare Editor Data: 1 แถวต่อวันของเดือน (reindex ครั้งเดียว วันที่ไม่มีข้อมูล = 0)
+    date_range_ads = pd.date_range(start=d_start_ads, end=d_end_ads).date
+    if db_ads.empty: db_ads = pd.DataFrame(columns=['date', 'ads_amount', 'roas_ads'])
+    editor_df = db_ads.drop_duplicates(subset=['date'], keep='last').set_index('date')[['ads_amount', 'roas_ads']] \
+                      .astype(float).reindex(date_range_ads, fill_value=0.0) \
+                      .rename_axis('วันที่').reset_index() \
+                      .rename(columns={'ads_amount': 'ค่า ADS', 'roas_ads': 'ROAS ADS'})
 
     st.markdown("---")
     col_btn, col_info = st.columns([2, 5])
@@ -1252,7 +1096,7 @@ with tab_ads:
     st.markdown(f"##### 📝 กรอกค่าโฆษณาสำหรับ: **{selected_shop_ads}**")
     
     edited_df = st.data_editor(
-        pd.DataFrame(editor_data), 
+        editor_df, 
         column_config={
             "วันที่": st.column_config.DateColumn(format="DD/MM/YYYY", disabled=True), 
             "ค่า ADS": st.column_config.NumberColumn(format="฿%.2f", min_value=0, step=100), 
@@ -1266,24 +1110,38 @@ with tab_ads:
     )
 
     if save_ads_clicked:
-        upsert_data = []
-        for _, row in edited_df.iterrows():
-            # ข้อมูลที่จะบันทึก ต้องมี shop_name ด้วย
-            upsert_data.append({
-                "date": str(row['วันที่']), 
-                "ads_amount": row['ค่า ADS'], 
-                "roas_ads": row['ROAS ADS'],
-                "shop_name": selected_shop_ads  # <-- สำคัญ: ใส่ Shop Name ไปด้วย
-            })
+        # เทียบกับค่าที่โหลดมา บันทึกเฉพาะวันที่มีการแก้ไข
+        cols = ['ค่า ADS', 'ROAS ADS']
+        loaded = editor_df[cols].to_numpy(dtype=float)
+        edited = edited_df[cols].astype(float).fillna(0).to_numpy()
+        changed = edited_df.loc[~np.isclose(edited, loaded).all(axis=1)]
+        upsert_data = [{
+            "date": str(d), "ads_amount": float(a), "roas_ads": float(r),
+            "shop_name": selected_shop_ads.upper().strip()  # <-- สำคัญ: ใส่ Shop Name ไปด้วย (ตัวพิมพ์ใหญ่เสมอ)
+        } for d, a, r in changed[['วันที่'] + cols].itertuples(index=False)]
             
         try:
-            # ใช้ on_conflict เพื่อระบุว่าถ้า date+shop_name ซ้ำ ให้ update
-            # หมายเหตุ: ใน Supabase ต้องตั้งค่า constraints ให้ถูก หรือมี primary key เป็น (date, shop_name)
-            supabase.table("daily_ads").upsert(upsert_data).execute()
-            
-            # Clear cache
-            fetch_ads_data.clear()
-            st.toast(f"✅ บันทึกข้อมูลของ {selected_shop_ads} เรียบร้อยแล้ว!", icon="💾")
+            if not upsert_data:
+                st.toast("ไม่มีข้อมูลที่เปลี่ยนแปลง", icon="ℹ️")
+            else:
+                # ใช้ on_conflict เพื่อระบุว่าถ้า date+shop_name ซ้ำ ให้ update
+                # หมายเหตุ: ใน Supabase ต้องตั้งค่า constraints ให้ถูก หรือมี unique / primary key เป็น (date, shop_name)
+                db.table("daily_ads").upsert(upsert_data, on_conflict="date,shop_name").execute()
+                # แถวเดิมของวันเดียวกันที่ชื่อร้านพิมพ์เล็ก/ใหญ่ต่างไป (บันทึกก่อนบังคับตัวพิมพ์ใหญ่) ลบทิ้ง กันยอด Ads นับซ้ำ
+                shop_key = upsert_data[0]['shop_name']
+                old_rows = db.table("daily_ads").select("date, shop_name").in_("date", [r['date'] for r in upsert_data]).execute().data
+                for r in old_rows:
+                    if r['shop_name'] != shop_key and str(r['shop_name']).upper().strip() == shop_key:
+                        db.table("daily_ads").delete().eq("date", r['date']).eq("shop_name", r['shop_name']).execute()
+
+                # อัปเดต snapshot ที่มีอยู่ด้วยแถวที่เพิ่งบันทึก แทนการให้ทุกคนโหลด Ads ทั้งตารางใหม่
+                old_version = latest_data_version("daily_ads")
+                stamp = new_version_stamp()
+                patch_snapshot("daily_ads", old_version, stamp, to_ads_frame(upsert_data), ['date', 'shop_name'])
+                bump_data_version("daily_ads", stamp=stamp)
+                fetch_ads_data.clear()  # ค่าใน Cache กรองใหม่จาก snapshot ที่อัปเดตแล้ว (ไม่ต้องยิง Database)
+                fetch_ads_by_day.clear()
+                st.toast(f"✅ บันทึกข้อมูลของ {selected_shop_ads} เรียบร้อยแล้ว! ({len(upsert_data)} วัน)", icon="💾")
             
         except Exception as e: 
             st.error(f"เกิดข้อผิดพลาดในการบันทึก: {e}")
@@ -1306,18 +1164,39 @@ with tab_cost:
         if save_cost_clicked:
             if not edited.empty:
                 edited['sku'] = edited['sku'].astype(str).str.strip().str.upper()
-                supabase.table("product_costs").delete().neq("id", 0).execute()
-                supabase.table("product_costs").insert(edited.to_dict('records')).execute()
-                # Clear cache
-                load_cost_data.clear()
-                st.success("✅ บันทึกต้นทุนสำเร็จ!")
+                # เขียนเฉพาะ sku/platform ที่เพิ่ม / แก้ราคา / ลบออก แล้วคำนวณกำไรใหม่เฉพาะออเดอร์ของ sku เหล่านั้น
+                # หมายเหตุ: upsert ต้องมี unique (sku, platform) ในตาราง product_costs
+                changed, removed = diff_costs(cur_data, edited)
+                if changed.empty and removed.empty:
+                    st.toast("ไม่มีต้นทุนที่เปลี่ยนแปลง", icon="ℹ️")
+                else:
+                    if not changed.empty:
+                        db.table("product_costs").upsert(orders_to_records(changed), on_conflict="sku,platform").execute()
+                    for sku, platform in removed.itertuples(index=False):
+                        q = db.table("product_costs").delete().eq("sku", sku)
+                        (q.is_("platform", "null") if pd.isna(platform) else q.eq("platform", platform)).execute()
+                    updated = apply_cost_changes(pd.concat([changed, removed.assign(unit_cost=0.0)], ignore_index=True))
+
+                    # แถว orders ที่คำนวณใหม่ใส่ทับ snapshot เดิม ไม่ต้องโหลด orders ทั้งตารางใหม่
+                    old_version = latest_data_version("orders")
+                    stamp = new_version_stamp()
+                    if not updated.empty: patch_snapshot("orders", old_version, stamp, to_orders_frame(updated), ['id'])
+                    bump_data_version("product_costs", "orders", stamp=stamp)
+                    clear_data_caches()
+                    st.success(f"✅ บันทึกต้นทุนสำเร็จ! ({len(changed) + len(removed)} รายการ · คำนวณกำไรใหม่ {len(updated):,} แถว)")
     except Exception as e: st.error(f"Error Cost: {e}")
 
 with tab_old:
     st.subheader("📂 ตารางข้อมูลดิบ (Legacy)")
     try:
-        # Use cached data
-        res_df = fetch_orders_data()
+        # Use shared data (ไม่ copy / แปลงซ้ำ)
+        res_df = ctx['orders']
+        mem = memory_usage_report().get('orders')
+        if mem:
+            st.caption(
+                f"หน่วยความจำ orders ที่โหลดล่าสุด ({mem['rows']:,} แถว): {mem['before'] / 1e6:,.2f} MB -> {mem['after'] / 1e6:,.2f} MB หลังแปลงตาม schema"
+                f" · ตารางนี้ {res_df.memory_usage(deep=True).sum() / 1e6:,.2f} MB"
+            )
         if not res_df.empty:
             st.dataframe(res_df, use_container_width=True, height=800) # Fixed height, not "stretch" which is not standard param for number
         else: st.info("ไม่มีข้อมูล")
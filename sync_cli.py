@@ -0,0 +1,143 @@
+"""รัน Sync แบบไม่มีหน้าเว็บ (cron / จับเวลา / ทดสอบ offline) ใช้ pipeline เดียวกับปุ่ม Sync ในแอป
+
+  python sync_cli.py --local ./exports                   Sync จากโฟลเดอร์ในเครื่องเข้า Supabase
+  python sync_cli.py --local ./exports --dry-run         อ่าน + ประมวลผลอย่างเดียว ไม่แตะ Database แล้วพิมพ์เวลาที่ใช้
+  python sync_cli.py --drive-credentials sa.json --full  Sync จาก Google Drive แบบประมวลผลใหม่ทุกไฟล์
+  python sync_cli.py --local ./exports --sqlite shop.db  Sync เข้าไฟล์ SQLite ในเครื่อง (แอปตั้ง SQLITE_PATH ให้ชี้ไฟล์เดียวกัน)
+  python sync_cli.py --local ./exports --report run.json --trace-memory
+                                                         บันทึกเวลา / จำนวนแถว / peak memory ของแต่ละขั้นเป็น JSON
+
+โฟลเดอร์ในเครื่องต้องจัดแบบเดียวกับ Drive: TIKTOK 1 ... LAZADA 3 และ INCOME TIKTOK / INCOME SHOPEE / INCOME LAZADA
+Database: --sqlite / SQLITE_PATH ใน secrets.toml = ไฟล์ SQLite, ไม่งั้น Supabase จาก env SUPABASE_URL / SUPABASE_KEY
+หรือ .streamlit/secrets.toml
+คืน exit code 1 ถ้ามีร้านที่ Sync ไม่สำเร็จ"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+import pandas as pd
+
+from sync_pipeline import (PARENT_FOLDER_ID, SYNC_MAX_WORKERS, DriveSource, LocalFolderSource, SyncJob, SyncCancelled,
+                           collect_sync_files, process_sync_plan, build_master_df, run_sync, save_sync_report, save_data_version,
+                           to_cost_frame)
+from storage import SupabaseStorage, SQLiteStorage
+
+SECRETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".streamlit", "secrets.toml")
+
+def load_secrets():
+    try:
+        import tomllib
+    except ImportError:  # Python < 3.11
+        import toml as tomllib
+    if not os.path.exists(SECRETS_PATH): return {}
+    with open(SECRETS_PATH, 'rb') as fh:
+        return tomllib.loads(fh.read().decode('utf-8'))
+
+def init_storage(args, secrets):
+    if args.sqlite or secrets.get("SQLITE_PATH"): return SQLiteStorage(args.sqlite or secrets["SQLITE_PATH"])
+    from supabase import create_client
+    url = os.environ.get("SUPABASE_URL") or secrets.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_KEY") or secrets.get("SUPABASE_KEY")
+    if not url or not key: raise SystemExit("❌ ไม่พบ SUPABASE_URL / SUPABASE_KEY (env หรือ .streamlit/secrets.toml)")
+    return SupabaseStorage(create_client(url, key))
+
+def make_source(args, secrets):
+    if args.local: return LocalFolderSource(args.local)
+    from google.oauth2 import service_account
+    scopes = ['https://www.googleapis.com/auth/drive.readonly']
+    if args.drive_credentials:
+        creds = service_account.Credentials.from_service_account_file(args.drive_credentials, scopes=scopes)
+    elif 'gcp_service_account' in secrets:
+        creds = service_account.Credentials.from_service_account_info(secrets['gcp_service_account'], scopes=scopes)
+    else:
+        raise SystemExit("❌ ต้องระบุ --local หรือ --drive-credentials (หรือมี gcp_service_account ใน secrets.toml)")
+    return DriveSource(creds, args.folder_id)
+
+def load_costs(args, db):
+    """ตารางต้นทุน: จากไฟล์ CSV (sku, platform, unit_cost) ถ้าระบุ ไม่งั้นจาก product_costs (dry-run ไม่มี db = ต้นทุน 0)"""
+    if args.costs: return to_cost_frame(pd.read_csv(args.costs, dtype=str).to_dict('records'))
+    if db is None: return pd.DataFrame()
+    return to_cost_frame(db.table("product_costs").select("sku, platform, unit_cost").execute().data)
+
+def dry_run(source, plan, job, cost_df, out=None):
+    """ประมวลผลทุกไฟล์ของทุกร้านเหมือน Sync แบบ full แต่ไม่เขียนที่ไหน พิมพ์จำนวนแถว / เวลาที่แต่ละร้านเสร็จ"""
+    selected = {shop: files for info in plan.values() for shop, files in info['shops'].items() if files}
+    started = time.perf_counter()
+    results = []
+    def on_result(shop_name, df, failed_ids):
+        master_df = build_master_df([df], cost_df, job.profile.scope(shop=shop_name)) if not df.empty else pd.DataFrame()
+        results.append(master_df)
+        job.set_shop(shop_name, f"{len(master_df):,} รายการ ({time.perf_counter() - started:.2f}s)", finished=True)
+    failed = process_sync_plan(source, plan, selected, job, on_result, job.max_workers)
+    total = pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+    job.text(f"⏱️ ประมวลผล {sum(len(f) for f in selected.values())} ไฟล์ {len(selected)} ร้าน ได้ {len(total):,} รายการ ใน {time.perf_counter() - started:.2f}s")
+    if out and not total.empty:
+        total.to_parquet(out, index=False) if out.endswith('.parquet') else total.to_csv(out, index=False)
+        job.text(f"💾 บันทึกผลที่ {out}")
+    return failed
+
+def print_failures(job):
+    """สรุปท้ายรอบที่มีข้อผิดพลาด: ร้านที่พัง + ข้อความ error ทั้งหมด (แทนบรรทัด ✅)"""
+    failed_shops = [shop for shop, status in job.shops.items() if status.startswith("❌")]
+    errors = [msg for level, msg in job.logs if level == 'error']
+    print(f"❌ Sync ไม่สำเร็จ: ร้านที่พัง {len(failed_shops)} ร้าน{' (' + ', '.join(failed_shops) + ')' if failed_shops else ''} · ข้อผิดพลาด {len(errors)} รายการ")
+    for msg in errors: print(f"   {msg}")
+    if job.committed and job.stats: print("   บันทึกไปแล้วบางส่วน: {rows:,} รายการ (+{inserted} ~{updated} -{deleted} ={unchanged})".format(**job.stats))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync ไฟล์ export TikTok / Shopee / Lazada เข้า Supabase แบบไม่มีหน้าเว็บ")
+    parser.add_argument("--local", metavar="DIR", help="อ่านไฟล์จากโฟลเดอร์ในเครื่อง (แทน Google Drive)")
+    parser.add_argument("--drive-credentials", metavar="JSON", help="ไฟล์ service account ของ Google Drive")
+    parser.add_argument("--folder-id", default=PARENT_FOLDER_ID, help="id โฟลเดอร์หลักใน Drive")
+    parser.add_argument("--full", action="store_true", help="ประมวลผลใหม่ทุกไฟล์ (ค่าเริ่มต้น: เฉพาะไฟล์ใหม่/ที่แก้ไข)")
+    parser.add_argument("--workers", type=int, default=SYNC_MAX_WORKERS, help="จำนวนไฟล์ที่ดาวน์โหลด/ประมวลผลพร้อมกัน")
+    parser.add_argument("--costs", metavar="CSV", help="ตารางต้นทุน (sku, platform, unit_cost) แทน product_costs")
+    parser.add_argument("--sqlite", metavar="PATH", help="เขียนลงไฟล์ SQLite แทน Supabase (สร้างตารางให้ถ้ายังไม่มี)")
+    parser.add_argument("--dry-run", action="store_true", help="ประมวลผลอย่างเดียว ไม่เขียน Database")
+    parser.add_argument("--out", metavar="FILE", help="ใช้กับ --dry-run: บันทึกผลเป็น .csv / .parquet")
+    parser.add_argument("--report", metavar="JSON", help="บันทึกเวลา / จำนวนแถวของแต่ละขั้น ต่อไฟล์และต่อร้าน เป็น JSON")
+    parser.add_argument("--trace-memory", action="store_true", help="วัด peak memory ของแต่ละขั้นด้วย (ช้าลงหลายเท่า)")
+    args = parser.parse_args(argv)
+
+    secrets = load_secrets()
+    source = make_source(args, secrets)
+    db = None if args.dry_run else init_storage(args, secrets)
+    job = SyncJob(args.full or args.dry_run, args.workers, echo=print, trace_memory=args.trace_memory)
+
+    started = time.perf_counter()
+    plan = collect_sync_files(source.folders())
+    job.text(f"📂 พบ {sum(len(info['income']) + sum(len(f) for f in info['shops'].values()) for info in plan.values())} ไฟล์ ({time.perf_counter() - started:.2f}s)")
+    cost_df = load_costs(args, db)
+    try:
+        if args.dry_run:
+            failed = dry_run(source, plan, job, cost_df, args.out)
+            job.state = 'failed' if failed else 'done'
+            return 1 if failed else 0
+        job.stats = run_sync(db, source, plan, job, job.full, job.max_workers, cost_df=cost_df)
+        job.state = 'failed' if any(level == 'error' for level, _ in job.logs) else 'done'
+        if job.state == 'done' and job.stats: job.text("✅ {rows:,} รายการ (+{inserted} ~{updated} -{deleted} ={unchanged})".format(**job.stats))
+    except (SyncCancelled, KeyboardInterrupt):
+        job.state = 'cancelled'
+        job.error("⏹️ ยกเลิกแล้ว (ร้านที่บันทึกเสร็จแล้วจะถูกข้ามในการ Sync รอบถัดไป)")
+    except Exception as e:
+        job.state = 'failed'
+        job.error(f"❌ {e}")
+        raise
+    finally:
+        if job.committed:
+            # แจ้งแอปว่า orders เปลี่ยน -> ภายใน 1 นาที Cache / snapshot ของทุก session จะโหลดใหม่
+            save_data_version(db, ["orders"], job)
+        job.profile.finish()
+        job.finished_at = datetime.datetime.now()
+        # รายงาน JSON เขียนเสมอ (มี state / errors อยู่ในนั้น) ส่วนตารางเวลาพิมพ์เฉพาะรอบที่สำเร็จ
+        if job.state == 'done' and job.profile.records:
+            print(job.profile.summary().to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+        if args.report: job.text(f"📊 บันทึกเวลาแต่ละขั้นที่ {save_sync_report(job, args.report)}")
+        if job.state != 'done': print_failures(job)
+        job.text(f"⏱️ รวม {time.perf_counter() - started:.2f}s")
+    return 0 if job.state == 'done' else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1231 @@
+"""Sync pipeline: อ่านไฟล์ export ของ TikTok / Shopee / Lazada -> ประมวลผล -> เขียน orders / daily_summary
+ไม่ผูกกับ Streamlit ใช้ได้ทั้งจากแอป (streamlit_app.py) และจาก command line (sync_cli.py)
+
+แหล่งไฟล์ (source) คือ object ที่มี
+  folders()         -> {ชื่อโฟลเดอร์ชั้นบนสุด (TIKTOK 1 ... LAZADA 3 / INCOME *): [ไฟล์ทั้งหมดในโฟลเดอร์นั้นรวมโฟลเดอร์ย่อย]}
+                       ไฟล์ = dict ที่มี id, name, modifiedTime, md5Checksum
+  download(file_id) -> BytesIO ของไฟล์
+มีให้ 2 แบบ: DriveSource (Google Drive) และ LocalFolderSource (โฟลเดอร์ในเครื่อง ใช้รัน offline / จับเวลา)
+ฟังก์ชันที่เขียน Database รับ db (Supabase client) เป็น argument แรก"""
+import io
+import os
+import re
+import json
+import hashlib
+import datetime
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+import pandas as pd
+import openpyxl
+from googleapiclient.discovery import build
+from googleapiclient.http import MediaIoBaseDownload
+
+from data_access import DB_PAGE_SIZE
+from sync_profile import SyncProfile
+
+SYNC_MAX_WORKERS = 4  # จำนวน thread ดาวน์โหลด/ประมวลผลพร้อมกัน (ค่าเริ่มต้น แอปตั้งเองจาก secrets)
+
+# --- FILE SOURCES ---
+PARENT_FOLDER_ID = '1DJp8gpZ8lntH88hXqYuZOwIyFv3NY4Ot'  # โฟลเดอร์หลักใน Google Drive
+# googleapiclient จะ retry ให้เอง (exponential backoff) เมื่อเจอ 429 / 5xx / network error
+DRIVE_NUM_RETRIES = 5
+DRIVE_PAGE_SIZE = 1000          # สูงสุดที่ files().list รับได้
+DRIVE_PARENTS_PER_QUERY = 40    # จำนวนโฟลเดอร์ต่อ 1 query (q มีความยาวจำกัด)
+DRIVE_FILE_FIELDS = "id, name, mimeType, modifiedTime, md5Checksum, size, parents"
+FOLDER_MIME = 'application/vnd.google-apps.folder'
+
+def walk_folder_files(tree, folder_id):
+    """ไฟล์ทั้งหมดใต้โฟลเดอร์ (รวมโฟลเดอร์ย่อย)"""
+    files = []
+    for f in tree.get(folder_id, []):
+        if f['mimeType'] == FOLDER_MIME: files += walk_folder_files(tree, f['id'])
+        else: files.append(f)
+    return files
+
+class DriveSource:
+    """ไฟล์จาก Google Drive โดยโฟลเดอร์ชั้นบนสุดอยู่ใต้ root_id
+    service = client สำหรับ list (ไม่ส่งมาจะสร้างใหม่) ส่วนการดาวน์โหลดใช้ client แยกต่อ thread"""
+
+    def __init__(self, credentials, root_id, service=None):
+        self.credentials = credentials
+        self.root_id = root_id
+        self.service = service or build('drive', 'v3', credentials=credentials, cache_discovery=False)
+        self._local = threading.local()
+
+    def list_files_in_folder(self, folder_ids):
+        """ดึงรายการไฟล์ในโฟลเดอร์ (ส่งมาหลายโฟลเดอร์ได้ จะรวมเป็น query เดียวด้วย OR)
+        ไล่ nextPageToken จนครบทุกหน้า และขอเฉพาะ field ที่ใช้"""
+        if isinstance(folder_ids, str): folder_ids = [folder_ids]
+        files = []
+        for i in range(0, len(folder_ids), DRIVE_PARENTS_PER_QUERY):
+            parents = " or ".join(f"'{fid}' in parents" for fid in folder_ids[i:i+DRIVE_PARENTS_PER_QUERY])
+            query = f"({parents}) and trashed = false"
+            page_token = None
+            while True:
+                results = self.service.files().list(
+                    q=query, pageSize=DRIVE_PAGE_SIZE, pageToken=page_token,
+                    fields=f"nextPageToken, files({DRIVE_FILE_FIELDS})"
+                ).execute(num_retries=DRIVE_NUM_RETRIES)
+                files.extend(results.get('files', []))
+                page_token = results.get('nextPageToken')
+                if not page_token: break
+        return files
+
+    def list_tree(self):
+        """ไล่รายการไฟล์ทั้งต้นไม้ใต้ root ทีละชั้น (1 query ต่อชั้น ไม่ใช่ 1 query ต่อโฟลเดอร์)
+        คืนค่า {folder_id: [ไฟล์และโฟลเดอร์ลูก]}"""
+        tree = {self.root_id: []}
+        level = [self.root_id]
+        while level:
+            next_level = []
+            for f in self.list_files_in_folder(level):
+                for parent in f.get('parents', []):
+                    if parent in tree: tree[parent].append(f)
+                if f['mimeType'] == FOLDER_MIME and f['id'] not in tree:
+                    tree[f['id']] = []
+                    next_level.append(f['id'])
+            level = next_level
+        return tree
+
+    def folders(self):
+        try:
+            tree = self.list_tree()
+        except Exception as e:
+            # ห้ามไปต่อถ้าอ่านรายการไฟล์ไม่ครบ ไม่งั้นโหมด Incremental จะเข้าใจว่าไฟล์ถูกลบ
+            raise RuntimeError(f"อ่านรายการไฟล์จาก Google Drive ไม่สำเร็จ: {e}")
+        root_files = tree.get(self.root_id, [])
+        if not root_files: raise RuntimeError("ไม่พบไฟล์ในโฟลเดอร์หลัก")
+        return {f['name']: walk_folder_files(tree, f['id']) for f in root_files if f['mimeType'] == FOLDER_MIME}
+
+    def client(self):
+        """Drive client แยกต่อ thread (httplib2 ที่อยู่ข้างใต้ใช้ข้าม thread ไม่ได้)"""
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = build('drive', 'v3', credentials=self.credentials, cache_discovery=False)
+            self._local.service = service
+        return service
+
+    def download(self, file_id):
+        request = self.client().files().get_media(fileId=file_id)
+        fh = io.BytesIO()
+        downloader = MediaIoBaseDownload(fh, request)
+        done = False
+        while done is False:
+            status, done = downloader.next_chunk(num_retries=DRIVE_NUM_RETRIES)
+        fh.seek(0)
+        return fh
+
+class LocalFolderSource:
+    """ไฟล์จากโฟลเดอร์ในเครื่องที่จัดแบบเดียวกับ Drive เช่น <root>/TIKTOK 1/*.xlsx, <root>/INCOME SHOPEE/*.xlsx
+    file id = path เทียบกับ root (คงที่ข้ามรอบ), modifiedTime = เวลาแก้ไขไฟล์ (UTC)
+    ไม่คำนวณ md5 -> การตรวจไฟล์ที่เปลี่ยนใช้ modifiedTime อย่างเดียว"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+
+    def folders(self):
+        if not os.path.isdir(self.root): raise RuntimeError(f"ไม่พบโฟลเดอร์ {self.root}")
+        result = {}
+        for name in sorted(os.listdir(self.root)):
+            top = os.path.join(self.root, name)
+            if name.startswith('.') or not os.path.isdir(top): continue
+            files = []
+            for dirpath, dirnames, filenames in os.walk(top):
+                dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+                for fname in sorted(filenames):
+                    if fname.startswith(('.', '~$')): continue
+                    path = os.path.join(dirpath, fname)
+                    stat = os.stat(path)
+                    files.append({
+                        'id': os.path.relpath(path, self.root).replace(os.sep, '/'), 'name': fname,
+                        'modifiedTime': datetime.datetime.fromtimestamp(stat.st_mtime, datetime.timezone.utc).isoformat(),
+                        'md5Checksum': None, 'size': stat.st_size,
+                    })
+            result[name] = files
+        return result
+
+    def download(self, file_id):
+        with open(os.path.join(self.root, *file_id.split('/')), 'rb') as fh:
+            return io.BytesIO(fh.read())
+
+def make_download_scheduler(pool, download):
+    """คิวดาวน์โหลดกลางของรอบ Sync: ส่งไฟล์เข้า pool ล่วงหน้า (prefetch) แล้วค่อยรอผลตอนใช้ (fetch)
+    ไฟล์เดียวกัน เช่นไฟล์ Income ที่ทุกร้านของ Platform ใช้ร่วมกัน จะถูกดาวน์โหลดแค่ครั้งเดียว"""
+    futures = {}
+    lock = threading.Lock()
+
+    def prefetch(files):
+        with lock:
+            for f in files:
+                if f['id'] not in futures:
+                    futures[f['id']] = pool.submit(download, f['id'])
+
+    def fetch(file_id):
+        prefetch([{'id': file_id}])
+        # แต่ละร้านได้ BytesIO ของตัวเอง จะได้ seek/read พร้อมกันได้
+        return io.BytesIO(futures[file_id].result().getvalue())
+
+    return prefetch, fetch
+
+# --- 2. PARSING HELPERS ---
+
+def clean_date(df, col_name):
+    """
+    แปลงข้อมูลเป็นวันที่ (Date Only) ตัดเวลาทิ้ง
+    รองรับทั้ง:
+    - TikTok/Thai: 27/12/2025 (DD/MM/YYYY)
+    - Shopee/ISO:  2026-01-09 00:02 (YYYY-MM-DD HH:MM)
+    """
+    if col_name in df.columns:
+        # 1. แปลงเป็น String และลบช่องว่าง
+        df[col_name] = df[col_name].astype(str).str.strip()
+        # 2. จัดการค่าว่าง
+        df[col_name] = df[col_name].replace({'nan': None, 'None': None, '': None, 'NaT': None})
+        # 3. แปลงเป็น DateTime
+        try:
+            df[col_name] = pd.to_datetime(df[col_name], errors='coerce', dayfirst=True, format='mixed').dt.date
+        except (ValueError, TypeError):
+            df[col_name] = pd.to_datetime(df[col_name], errors='coerce', dayfirst=True).dt.date
+    return df
+
+def clean_text(df, col_name):
+    if col_name in df.columns:
+        df[col_name] = df[col_name].astype(str).str.strip().str.upper()
+    return df
+
+def normalize_order_ids(ids):
+    """แก้เลขออเดอร์ที่ Excel แปลงเป็น 5.77E+17 หรือมี .0 ต่อท้าย (ทำทั้งคอลัมน์ในครั้งเดียว)
+    - มี e/E และแปลงเป็นตัวเลขได้ -> เลขจำนวนเต็มเต็มหลัก, แปลงไม่ได้ -> คงค่าเดิม
+    - นอกนั้น -> ตัด '.0' ออก
+    """
+    ids = ids.astype(object)
+    missing = ids.isna()
+    if missing.any():
+        ids = ids.where(~missing, ids[missing].map(str))  # NaN -> 'nan', None -> 'None' เหมือน str(val)
+    ids = ids.astype(str).str.strip()
+    out = ids.str.replace('.0', '', regex=False).to_numpy(dtype=object)
+
+    sci = ids.str.contains('[eE]', regex=True, na=False).to_numpy()
+    if sci.any():
+        sci_pos = np.flatnonzero(sci)
+        raw = ids.to_numpy(dtype=object)[sci_pos]
+        out[sci_pos] = raw
+        nums = pd.to_numeric(pd.Series(raw), errors='coerce').to_numpy(dtype='float64')
+        finite = np.isfinite(nums)
+        small = finite & (np.abs(nums) < 2**63)
+        out[sci_pos[small]] = nums[small].astype(np.int64).astype(str)
+        # เลขยาวเกิน int64 (แทบไม่มี) ใช้ int() ของ Python
+        big = finite & ~small
+        out[sci_pos[big]] = [str(int(v)) for v in nums[big]]
+    return pd.Series(out, index=ids.index)
+
+# กฎแปลงสถานะ (เรียงตามลำดับความสำคัญ): ได้รับเงินแล้ว > คำว่ายกเลิก > คำว่าตีกลับ > รอดำเนินการ
+# เจอสถานะแบบใหม่ของ Platform ไหน ให้เพิ่มคำ (ตัวพิมพ์เล็ก) ลงในตารางนี้ได้เลย
+STATUS_SUCCESS = "ออเดอร์สำเร็จ"
+STATUS_DEFAULT = "รอดำเนินการ"
+STATUS_RULES = [
+    ("ยกเลิก", ['ยกเลิก', 'cancel', 'failed']),
+    ("ตีกลับ", ['returned', 'return', 'ตีกลับ', 'refund']),
+]
+
+def classify_status(df):
+    """คำนวณสถานะมาตรฐานของทุกแถวในครั้งเดียว (np.select แทน df.apply ทีละแถว)"""
+    amt = pd.to_numeric(df['settlement_amount'], errors='coerce') if 'settlement_amount' in df.columns else pd.Series(0.0, index=df.index)
+    raw_status = df['status'].astype(str).str.lower() if 'status' in df.columns else pd.Series('', index=df.index)
+    conditions = [amt.fillna(0).gt(0).to_numpy()]
+    for _, keywords in STATUS_RULES:
+        pattern = "|".join(re.escape(k) for k in keywords)
+        conditions.append(raw_status.str.contains(pattern, regex=True, na=False).to_numpy())
+    choices = [STATUS_SUCCESS] + [label for label, _ in STATUS_RULES]
+    return pd.Series(np.select(conditions, choices, default=STATUS_DEFAULT), index=df.index, dtype=object)
+
+def find_header_row(data_io, required_keywords, sheet_name=0):
+    data_io.seek(0)
+    try:
+        preview = pd.read_excel(data_io, sheet_name=sheet_name, header=None, nrows=20, dtype=str)
+        best_row_idx = 0
+        max_matches = 0
+        for i, row in preview.iterrows():
+            row_text = " ".join([str(x).lower().strip() for x in row.values if pd.notna(x)])
+            matches = sum(1 for k in required_keywords if k.lower() in row_text)
+            if matches > max_matches:
+                max_matches = matches
+                best_row_idx = i
+        data_io.seek(0)
+        return best_row_idx if max_matches > 0 else 0
+    except:
+        data_io.seek(0)
+        return 0
+
+# ค่าที่ pd.read_excel ถือเป็นค่าว่าง (NaN) ตอนอ่านแบบ dtype=str
+EXCEL_NA_VALUES = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                   '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+
+def excel_cell_str(v):
+    """แปลงค่าใน cell ให้เหมือน pd.read_excel(dtype=str): เลขจำนวนเต็มไม่มี .0 และค่าว่าง / N/A เป็น NaN"""
+    if v is None: return np.nan
+    if isinstance(v, bool): return str(v)
+    if isinstance(v, float) and v.is_integer(): v = int(v)
+    v = str(v)
+    return np.nan if v in EXCEL_NA_VALUES else v
+
+def read_excel_with_header(data_io, required_keywords, sheet_name=0, scan_rows=20):
+    """อ่าน Excel รอบเดียวแทน find_header_row + pd.read_excel (ที่ต้องแตก zip / parse XML 2 รอบ)
+
+    เปิด workbook แบบ read-only (streaming) หาแถว header จาก scan_rows แถวแรกด้วยเกณฑ์เดียวกับ find_header_row
+    แล้วอ่านแถวที่เหลือต่อจาก iterator เดิมเป็น DataFrame ค่าทุกช่องเป็น string เหมือน pd.read_excel(dtype=str)
+    ไฟล์ที่ openpyxl เปิดไม่ได้ (.xls แบบเก่า) จะกลับไปใช้วิธีเดิม
+    """
+    data_io.seek(0)
+    try:
+        wb = openpyxl.load_workbook(data_io, read_only=True, data_only=True, keep_links=False)
+    except Exception:
+        header_idx = find_header_row(data_io, required_keywords, sheet_name=sheet_name)
+        return pd.read_excel(data_io, sheet_name=sheet_name, header=header_idx, dtype=str)
+
+    try:
+        ws = wb.worksheets[sheet_name] if isinstance(sheet_name, int) else wb[sheet_name]
+        ws.reset_dimensions()  # บางไฟล์ export ระบุขนาด sheet ผิด ทำให้อ่านไม่ครบ
+        rows = ws.iter_rows(values_only=True)
+
+        head = [[excel_cell_str(v) for v in r] for r in itertools.islice(rows, scan_rows)]
+        best_row_idx = 0
+        max_matches = 0
+        for i, row in enumerate(head):
+            row_text = " ".join([x.lower().strip() for x in row if isinstance(x, str)])
+            matches = sum(1 for k in required_keywords if k.lower() in row_text)
+            if matches > max_matches:
+                max_matches = matches
+                best_row_idx = i
+
+        header = head[best_row_idx] if head else []
+        data = head[best_row_idx + 1:]
+        data.extend([excel_cell_str(v) for v in r] for r in rows)
+    finally:
+        wb.close()
+
+    # ตัดแถวว่างท้ายตาราง แล้วเติมทุกแถวให้กว้างเท่ากัน (เหมือน pd.read_excel)
+    while data and not any(isinstance(v, str) for v in data[-1]): data.pop()
+    width = max([len(header)] + [len(r) for r in data])
+    columns, seen = [], {}
+    for i in range(width):
+        name = header[i] if i < len(header) and isinstance(header[i], str) else f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(name)
+    data = [r + [np.nan] * (width - len(r)) for r in data]
+    return pd.DataFrame(data, columns=columns, dtype=str)
+
+def get_col_data(df, candidates):
+    cols_norm = [" ".join(str(c).replace('\n', ' ').split()).lower() for c in df.columns]
+    for cand in candidates:
+        cand_clean = " ".join(cand.split()).lower()
+        if cand_clean in cols_norm:
+            idx = cols_norm.index(cand_clean)
+            return df.iloc[:, idx]
+    return None
+
+def skip_non_export(report, f):
+    """ไฟล์ที่ไม่มีคอลัมน์เลขคำสั่งซื้อ (เช่นไฟล์แผนโปรโมชันที่วางไว้ในโฟลเดอร์) ไม่ใช่ไฟล์ export: ข้ามไป แต่ยังจดลง manifest
+    ต่างจากไฟล์ที่อ่านไม่ได้ (ดาวน์โหลด / แปลงไม่สำเร็จ) ที่ต้องลองใหม่รอบหน้า"""
+    report.warning(f"⚠️ ข้ามไฟล์ {f.get('folder_name') or ''}/{f['name']}: ไม่พบคอลัมน์เลขคำสั่งซื้อ (ไม่ใช่ไฟล์ export)")
+
+def to_cost_frame(rows):
+    df = pd.DataFrame(rows)
+    if df.empty: return pd.DataFrame()
+    df['unit_cost'] = pd.to_numeric(df['unit_cost'], errors='coerce').fillna(0)
+    df['platform'] = df['platform'].str.upper().str.strip()
+    df = clean_text(df, 'sku')
+    return df[['sku', 'platform', 'unit_cost']]
+
+# --- 3. PROCESSORS ---
+
+def load_tiktok_income(inc_files, fetch, report):
+    """โหลดไฟล์ Income TikTok ทั้งโฟลเดอร์ -> ตารางยอดเงินที่ index ด้วย order_id (ใช้ร่วมกันทุกร้าน)"""
+    profile = report.profile.scope(shop=INCOME_FOLDERS['TIKTOK'])
+    income_dfs = []
+    failed = []  # id ไฟล์ Income ที่อ่านไม่ได้ (ยอดเงินของทั้ง Platform จะไม่ครบ)
+    for f in inc_files:
+        if any(ext in f['name'].lower() for ext in ['xlsx', 'xls', 'csv']):
+            try:
+                data = fetch(f['id'])
+                with profile.stage('read', file=f['name']) as rec:
+                    if 'csv' in f['name'].lower():
+                        try:
+                            data.seek(0); df = pd.read_csv(data, dtype=str)
+                        except UnicodeDecodeError:
+                            data.seek(0); df = pd.read_csv(data, encoding='cp874', dtype=str)
+                    else:
+                        df = read_excel_with_header(data, ['Order ID', 'Settlement Amount', 'Affiliate Commission'])
+                    rec['rows_out'] = len(df)
+                
+                with profile.stage('extract', rows_in=len(df), file=f['name']) as rec:
+                    inc = pd.DataFrame()
+                    oid = get_col_data(df, ['Order ID', 'Order No', 'หมายเลขคำสั่งซื้อ'])
+                    if oid is None: skip_non_export(report, f); continue
+                    inc['order_id'] = oid
+                
+                    settle = get_col_data(df, ['Settlement Amount', 'Payout Amount', 'ยอดเงินที่ได้รับ'])
+                    inc['settlement_amount'] = pd.to_numeric(settle, errors='coerce').fillna(0)
+                
+                    aff = get_col_data(df, ['Affiliate Commission', 'Affiliate Fee', 'ค่าคอมมิชชั่น'])
+                    inc['affiliate'] = pd.to_numeric(aff, errors='coerce').fillna(0)
+                
+                    fee = get_col_data(df, ['Platform Fee', 'Transaction Fee', 'ค่าธรรมเนียม'])
+                    inc['fees'] = pd.to_numeric(fee, errors='coerce').fillna(0)
+                
+                    inc['order_id'] = normalize_order_ids(inc['order_id'])
+                    rec['rows_out'] = len(inc)
+                income_dfs.append(inc)
+            except Exception as e:
+                report.error(f"❌ TikTok Income {f['name']}: {e}")
+                failed.append(f['id'])
+    
+    if not income_dfs: return pd.DataFrame(), failed
+    with profile.stage('income_group', rows_in=sum(len(d) for d in income_dfs)) as rec:
+        combined_inc = pd.concat(income_dfs, ignore_index=True)
+        combined_inc['order_id'] = combined_inc['order_id'].astype(str).str.strip()
+        income_master = combined_inc.groupby('order_id')[['settlement_amount', 'affiliate', 'fees']].sum()
+        rec['rows_out'] = len(income_master)
+    return income_master, failed
+
+def process_tiktok(order_files, income_master, shop_name, fetch, report):
+    profile = report.profile.scope(shop=shop_name)
+    # --- Read Order Files ---
+    all_orders = []
+    failed = []  # id ไฟล์ที่อ่านไม่ได้ (ข้อมูลเดิมของไฟล์นี้ต้องไม่ถูกลบ)
+    for f in order_files:
+        if any(ext in f['name'].lower() for ext in ['xlsx', 'xls', 'csv']):
+            try:
+                data = fetch(f['id'])
+                with profile.stage('read', file=f['name']) as rec:
+                    if 'csv' in f['name'].lower():
+                        try: data.seek(0); df = pd.read_csv(data, dtype=str)
+                        except UnicodeDecodeError: data.seek(0); df = pd.read_csv(data, encoding='cp874', dtype=str)
+                    else:
+                        df = read_excel_with_header(data, ['Order ID', 'Seller SKU', 'Product Name'])
+                    rec['rows_out'] = len(df)
+                
+                with profile.stage('extract', rows_in=len(df), file=f['name']) as rec:
+                    extracted = pd.DataFrame()
+                    oid = get_col_data(df, ['Order ID', 'หมายเลขคำสั่งซื้อ', 'Order Serial No.'])
+                    if oid is None: skip_non_export(report, f); continue
+                    extracted['order_id'] = oid
+                    extracted['status'] = get_col_data(df, ['Order Status', 'สถานะคำสั่งซื้อ'])
+                    if 'status' not in extracted.columns: extracted['status'] = 'สำเร็จ'
+
+                    sku = get_col_data(df, ['Seller SKU', 'รหัสสินค้าของผู้ขาย', 'SKU ID'])
+                    extracted['sku'] = sku if sku is not None else '-'
+
+                    qty = get_col_data(df, ['Quantity', 'จำนวน', 'Qty'])
+                    extracted['quantity'] = pd.to_numeric(qty, errors='coerce').fillna(1) if qty is not None else 1
+
+                    sales = get_col_data(df, ['SKU Subtotal After Discount', 'Order Amount', 'ยอดคำสั่งซื้อ'])
+                    extracted['sales_amount'] = pd.to_numeric(sales, errors='coerce').fillna(0) if sales is not None else 0
+
+                    extracted['created_date'] = get_col_data(df, ['Created Time', 'เวลาที่สร้าง'])
+                    extracted['shipped_date'] = get_col_data(df, ['Shipped Time', 'เวลาจัดส่ง', 'RTS Time'])
+                
+                    track = get_col_data(df, ['Tracking ID', 'หมายเลขติดตามพัสดุ'])
+                    extracted['tracking_id'] = track if track is not None else '-'
+                
+                    pname = get_col_data(df, ['Product Name', 'ชื่อสินค้า'])
+                    extracted['product_name'] = pname if pname is not None else '-'
+
+                    extracted['shop_name'] = shop_name
+                    extracted['platform'] = 'TIKTOK'
+                    extracted['source_file_id'] = f['id']
+
+                    extracted = clean_date(extracted, 'created_date')
+                    extracted = clean_date(extracted, 'shipped_date')
+                    extracted['order_id'] = normalize_order_ids(extracted['order_id'])
+                    extracted = clean_text(extracted, 'sku')
+                    rec['rows_out'] = len(extracted)
+                all_orders.append(extracted)
+
+            except Exception as e:
+                report.error(f"❌ TikTok Order {f['name']}: {e}")
+                failed.append(f['id'])
+                continue
+
+    if not all_orders: return pd.DataFrame(), failed
+    with profile.stage('income_merge', rows_in=sum(len(d) for d in all_orders)) as rec:
+        final_orders = pd.concat(all_orders, ignore_index=True)
+        
+        # --- Merge with Income Data ---
+        if not income_master.empty:
+            final_orders['order_id'] = final_orders['order_id'].astype(str).str.strip()
+            merged = final_orders.join(income_master, on='order_id')
+            for col in ['settlement_amount', 'affiliate', 'fees']:
+                if col in merged.columns: merged[col] = merged[col].fillna(0)
+        else:
+            merged = final_orders
+            merged['settlement_amount'] = 0
+            merged['affiliate'] = 0
+            merged['fees'] = 0
+        rec['rows_out'] = len(merged)
+    return merged, failed
+
+def load_shopee_income(inc_files, fetch, report):
+    """โหลดไฟล์ Income Shopee (sheet 'Income') -> ตารางยอดเงินที่ index ด้วย order_id"""
+    profile = report.profile.scope(shop=INCOME_FOLDERS['SHOPEE'])
+    income_dfs = []
+    failed = []
+    for f in inc_files:
+        if any(x in f['name'].lower() for x in ['xls', 'xlsx']):
+            try:
+                data = fetch(f['id'])
+                with profile.stage('read', file=f['name']) as rec:
+                    df = read_excel_with_header(data, ['หมายเลขคำสั่งซื้อ', 'Order ID'], sheet_name='Income')
+                    rec['rows_out'] = len(df)
+                
+                with profile.stage('extract', rows_in=len(df), file=f['name']) as rec:
+                    inc = pd.DataFrame()
+                    oid = get_col_data(df, ['หมายเลขคำสั่งซื้อ', 'Order ID'])
+                    if oid is None: skip_non_export(report, f); continue
+                    inc['order_id'] = oid
+                    inc['settlement_date'] = get_col_data(df, ['วันที่โอนชำระเงินสำเร็จ', 'Payout Completed Date'])
+                    inc['settlement_amount'] = pd.to_numeric(get_col_data(df, ['จำนวนเงินทั้งหมดที่โอนแล้ว (฿)', 'Payout Amount']), errors='coerce')
+                    inc['original_price'] = pd.to_numeric(get_col_data(df, ['สินค้าราคาปกติ', 'Original Price']), errors='coerce')
+                    inc['affiliate'] = pd.to_numeric(get_col_data(df, ['ค่าคอมมิชชั่น', 'Commission Fee']), errors='coerce') 
+                
+                    if not inc.empty and 'order_id' in inc.columns:
+                        inc['fees'] = (inc['original_price'].fillna(0) - inc['settlement_amount'].fillna(0))
+                        inc = clean_date(inc, 'settlement_date')
+                        inc['order_id'] = normalize_order_ids(inc['order_id'])
+                        income_dfs.append(inc)
+                    rec['rows_out'] = len(inc)
+            except Exception as e:
+                report.error(f"❌ Shopee Income {f['name']}: {e}")
+                failed.append(f['id'])
+    
+    if not income_dfs: return pd.DataFrame(), failed
+    with profile.stage('income_group', rows_in=sum(len(d) for d in income_dfs)) as rec:
+        income_master = pd.concat(income_dfs, ignore_index=True).drop_duplicates(subset=['order_id']).set_index('order_id')
+        rec['rows_out'] = len(income_master)
+    return income_master, failed
+
+def process_shopee(order_files, income_master, shop_name, fetch, report):
+    profile = report.profile.scope(shop=shop_name)
+    all_orders = []
+    failed = []  # id ไฟล์ที่อ่านไม่ได้ (ข้อมูลเดิมของไฟล์นี้ต้องไม่ถูกลบ)
+
+    # --- Shopee Orders ---
+    for f in order_files:
+        if any(x in f['name'].lower() for x in ['xls', 'xlsx']):
+            try:
+                data = fetch(f['id'])
+                with profile.stage('read', file=f['name']) as rec:
+                    df = read_excel_with_header(data, ['หมายเลขคำสั่งซื้อ', 'Order ID'])
+                    rec['rows_out'] = len(df)
+                
+                with profile.stage('extract', rows_in=len(df), file=f['name']) as rec:
+                    ext = pd.DataFrame()
+                    oid = get_col_data(df, ['หมายเลขคำสั่งซื้อ', 'Order ID'])
+                    if oid is None: skip_non_export(report, f); continue
+                
+                    ext['order_id'] = oid
+                    ext['status'] = get_col_data(df, ['สถานะการสั่งซื้อ', 'Order Status'])
+                    ext['sku'] = get_col_data(df, ['เลขอ้างอิง SKU (SKU Reference No.)', 'SKU Reference No.'])
+                    ext['quantity'] = pd.to_numeric(get_col_data(df, ['จำนวน', 'Quantity']), errors='coerce').fillna(1)
+                    ext['sales_amount'] = pd.to_numeric(get_col_data(df, ['ราคาขายสุทธิ', 'Net Price', 'ราคาต่อหน่วย']), errors='coerce').fillna(0)
+                    ext['tracking_id'] = get_col_data(df, ['หมายเลขติดตามพัสดุ', 'Tracking Number*'])
+                    ext['created_date'] = get_col_data(df, ['วันที่ทำการสั่งซื้อ', 'Order Creation Date'])
+                    ext['shipped_date'] = get_col_data(df, ['เวลาการชำระสินค้า', 'Payment Time'])
+                    ext['product_name'] = get_col_data(df, ['ชื่อสินค้า', 'Product Name'])
+
+                    ext['shop_name'] = shop_name
+                    ext['platform'] = 'SHOPEE'
+                    ext['source_file_id'] = f['id']
+                
+                    ext = clean_date(ext, 'created_date')
+                    ext = clean_date(ext, 'shipped_date')
+                    ext['order_id'] = normalize_order_ids(ext['order_id'])
+                    ext = clean_text(ext, 'sku')
+                    rec['rows_out'] = len(ext)
+                
+                all_orders.append(ext)
+            except Exception as e:
+                report.error(f"❌ Shopee {f['name']}: {e}")
+                failed.append(f['id'])
+
+    if not all_orders: return pd.DataFrame(), failed
+    with profile.stage('income_merge', rows_in=sum(len(d) for d in all_orders)) as rec:
+        final = pd.concat(all_orders, ignore_index=True)
+        
+        if not income_master.empty:
+            final = final.join(income_master, on='order_id')
+        rec['rows_out'] = len(final)
+    return final, failed
+
+def load_lazada_income(inc_files, fetch, report):
+    """โหลดไฟล์ Income Lazada -> รวมยอดบวก/ลบต่อ order_id เป็นตารางยอดเงินที่ index ด้วย order_id"""
+    profile = report.profile.scope(shop=INCOME_FOLDERS['LAZADA'])
+    income_dfs = []
+    failed = []
+    for f in inc_files:
+        if any(ext in f['name'].lower() for ext in ['xlsx', 'xls']):
+            try:
+                data = fetch(f['id'])
+                with profile.stage('read', file=f['name']) as rec:
+                    df = read_excel_with_header(data, ['Order No.', 'หมายเลขคำสั่งซื้อ', 'Transaction Date', 'วันที่ทำรายการ'])
+                    rec['rows_out'] = len(df)
+                
+                with profile.stage('extract', rows_in=len(df), file=f['name']) as rec:
+                    inc = pd.DataFrame()
+                    oid = get_col_data(df, ['Order No.', 'หมายเลขคำสั่งซื้อ', 'Order ID'])
+                    if oid is None: skip_non_export(report, f); continue
+                    inc['order_id'] = oid
+                
+                    inc['settlement_date'] = get_col_data(df, ['Transaction Date', 'วันที่ทำรายการ'])
+                    amt_col = get_col_data(df, ['Amount (incl. VAT)', 'Amount', 'จำนวนเงิน(รวมภาษี)'])
+                    inc['settlement_amount'] = pd.to_numeric(amt_col, errors='coerce').fillna(0)
+                
+                    inc['order_id'] = normalize_order_ids(inc['order_id'])
+                    rec['rows_out'] = len(inc)
+                income_dfs.append(inc)
+            except Exception as e:
+                report.error(f"❌ Lazada Income {f['name']}: {e}")
+                failed.append(f['id'])
+
+    if not income_dfs: return pd.DataFrame(), failed
+    with profile.stage('income_group', rows_in=sum(len(d) for d in income_dfs)) as rec:
+        raw_income = pd.concat(income_dfs, ignore_index=True)
+        raw_income['order_id'] = raw_income['order_id'].astype(str).str.strip()
+        income_master = raw_income.groupby('order_id').agg(
+            settlement_amount=('settlement_amount', lambda x: x[x > 0].sum()),
+            fees=('settlement_amount', lambda x: abs(x[x < 0].sum())),
+            settlement_date=('settlement_date', 'first')
+        )
+        income_master = clean_date(income_master, 'settlement_date')
+        income_master['original_price'] = 0
+        income_master['affiliate'] = 0
+        rec['rows_out'] = len(income_master)
+    return income_master, failed
+
+def process_lazada(order_files, income_master, shop_name, fetch, report):
+    profile = report.profile.scope(shop=shop_name)
+    all_orders = []
+    failed = []  # id ไฟล์ที่อ่านไม่ได้ (ข้อมูลเดิมของไฟล์นี้ต้องไม่ถูกลบ)
+
+    # --- Lazada Orders ---
+    for f in order_files:
+        if any(ext in f['name'].lower() for ext in ['xlsx', 'xls']):
+            try:
+                data = fetch(f['id'])
+                with profile.stage('read', file=f['name']) as rec:
+                    df = read_excel_with_header(data, ['Order Item Id', 'orderNumber', 'หมายเลขคำสั่งซื้อ'])
+                    rec['rows_out'] = len(df)
+                
+                with profile.stage('extract', rows_in=len(df), file=f['name']) as rec:
+                    ext = pd.DataFrame()
+                    oid = get_col_data(df, ['orderNumber', 'หมายเลขคำสั่งซื้อ', 'Order Number'])
+                    if oid is None: skip_non_export(report, f); continue
+                
+                    ext['order_id'] = oid
+                    ext['status'] = get_col_data(df, ['status', 'สถานะ'])
+                    ext['sku'] = get_col_data(df, ['sellerSku', 'Seller SKU', 'รหัสสินค้าของร้านค้า'])
+                    ext['sales_amount'] = pd.to_numeric(get_col_data(df, ['paidPrice', 'ราคาที่ชำระ', 'Paid Price']), errors='coerce').fillna(0)
+                    ext['tracking_id'] = get_col_data(df, ['trackingCode', 'Tracking Code', 'รหัสติดตามพัสดุ'])
+                    ext['created_date'] = get_col_data(df, ['createTime', 'Created at', 'เวลาที่สั่งซื้อ'])
+                    ext['shipped_date'] = get_col_data(df, ['updateTime', 'Updated at', 'เวลาที่ปรับปรุงล่าสุด']) 
+                    ext['product_name'] = get_col_data(df, ['itemName', 'Item Name', 'ชื่อสินค้า'])
+                
+                    ext['quantity'] = 1 
+                    ext['shop_name'] = shop_name
+                    ext['platform'] = 'LAZADA'
+                    ext['source_file_id'] = f['id']
+                
+                    ext = clean_date(ext, 'created_date')
+                    ext = clean_date(ext, 'shipped_date')
+                    ext['order_id'] = normalize_order_ids(ext['order_id'])
+                    ext = clean_text(ext, 'sku')
+                    rec['rows_out'] = len(ext)
+                all_orders.append(ext)
+            except Exception as e:
+                report.error(f"❌ Lazada Order {f['name']}: {e}")
+                failed.append(f['id'])
+
+    if not all_orders: return pd.DataFrame(), failed
+    with profile.stage('income_merge', rows_in=sum(len(d) for d in all_orders)) as rec:
+        final_orders = pd.concat(all_orders, ignore_index=True)
+        
+        if not income_master.empty:
+            final_orders['order_id'] = final_orders['order_id'].astype(str).str.strip()
+            merged = final_orders.join(income_master, on='order_id')
+            for col in ['settlement_amount', 'affiliate', 'fees', 'original_price']:
+                if col in merged.columns: merged[col] = merged[col].fillna(0)
+        else:
+            merged = final_orders
+            for col in ['settlement_amount', 'affiliate', 'fees', 'original_price']:
+                merged[col] = 0
+        rec['rows_out'] = len(merged)
+    return merged, failed
+
+# --- 4. SYNC ENGINE ---
+# Incremental Sync: เก็บ manifest ของไฟล์ใน Drive (file id, modifiedTime, md5Checksum) ไว้ในตาราง sync_manifest
+# และเก็บ source_file_id ไว้ในทุกแถวของ orders เพื่อให้รู้ว่าแถวไหนมาจากไฟล์ไหน
+# รอบถัดไปจะประมวลผลใหม่เฉพาะไฟล์ที่เพิ่มเข้ามา / ถูกแก้ไข / ถูกลบ
+#
+# ตารางที่ต้องมีใน Supabase:
+#   sync_manifest(file_id text primary key, file_name text, folder_name text, platform text, shop_name text,
+#                 kind text, modified_time text, md5_checksum text, row_count int, synced_at timestamptz)
+#   orders.source_file_id text  (ควรทำ index ไว้ด้วย)
+#   orders.row_hash text + unique (order_id, sku, shop_name)  -> ใช้เขียนแบบ upsert เฉพาะแถวที่เปลี่ยน
+#   daily_summary(created_date date, shop_name text, platform text, success_count int, pending_count int,
+#                 return_count int, cancel_count int, sales_sum numeric, cost_sum numeric, fees_sum numeric,
+#                 affiliate_sum numeric, primary key (created_date, shop_name, platform))
+#     -> ยอดสรุปรายวันต่อร้านสำหรับ Dashboard สร้างใหม่ทุกครั้งที่ Sync (เฉพาะวัน/ร้านที่ orders เปลี่ยน)
+
+SHOP_FOLDERS = {'TIKTOK': ['TIKTOK 1', 'TIKTOK 2', 'TIKTOK 3'], 'SHOPEE': ['SHOPEE 1', 'SHOPEE 2', 'SHOPEE 3'], 'LAZADA': ['LAZADA 1', 'LAZADA 2', 'LAZADA 3']}
+INCOME_FOLDERS = {'TIKTOK': 'INCOME TIKTOK', 'SHOPEE': 'INCOME SHOPEE', 'LAZADA': 'INCOME LAZADA'}
+PROCESSORS = {'TIKTOK': process_tiktok, 'SHOPEE': process_shopee, 'LAZADA': process_lazada}
+# Processor คืน (DataFrame ออเดอร์ของร้าน, [id ไฟล์ที่อ่านไม่ได้]) ไฟล์ที่อ่านไม่ได้จะไม่ถูกนับว่า Sync แล้ว
+# Income Loader คืน (ตารางยอดเงิน, [id ไฟล์ที่อ่านไม่ได้]) และแจ้งไฟล์ที่อ่านไม่ได้ผ่าน report.error เหมือนกัน
+INCOME_LOADERS = {'TIKTOK': load_tiktok_income, 'SHOPEE': load_shopee_income, 'LAZADA': load_lazada_income}
+ORDER_COLUMNS = ['order_id', 'status', 'sku', 'product_name', 'quantity', 'sales_amount', 'settlement_amount', 'fees', 'affiliate', 'net_profit', 'total_cost', 'unit_cost', 'settlement_date', 'created_date', 'shipped_date', 'tracking_id', 'shop_name', 'platform', 'source_file_id']
+ORDER_KEY = ['order_id', 'sku', 'shop_name']
+IN_FILTER_CHUNK = 200  # จำนวนค่าต่อ 1 คำสั่ง .in_() กัน URL ยาวเกิน
+WRITE_CHUNK = 500
+SUMMARY_KEY = ['created_date', 'shop_name', 'platform']
+SUMMARY_STATUS_COUNTS = {'success_count': STATUS_SUCCESS, 'pending_count': 'รอดำเนินการ', 'return_count': 'ตีกลับ', 'cancel_count': 'ยกเลิก'}
+SUMMARY_SUMS = {'sales_sum': 'sales_amount', 'cost_sum': 'total_cost', 'fees_sum': 'fees', 'affiliate_sum': 'affiliate'}
+SUMMARY_VALUE_COLUMNS = list(SUMMARY_STATUS_COUNTS) + list(SUMMARY_SUMS)
+SUMMARY_ORDER_COLUMNS = ['created_date', 'shop_name', 'platform', 'status'] + list(SUMMARY_SUMS.values())  # คอลัมน์ orders ที่ summarize_orders ใช้
+SUMMARY_COLUMNS = SUMMARY_KEY + SUMMARY_VALUE_COLUMNS
+
+def is_data_file(f):
+    return any(ext in f['name'].lower() for ext in ['xlsx', 'xls', 'csv'])
+
+def collect_sync_files(folders):
+    """รวบรวมไฟล์ที่ต้อง Sync แยกตาม Platform / ร้านค้า พร้อมข้อมูลที่ใช้ทำ manifest
+    folders = source.folders() -> {ชื่อโฟลเดอร์ชั้นบนสุด: [ไฟล์ทั้งหมดในโฟลเดอร์นั้น]}"""
+    plan = {}
+    for platform, shop_list in SHOP_FOLDERS.items():
+        inc_name = INCOME_FOLDERS[platform]
+        inc_files = [dict(f, platform=platform, shop_name=None, kind='income', folder_name=inc_name)
+                     for f in folders.get(inc_name, []) if is_data_file(f)]
+        shop_files = {}
+        for shop_name in shop_list:
+            if shop_name in folders:
+                shop_files[shop_name] = [dict(f, platform=platform, shop_name=shop_name, kind='orders', folder_name=shop_name)
+                                         for f in folders[shop_name] if is_data_file(f)]
+        plan[platform] = {'income': inc_files, 'shops': shop_files}
+    return plan
+
+def process_sync_plan(source, plan, selected, job, on_result, max_workers=SYNC_MAX_WORKERS):
+    """ประมวลผลไฟล์ออเดอร์ที่เลือก (selected = {shop_name: [files]}) ด้วย Processor ของแต่ละ Platform
+
+    ดาวน์โหลดไฟล์จาก source พร้อมกันไม่เกิน max_workers ไฟล์ และประมวลผลหลายร้านพร้อมกัน
+    โฟลเดอร์ Income ถูกโหลดครั้งเดียวต่อ Platform แล้วแชร์ตารางยอดเงินให้ทุกร้านของ Platform นั้น
+    ร้านไหนเสร็จก่อนจะถูกส่งให้ on_result(shop_name, df, failed_ids) ทันที (เรียกจาก thread นี้ทีละร้าน)
+    failed_ids = id ไฟล์ของร้านที่ Processor อ่านไม่ได้ ถ้าไฟล์ Income ของ Platform อ่านไม่ได้ ทุกร้านของ Platform นั้นจะพัง
+    คืนรายชื่อร้านที่พัง ถ้า job ถูกยกเลิกจะทิ้งงานที่ยังไม่เริ่มแล้ว raise SyncCancelled
+    เวลาดาวน์โหลด / อ่าน / แปลงของแต่ละไฟล์ถูกบันทึกลง job.profile
+    """
+    failed = []
+    file_labels = {f['id']: (f.get('folder_name'), f['name'])
+                   for info in plan.values() for f in info['income'] + [f for files in info['shops'].values() for f in files]}
+
+    def download(file_id):
+        folder_name, name = file_labels.get(file_id, (None, file_id))
+        with job.profile.stage('download', shop=folder_name, file=name):
+            return source.download(file_id)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as download_pool, \
+         ThreadPoolExecutor(max_workers=max_workers) as shop_pool:
+        prefetch, fetch = make_download_scheduler(download_pool, download)
+
+        # 1) Income: 1 งานต่อ Platform (ส่งเข้าคิวก่อนงานของร้าน -> pool หยิบไปทำก่อนเสมอ ไม่มีทางรอกันเอง)
+        income_jobs = {}
+        for platform, info in plan.items():
+            if any(selected.get(shop_name) for shop_name in info['shops']):
+                prefetch(info['income'])
+                income_jobs[platform] = shop_pool.submit(INCOME_LOADERS[platform], info['income'], fetch, job)
+
+        def run_shop(platform, order_files, shop_name):
+            income, income_failed = income_jobs[platform].result()
+            # Income ไม่ครบ -> ยอดเงินของร้านจะกลายเป็น 0 ห้ามเขียนทับ ให้ร้านพังแล้วรอบหน้าลองใหม่ทั้ง Platform
+            if income_failed: raise ValueError(f"อ่านไฟล์ Income ไม่ได้ {len(income_failed)} ไฟล์ (รอบหน้าจะลองใหม่)")
+            return PROCESSORS[platform](order_files, income, shop_name, fetch, job)
+
+        # 2) ออเดอร์: 1 งานต่อร้าน
+        jobs = {}
+        for platform, info in plan.items():
+            for shop_name in info['shops']:
+                order_files = selected.get(shop_name)
+                if not order_files: continue
+                prefetch(order_files)
+                jobs[shop_pool.submit(run_shop, platform, order_files, shop_name)] = shop_name
+                job.set_shop(shop_name, "⏳ กำลังโหลด")
+
+        pending = set(jobs)
+        while pending:
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            if job.cancelled:
+                download_pool.shutdown(wait=False, cancel_futures=True)
+                shop_pool.shutdown(wait=False, cancel_futures=True)
+                raise SyncCancelled()
+            for fut in done:
+                shop_name = jobs[fut]
+                try:
+                    on_result(shop_name, *fut.result())
+                except Exception as e:
+                    failed.append(shop_name)
+                    job.set_shop(shop_name, f"❌ {e}", finished=True)
+                    job.error(f"❌ {shop_name}: {e}")
+            if done: job.text(f"กำลังโหลด: {len(jobs) - len(pending)}/{len(jobs)} ร้านเสร็จแล้ว")
+    return failed
+
+def build_master_df(all_data, cost_df=None, profile=None):
+    """รวมผลจากทุกร้าน -> Pro-rate / ต้นทุน / สถานะ / แปลงวันที่ ให้พร้อมอัปโหลด
+    cost_df = ตารางต้นทุน (sku, platform, unit_cost) จาก to_cost_frame ไม่ส่งมา = ต้นทุน 0
+    profile = SyncProfile (มักเป็น scope ของร้าน) ไว้บันทึกเวลาของแต่ละขั้น"""
+    profile = profile or SyncProfile()
+    with profile.stage('pro_rate', rows_in=sum(len(d) for d in all_data)) as rec:
+        master_df = pd.concat(all_data, ignore_index=True)
+
+        # Numeric Convert
+        for c in ['quantity', 'sales_amount', 'settlement_amount', 'fees', 'affiliate', 'unit_cost']:
+            if c in master_df.columns: master_df[c] = pd.to_numeric(master_df[c], errors='coerce').fillna(0)
+            else: master_df[c] = 0.0
+
+        # --- PRO-RATE LOGIC ---
+        totals = master_df.groupby('order_id')['sales_amount'].transform('sum')
+        ratio = master_df['sales_amount'] / totals.replace(0, 1)
+        master_df['settlement_amount'] *= ratio
+        master_df['fees'] *= ratio
+        master_df['affiliate'] *= ratio
+        rec['rows_out'] = len(master_df)
+
+    # Cost Mapping
+    with profile.stage('cost_mapping', rows_in=len(master_df)) as rec:
+        if cost_df is not None and not cost_df.empty:
+            master_df = pd.merge(master_df, cost_df, on=['sku', 'platform'], how='left')
+            if 'unit_cost_y' in master_df.columns:
+                master_df['unit_cost'] = master_df['unit_cost_y'].fillna(0)
+                master_df = master_df.drop(columns=['unit_cost_x', 'unit_cost_y'], errors='ignore')
+
+        master_df['unit_cost'] = master_df['unit_cost'].fillna(0)
+        master_df['total_cost'] = master_df['quantity'] * master_df['unit_cost']
+        master_df['net_profit'] = master_df['settlement_amount'] - master_df['total_cost']
+        rec['rows_out'] = len(master_df)
+
+    with profile.stage('status', rows_in=len(master_df)) as rec:
+        master_df['status'] = classify_status(master_df)
+        rec['rows_out'] = len(master_df)
+
+    with profile.stage('finalize', rows_in=len(master_df)) as rec:
+        if 'product_name' not in master_df.columns: master_df['product_name'] = "-"
+        master_df['product_name'] = master_df['product_name'].fillna("-")
+
+        # Date to String for DB
+        for c in ['created_date', 'shipped_date', 'settlement_date']:
+            if c in master_df.columns:
+                master_df[c] = master_df[c].astype(str).replace({'nan': None, 'None': None, 'NaT': None})
+
+        master_df = master_df[[c for c in ORDER_COLUMNS if c in master_df.columns]]
+        master_df = master_df.drop_duplicates(subset=['order_id', 'sku'], keep='first')
+        rec['rows_out'] = len(master_df)
+    return master_df
+
+def orders_to_records(master_df):
+    """แปลงเป็น list ของ dict สำหรับส่งขึ้น Database (JSON ไม่รับ NaN / inf)
+    คอลัมน์ตัวเลข: NaN / inf -> 0.0, คอลัมน์อื่น: ค่าว่าง -> None (null) ทำทีละคอลัมน์ ไม่ต้องวนทีละช่อง"""
+    df = master_df.copy()
+    num_cols = df.select_dtypes(include='number').columns
+    df[num_cols] = df[num_cols].replace([np.inf, -np.inf], np.nan).fillna(0.0)
+    other_cols = df.columns.difference(num_cols)
+    df[other_cols] = df[other_cols].astype(object).where(df[other_cols].notna(), None)
+    return df.to_dict('records')
+
+def fetch_all_rows(make_query, page_size=DB_PAGE_SIZE):
+    """ดึงข้อมูลทีละหน้าด้วย .range() จนครบ (make_query ต้องสร้าง query ใหม่ทุกครั้ง และควร .order() ไว้ให้ลำดับคงที่)"""
+    rows = []
+    start = 0
+    while True:
+        res = make_query().range(start, start + page_size - 1).execute()
+        rows.extend(res.data)
+        if len(res.data) < page_size: return rows
+        start += page_size
+
+def load_order_index(db, source_file_ids=None, order_ids_by_platform=None, shop_name=None):
+    """ดึง id / key / row_hash ของแถวใน orders ที่อยู่ในขอบเขตที่จะเขียนทับ (ไม่ส่งอะไรมา = ทั้งตาราง)
+    shop_name = จำกัดเฉพาะแถวของร้านนั้น"""
+    cols = "id, order_id, sku, shop_name, created_date, row_hash, source_file_id"
+    def select():
+        q = db.table("orders").select(cols)
+        return q.eq("shop_name", shop_name) if shop_name else q
+    if source_file_ids is None and order_ids_by_platform is None:
+        rows = fetch_all_rows(lambda: select().order("id"))
+    else:
+        rows = []
+        source_file_ids = list(source_file_ids or [])
+        for i in range(0, len(source_file_ids), IN_FILTER_CHUNK):
+            chunk = source_file_ids[i:i+IN_FILTER_CHUNK]
+            rows += fetch_all_rows(lambda: select().in_("source_file_id", chunk).order("id"))
+        for platform, order_ids in (order_ids_by_platform or {}).items():
+            order_ids = list(order_ids)
+            for i in range(0, len(order_ids), IN_FILTER_CHUNK):
+                chunk = order_ids[i:i+IN_FILTER_CHUNK]
+                rows += fetch_all_rows(lambda: select().in_("order_id", chunk).eq("platform", platform).order("id"))
+    existing = pd.DataFrame(rows, columns=['id', 'order_id', 'sku', 'shop_name', 'created_date', 'row_hash', 'source_file_id'])
+    return existing.drop_duplicates(subset=['id'])
+
+def write_orders_diff(db, master_df, existing):
+    """เขียน orders แบบเทียบกับของเดิม (existing จาก load_order_index)
+
+    key ของแต่ละแถวคือ (order_id, sku, shop_name) และ row_hash คือ hash ของเนื้อหาทั้งแถว
+    upsert เฉพาะแถวใหม่ / แถวที่ hash เปลี่ยน แล้วค่อยลบแถวที่หายไป ระหว่างนี้ Dashboard ยังเห็นข้อมูลครบ
+    """
+    new = master_df.copy()
+    hash_cols = [c for c in ORDER_COLUMNS if c in new.columns]
+    new['row_hash'] = pd.util.hash_pandas_object(new[hash_cols], index=False).astype(str).values
+
+    # แถวซ้ำ key เดียวกันใน Database (ข้อมูลเก่าก่อนมี unique) เก็บแถวแรกไว้ ที่เหลือลบทิ้ง
+    existing = existing.sort_values('id')
+    dup_mask = existing.duplicated(subset=ORDER_KEY, keep='first')
+    delete_ids = existing.loc[dup_mask, 'id'].tolist()
+    existing = existing.loc[~dup_mask]
+
+    new_keys = pd.MultiIndex.from_frame(new[ORDER_KEY].astype(str))
+    old_keys = pd.MultiIndex.from_frame(existing[ORDER_KEY].astype(str))
+    in_db = new_keys.isin(old_keys)
+    old_hash = pd.Series(existing['row_hash'].values, index=old_keys).reindex(new_keys).values
+    changed = in_db & (old_hash != new['row_hash'].values)
+    delete_ids += existing.loc[~old_keys.isin(new_keys), 'id'].tolist()
+
+    records = orders_to_records(new.loc[~in_db | changed])
+    for i in range(0, len(records), WRITE_CHUNK):
+        db.table("orders").upsert(records[i:i+WRITE_CHUNK], on_conflict=",".join(ORDER_KEY)).execute()
+    for i in range(0, len(delete_ids), IN_FILTER_CHUNK):
+        db.table("orders").delete().in_("id", delete_ids[i:i+IN_FILTER_CHUNK]).execute()
+
+    return {
+        'rows': len(new), 'inserted': int((~in_db).sum()), 'updated': int(changed.sum()),
+        'deleted': len(delete_ids), 'unchanged': int((in_db & ~changed).sum()),
+    }
+
+def summarize_orders(df):
+    """สรุป orders เป็นยอดรายวันต่อร้าน 1 แถวต่อ (created_date, shop_name, platform) แบบเดียวกับตาราง daily_summary"""
+    if df.empty or 'created_date' not in df.columns: return pd.DataFrame(columns=SUMMARY_COLUMNS)
+    parts = pd.DataFrame({
+        'created_date': pd.to_datetime(df['created_date'], errors='coerce').dt.date,
+        'shop_name': df['shop_name'].astype(str).str.upper().str.strip(),
+        'platform': df['platform'].astype(str).str.upper().str.strip(),
+    }, index=df.index)
+    status = df['status'] if 'status' in df.columns else pd.Series(STATUS_DEFAULT, index=df.index)
+    for col, label in SUMMARY_STATUS_COUNTS.items(): parts[col] = (status == label).astype(int)
+    for col, src in SUMMARY_SUMS.items():
+        parts[col] = pd.to_numeric(df[src], errors='coerce').fillna(0).astype('float64') if src in df.columns else 0.0
+    parts = parts[parts['created_date'].notna()]
+    return parts.groupby(SUMMARY_KEY, as_index=False, sort=True)[SUMMARY_VALUE_COLUMNS].sum()
+
+def write_daily_summary(db, summary, dates=None, shops=None):
+    """เขียน daily_summary ให้ตรงกับ summary ภายในขอบเขต (วันที่ x ร้าน) ที่กำหนด (ไม่ส่งมา = ทั้งตาราง)
+    upsert ทุกแถวของ summary แล้วลบแถวเดิมในขอบเขตที่ไม่มีใน summary แล้ว (วัน/ร้านที่ไม่มีออเดอร์เหลือ)"""
+    summary = summary.copy()
+    summary['created_date'] = pd.to_datetime(summary['created_date']).dt.strftime('%Y-%m-%d')
+    cols = ", ".join(SUMMARY_KEY)
+    order = lambda q: q.order("created_date").order("shop_name").order("platform")
+    if dates is None:
+        old = fetch_all_rows(lambda: order(db.table("daily_summary").select(cols)))
+    else:
+        old = []
+        dates, shops = sorted(dates), sorted(shops)
+        for i in range(0, len(dates), IN_FILTER_CHUNK):
+            chunk = dates[i:i+IN_FILTER_CHUNK]
+            old += fetch_all_rows(lambda: order(db.table("daily_summary").select(cols).in_("created_date", chunk).in_("shop_name", shops)))
+    old = pd.DataFrame(old, columns=SUMMARY_KEY)
+
+    records = orders_to_records(summary[SUMMARY_COLUMNS])
+    for i in range(0, len(records), WRITE_CHUNK):
+        db.table("daily_summary").upsert(records[i:i+WRITE_CHUNK], on_conflict=",".join(SUMMARY_KEY)).execute()
+    stale = old.loc[~pd.MultiIndex.from_frame(old).isin(pd.MultiIndex.from_frame(summary[SUMMARY_KEY]))]
+    # ลบทีละ ร้าน x Platform ด้วย .in_() ของวันที่ (ไม่ยิง DELETE ทีละแถว)
+    for (shop, platform), group in stale.groupby(['shop_name', 'platform'], dropna=False, sort=True):
+        days = sorted(group['created_date'].unique().tolist())
+        for i in range(0, len(days), IN_FILTER_CHUNK):
+            q = db.table("daily_summary").delete().eq("shop_name", shop).in_("created_date", days[i:i+IN_FILTER_CHUNK])
+            (q.is_("platform", "null") if pd.isna(platform) else q.eq("platform", platform)).execute()
+
+def refresh_daily_summary(db, affected):
+    """คำนวณ daily_summary ใหม่เฉพาะวัน/ร้านที่ได้รับผลกระทบ (affected = DataFrame ที่มี created_date, shop_name)
+    อ่านแถว orders ของวัน/ร้านเหล่านั้นจาก Database หลังเขียนเสร็จ ยอดรวมจึงตรงกับ orders เสมอ"""
+    affected = affected.dropna(subset=['created_date', 'shop_name'])
+    if affected.empty: return
+    dates = pd.to_datetime(affected['created_date'], errors='coerce').dropna().dt.strftime('%Y-%m-%d').unique().tolist()
+    shops = affected['shop_name'].astype(str).unique().tolist()
+    cols = "id, created_date, shop_name, platform, status, " + ", ".join(SUMMARY_SUMS.values())
+    rows = []
+    for i in range(0, len(dates), IN_FILTER_CHUNK):
+        chunk = dates[i:i+IN_FILTER_CHUNK]
+        rows += fetch_all_rows(lambda: db.table("orders").select(cols).in_("created_date", chunk).in_("shop_name", shops).order("id"))
+    write_daily_summary(db, summarize_orders(pd.DataFrame(rows, columns=[c.strip() for c in cols.split(",")])), dates, shops)
+
+def load_sync_manifest(db, report):
+    try:
+        res = db.table("sync_manifest").select("*").execute()
+        return {r['file_id']: r for r in res.data}
+    except Exception as e:
+        report.warning(f"⚠️ อ่าน sync_manifest ไม่ได้: {e}")
+        return {}
+
+def is_file_changed(f, manifest):
+    old = manifest.get(f['id'])
+    if old is None: return True
+    return old.get('modified_time') != f.get('modifiedTime') or old.get('md5_checksum') != f.get('md5Checksum')
+
+def save_sync_manifest(db, files, master_df, report, deleted_ids=()):
+    synced_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    row_counts = master_df['source_file_id'].value_counts().to_dict() if not master_df.empty else {}
+    entries = [{
+        'file_id': f['id'], 'file_name': f['name'], 'folder_name': f['folder_name'],
+        'platform': f['platform'], 'shop_name': f['shop_name'], 'kind': f['kind'],
+        'modified_time': f.get('modifiedTime'), 'md5_checksum': f.get('md5Checksum'),
+        'row_count': int(row_counts.get(f['id'], 0)), 'synced_at': synced_at,
+    } for f in files]
+    try:
+        deleted_ids = list(deleted_ids)
+        for i in range(0, len(deleted_ids), IN_FILTER_CHUNK):
+            db.table("sync_manifest").delete().in_("file_id", deleted_ids[i:i+IN_FILTER_CHUNK]).execute()
+        if entries:
+            db.table("sync_manifest").upsert(entries).execute()
+    except Exception as e:
+        report.warning(f"⚠️ บันทึก sync_manifest ไม่สำเร็จ (รอบหน้าจะ Sync ไฟล์เหล่านี้ซ้ำ): {e}")
+
+# --- 4.1 SYNC CHECKPOINT & JOB STATUS ---
+# Sync เขียนลง Database ทีละร้าน (orders + daily_summary + manifest ของร้านนั้น) แล้วจด checkpoint ไว้ใน app_meta
+#   key = 'sync_checkpoint', value = {"signature": ..., "shops": [ร้านที่บันทึกเสร็จแล้ว]}
+# signature มาจากโหมด + รายการไฟล์ (id / modifiedTime / md5) ถ้ารอบถัดไปเจอไฟล์ชุดเดิม จะข้ามร้านที่เสร็จแล้ว
+# สถานะระหว่าง Sync อยู่ใน SyncJob: หน้าเว็บอ่านไปแสดงเป็นระยะ ส่วน sync_cli.py พิมพ์ออก console (echo)
+
+SYNC_CHECKPOINT_KEY = "sync_checkpoint"
+
+class SyncCancelled(Exception):
+    """ผู้ใช้กดยกเลิก Sync"""
+
+class SyncJob:
+    """สถานะของงาน Sync ใช้ร่วมกันทุก session (thread ของงานเขียน / หน้าเว็บอ่าน)
+    มี text / info / success / warning / error แบบเดียวกับ st.empty() จึงส่งแทน status_box ได้
+    echo = ฟังก์ชันรับข้อความ (เช่น print) ไว้พิมพ์ทุกข้อความออกไปด้วยตอนรันแบบไม่มีหน้าเว็บ
+    profile = เวลา / จำนวนแถว ของแต่ละขั้นต่อไฟล์และต่อร้าน (trace_memory=True วัด peak memory ด้วย แต่ช้าลงหลายเท่า)"""
+
+    def __init__(self, full, max_workers, echo=None, trace_memory=False):
+        self.full = full
+        self.max_workers = max_workers
+        self.state = 'running'      # running / done / failed / cancelled
+        self.message = "⏳ กำลังอ่านรายการไฟล์..."
+        self.shops = {}             # shop_name -> ข้อความสถานะ (เรียงตามลำดับที่เริ่ม)
+        self.finished_shops = set() # ร้านที่จบแล้ว (บันทึก / ข้าม / พัง)
+        self.logs = []              # [(level, ข้อความ)]
+        self.stats = None
+        self.committed = False      # มีร้านที่เขียนลง Database ไปแล้ว -> ต้องล้าง Cache ตอนจบ
+        self.started_at = datetime.datetime.now()
+        self.finished_at = None
+        self.echo = echo
+        self.profile = SyncProfile(memory=trace_memory)
+        self.report_path = None     # JSON ที่ save_sync_report เขียนไว้
+        self._cancel = threading.Event()
+
+    def text(self, msg):
+        self.message = msg
+        if self.echo: self.echo(msg)
+    info = success = text
+
+    def warning(self, msg):
+        self.logs.append(('warning', msg))
+        if self.echo: self.echo(msg)
+
+    def error(self, msg):
+        self.logs.append(('error', msg))
+        if self.echo: self.echo(msg)
+
+    def set_shop(self, shop_name, status, finished=False):
+        self.shops[shop_name] = status
+        if finished: self.finished_shops.add(shop_name)
+        if finished and self.echo: self.echo(f"{shop_name}: {status}")
+
+    def cancel(self): self._cancel.set()
+
+    @property
+    def cancelled(self): return self._cancel.is_set()
+
+    def report(self):
+        """ผลของรอบนี้ + เวลาแต่ละขั้น (profile) สำหรับเขียนเป็น JSON"""
+        return {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'finished_at': self.finished_at.isoformat(timespec='seconds') if self.finished_at else None,
+            'state': self.state, 'full': self.full, 'max_workers': self.max_workers, 'stats': self.stats,
+            'errors': [msg for level, msg in self.logs if level == 'error'],
+            **self.profile.to_dict(),
+        }
+
+def save_sync_report(job, path):
+    """เขียน job.report() เป็น JSON (สร้างโฟลเดอร์ให้ถ้ายังไม่มี) คืน path ที่เขียน"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(job.report(), fh, ensure_ascii=False, indent=2, default=str)
+    return path
+
+def plan_signature(full, plan):
+    files = sorted((f['id'], f.get('modifiedTime') or '', f.get('md5Checksum') or '')
+                   for info in plan.values() for f in info['income'] + [f for files in info['shops'].values() for f in files])
+    return hashlib.sha1(json.dumps([full, files]).encode()).hexdigest()
+
+def load_sync_checkpoint(db, signature, report):
+    """ร้านที่บันทึกเสร็จแล้วของรอบที่ยังไม่จบ (เฉพาะถ้าไฟล์ชุดเดียวกัน)"""
+    try:
+        res = db.table("app_meta").select("value").eq("key", SYNC_CHECKPOINT_KEY).execute()
+        if not res.data: return set()
+        checkpoint = json.loads(res.data[0]['value'])
+        return set(checkpoint['shops']) if checkpoint.get('signature') == signature else set()
+    except Exception as e:
+        report.warning(f"⚠️ อ่าน checkpoint ไม่ได้ (จะ Sync ทุกร้านที่เลือก): {e}")
+        return set()
+
+def save_sync_checkpoint(db, signature, shops):
+    value = json.dumps({'signature': signature, 'shops': sorted(shops)}, ensure_ascii=False)
+    db.table("app_meta").upsert({'key': SYNC_CHECKPOINT_KEY, 'value': value}, on_conflict="key").execute()
+
+def clear_sync_checkpoint(db):
+    db.table("app_meta").delete().eq("key", SYNC_CHECKPOINT_KEY).execute()
+
+# เวอร์ชันข้อมูลของแต่ละตารางอยู่ใน app_meta (key = 'version:<ตาราง>', value = เวลาที่เขียน)
+# แอปอ่านทุก 1 นาที: เวอร์ชันเปลี่ยน -> Cache / snapshot ของทุก session โหลดใหม่ ใช้ร่วมกันทั้งแอปและ sync_cli.py
+def new_version_stamp():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+def save_data_version(db, tables, report, stamp=None):
+    """จดเวอร์ชันใหม่ของตารางลง app_meta (ข้อมูลเขียนไปแล้ว ถ้าไม่สำเร็จแค่แจ้งเตือนผ่าน report)"""
+    stamp = stamp or new_version_stamp()
+    try:
+        db.table("app_meta").upsert([{'key': f"version:{t}", 'value': stamp} for t in tables], on_conflict="key").execute()
+    except Exception as e:
+        report.warning(f"⚠️ บันทึกเวอร์ชันข้อมูลลง app_meta ไม่สำเร็จ (หน้าเว็บอาจแสดงข้อมูลเดิมจาก snapshot จนกว่าจะบันทึกได้): {e}")
+    return stamp
+
+def run_sync(db, source, plan, job, full=False, max_workers=SYNC_MAX_WORKERS, cost_df=None):
+    """Sync จาก plan (collect_sync_files) โดยเขียนลง db ทีละร้านทันทีที่ร้านนั้นประมวลผลเสร็จ แล้วจด checkpoint
+
+    full=True: ประมวลผลใหม่ทุกไฟล์ แล้วลบแถวของร้านที่ไม่มีโฟลเดอร์ใน source แล้ว
+    full=False: เฉพาะไฟล์ใหม่ / ที่แก้ไข / ที่ถูกลบ เทียบกับ sync_manifest
+      ถ้าไฟล์ Income ของ Platform ไหนเปลี่ยน ยอดเงินของทุกออเดอร์ใน Platform นั้นอาจเปลี่ยน
+      จึงต้องประมวลผลไฟล์ออเดอร์ของ Platform นั้นใหม่ทั้งหมด
+    cost_df = ตารางต้นทุนที่ใช้คิด total_cost / net_profit
+    ร้านที่พังไม่ถูกเขียน ร้านอื่นยังเขียนตามปกติ กด Sync อีกครั้งจะทำต่อเฉพาะร้านที่ยังไม่เสร็จ
+    คืนยอดรวม (rows / inserted / updated / deleted / unchanged) หรือ None ถ้าไม่มีอะไรต้องทำ
+    """
+    signature = plan_signature(full, plan)
+    manifest = load_sync_manifest(db, job)
+    if not full and not manifest:
+        # ยังไม่เคยมี manifest (แถวเก่าไม่มี source_file_id) -> ต้องประมวลผลทุกไฟล์ 1 ครั้ง
+        job.warning("ℹ️ ยังไม่มี manifest ระบบจะประมวลผลทุกไฟล์ในครั้งแรก")
+        full = True
+
+    current_ids = {f['id'] for info in plan.values() for f in info['income']}
+    current_ids |= {f['id'] for info in plan.values() for files in info['shops'].values() for f in files}
+    deleted = [m for m in manifest.values() if m['file_id'] not in current_ids]
+    deleted_by_shop = {}
+    for m in deleted: deleted_by_shop.setdefault(m['shop_name'], []).append(m)
+
+    income_dirty = set(plan) if full else {m['platform'] for m in deleted if m['kind'] == 'income'}
+    income_dirty |= {p for p, info in plan.items() if any(is_file_changed(f, manifest) for f in info['income'])}
+
+    selected = {}
+    for platform, info in plan.items():
+        for shop_name, files in info['shops'].items():
+            dirty = files if platform in income_dirty else [f for f in files if is_file_changed(f, manifest)]
+            if full or dirty or shop_name in deleted_by_shop: selected[shop_name] = dirty
+    plan_shops = set(selected) | {shop for info in plan.values() for shop in info['shops']}
+    orphan_deleted = [m for m in deleted if m['shop_name'] not in plan_shops]
+
+    committed = load_sync_checkpoint(db, signature, job)
+    for shop_name in sorted(committed & set(selected)):
+        job.set_shop(shop_name, "⏭️ ข้าม (บันทึกแล้วในรอบก่อน)", finished=True)
+    selected = {shop: files for shop, files in selected.items() if shop not in committed}
+    if not selected and not orphan_deleted and not committed:
+        job.success("✅ ข้อมูลเป็นปัจจุบันแล้ว (ไม่มีไฟล์ใหม่หรือไฟล์ที่แก้ไข)")
+        return None
+
+    stats = dict(rows=0, inserted=0, updated=0, deleted=0, unchanged=0)
+    def commit_shop(shop_name, df, failed_ids=()):
+        job.set_shop(shop_name, "☁️ กำลังบันทึก")
+        files = selected[shop_name]
+        # ไฟล์ที่อ่านไม่ได้รอบนี้: ไม่ลบ/เขียนทับแถวเดิมของไฟล์นั้น และไม่จดลง manifest -> รอบหน้าจะลองอ่านใหม่
+        failed_ids = set(failed_ids)
+        synced_files = [f for f in files if f['id'] not in failed_ids]
+        # ไม่ได้สักแถว: ทุกไฟล์อ่านไม่ได้ หรือประมวลผลใหม่ทั้งร้านแล้วไม่เจอไฟล์ export เลย (รูปแบบไฟล์เปลี่ยน?)
+        # -> ไม่เขียน กันข้อมูลเดิมของร้านถูกลบทิ้ง (รอบปกติที่เปลี่ยนแค่ไฟล์ที่ไม่ใช่ export เขียนได้ตามปกติ)
+        if files and df.empty and (full or len(failed_ids) == len(files)): raise ValueError("อ่านข้อมูลจากไฟล์ไม่ได้เลย")
+        profile = job.profile.scope(shop=shop_name)
+        master_df = build_master_df([df], cost_df, profile) if not df.empty else pd.DataFrame(columns=ORDER_COLUMNS)
+        shop_deleted = deleted_by_shop.get(shop_name, [])
+        with profile.stage('load_index') as rec:
+            if full:
+                existing = load_order_index(db, shop_name=shop_name)
+            else:
+                # ขอบเขตที่เขียนทับ = แถวจากไฟล์ที่เปลี่ยน/ถูกลบ + ออเดอร์เดียวกันที่อยู่ในไฟล์ export อื่น (ช่วงวันที่ทับกัน)
+                # แถวในขอบเขตนี้ที่ไม่มีในผลรอบนี้จะถูกลบ ส่วนที่เหลือ upsert เฉพาะที่เปลี่ยน
+                stale_ids = [f['id'] for f in synced_files] + [m['file_id'] for m in shop_deleted if m['kind'] == 'orders']
+                order_ids_by_platform = {p: ids.unique() for p, ids in master_df.groupby('platform')['order_id']}
+                existing = load_order_index(db, stale_ids, order_ids_by_platform, shop_name=shop_name)
+            if failed_ids: existing = existing[~existing['source_file_id'].isin(failed_ids)]
+            rec['rows_out'] = len(existing)
+        with profile.stage('write_orders', rows_in=len(master_df)) as rec:
+            shop_stats = write_orders_diff(db, master_df, existing)
+            rec['rows_out'] = shop_stats['inserted'] + shop_stats['updated']  # แถวที่ upsert จริง
+        job.committed = True
+        for k in stats: stats[k] += shop_stats[k]
+        try:
+            # วัน/ร้านที่ได้รับผลกระทบ = ของแถวเดิมในขอบเขต (อาจถูกลบ/ย้ายวัน) + ของแถวที่เขียนรอบนี้
+            affected = pd.concat([existing[['created_date', 'shop_name']], master_df[['created_date', 'shop_name']]])
+            with profile.stage('daily_summary', rows_in=len(affected)): refresh_daily_summary(db, affected)
+        except Exception as e:
+            job.warning(f"⚠️ อัปเดต daily_summary ของ {shop_name} ไม่สำเร็จ (กด Sync แบบประมวลผลใหม่ทุกไฟล์เพื่อสร้างใหม่): {e}")
+        with profile.stage('manifest', rows_in=len(files)):
+            save_sync_manifest(db, synced_files, master_df, job, deleted_ids=[m['file_id'] for m in shop_deleted] + sorted(failed_ids))
+        if not failed_ids: committed.add(shop_name)  # มีไฟล์ที่อ่านไม่ได้ -> ถ้ารอบนี้ค้าง รอบต่อไปต้องทำร้านนี้ใหม่
+        save_sync_checkpoint(db, signature, committed)
+        status = f"✅ {shop_stats['rows']:,} รายการ (+{shop_stats['inserted']} ~{shop_stats['updated']} -{shop_stats['deleted']})"
+        if failed_ids: status += f" ⚠️ อ่านไม่ได้ {len(failed_ids)} ไฟล์ (รอบหน้าจะลองใหม่)"
+        job.set_shop(shop_name, status, finished=True)
+
+    for shop_name in selected: job.set_shop(shop_name, "รอคิว")
+    failed = process_sync_plan(source, plan, selected, job, commit_shop, max_workers)
+    # ร้านที่ไม่มีไฟล์ต้องประมวลผล (ไฟล์ถูกลบหมด / โฟลเดอร์ว่างในโหมดประมวลผลใหม่) -> เขียนผลว่าง = ลบแถวเดิมของร้าน
+    for shop_name, files in selected.items():
+        if files or shop_name in failed: continue
+        if job.cancelled: raise SyncCancelled()
+        try: commit_shop(shop_name, pd.DataFrame())
+        except Exception as e:
+            failed.append(shop_name)
+            job.set_shop(shop_name, f"❌ {e}", finished=True)
+            job.error(f"❌ {shop_name}: {e}")
+    if failed:
+        job.error(f"❌ Sync ไม่ครบ: {', '.join(failed)} — กด Sync อีกครั้งเพื่อทำต่อเฉพาะร้านที่ยังไม่เสร็จ")
+        return stats
+
+    # ทุกร้านเสร็จแล้ว: แถวของร้าน/ไฟล์ที่ไม่มีใน source แล้ว + manifest ของไฟล์ Income แล้วปิด checkpoint
+    job.text("🧹 เก็บกวาดข้อมูลที่ไม่มีในแหล่งไฟล์แล้ว...")
+    if full: orphans = load_order_index(db).loc[lambda df: ~df['shop_name'].isin(plan_shops)]
+    else: orphans = load_order_index(db, source_file_ids=[m['file_id'] for m in orphan_deleted if m['kind'] == 'orders'], order_ids_by_platform={})
+    if not orphans.empty:
+        stats['deleted'] += write_orders_diff(db, pd.DataFrame(columns=ORDER_COLUMNS), orphans)['deleted']
+        job.committed = True
+        try: refresh_daily_summary(db, orphans[['created_date', 'shop_name']])
+        except Exception as e: job.warning(f"⚠️ อัปเดต daily_summary ไม่สำเร็จ: {e}")
+    # ถึงตรงนี้ได้ = ไม่มีร้านพัง จึงไม่มีไฟล์ Income ที่อ่านไม่ได้ (Income พัง -> ทุกร้านของ Platform นั้นพัง -> return ไปแล้ว)
+    # manifest ของ Income จึงถูกบันทึกเฉพาะรอบที่อ่านได้ครบ รอบหน้าจะประมวลผล Platform ที่ Income ยังไม่ผ่านใหม่
+    income_files = [f for p in income_dirty for f in plan[p]['income']]
+    save_sync_manifest(db, income_files, pd.DataFrame(columns=ORDER_COLUMNS), job,
+                       deleted_ids=[m['file_id'] for m in deleted if m['kind'] == 'income' or m['shop_name'] not in plan_shops])
+    try: clear_sync_checkpoint(db)
+    except Exception as e: job.warning(f"⚠️ ลบ checkpoint ไม่สำเร็จ: {e}")
+    return stats
@@ -0,0 +1,127 @@
+"""วัดเวลา / จำนวนแถว / หน่วยความจำของแต่ละขั้นใน Sync (ต่อไฟล์ และต่อร้าน)
+
+  profile = SyncProfile(memory=True)
+  with profile.stage('read', shop='TIKTOK 1', file='orders.xlsx') as rec:
+      df = ...
+      rec['rows_out'] = len(df)
+  profile.summary()            -> DataFrame รวมต่อขั้น: จำนวนครั้ง / เวลา / แถวเข้า-ออก / peak memory
+  profile.by_shop()            -> วินาทีต่อร้าน x ขั้น (ร้านไหนช้าที่ขั้นไหน)
+  profile.to_dict()            -> ทุกขั้นแบบเรียงลำดับคงที่ ไว้เขียนเป็น JSON แล้ว diff ข้ามรอบได้
+
+memory=True ใช้ tracemalloc วัด peak ระหว่างขั้น (MB ที่เพิ่มจากตอนเริ่มขั้น) ทำให้ Sync ช้าลงหลายเท่า จึงปิดไว้เป็นค่าเริ่มต้น
+ขั้นที่รันพร้อมกันหลาย thread จะเห็น peak ของ process ทั้งหมดในช่วงนั้น และเวลารวมต่อขั้นคือผลรวมของทุก thread"""
+import copy
+import datetime
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+# ลำดับขั้นของ pipeline (ใช้เรียงตาราง / JSON) ขั้นที่ไม่อยู่ในนี้จะต่อท้าย
+PROFILE_STAGES = ['download', 'read', 'extract', 'income_group', 'income_merge', 'pro_rate', 'cost_mapping', 'status',
+                  'finalize', 'load_index', 'write_orders', 'daily_summary', 'manifest']
+PROFILE_COLUMNS = ['stage', 'shop', 'file', 'seconds', 'rows_in', 'rows_out', 'peak_mb']
+
+def stage_rank(stage):
+    return PROFILE_STAGES.index(stage) if stage in PROFILE_STAGES else len(PROFILE_STAGES)
+
+class SyncProfile:
+    """เก็บผลของทุกขั้นใน 1 รอบ Sync ใช้ร่วมกันได้หลาย thread
+    scope(shop=...) คืนตัวที่ใช้ที่เก็บเดียวกันแต่ใส่ชื่อร้านให้ทุกขั้นอัตโนมัติ (ส่งต่อเข้า build_master_df ได้)"""
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.records = []
+        self.labels = {}
+        self.lock = threading.Lock()
+        self._open = []  # [[memory ตอนเริ่ม, peak]] ของขั้นที่ยังไม่จบ: reset_peak ของขั้นหนึ่งต้องไม่ทำให้ขั้นอื่นเสีย peak
+        self._owns_tracing = memory and not tracemalloc.is_tracing()
+        if self._owns_tracing: tracemalloc.start()
+
+    def scope(self, **labels):
+        view = copy.copy(self)
+        view.labels = {**self.labels, **labels}
+        return view
+
+    @contextmanager
+    def stage(self, name, rows_in=None, **labels):
+        rec = {'stage': name, 'shop': None, 'file': None, **self.labels, **labels, 'rows_in': rows_in, 'rows_out': None}
+        mem = self._enter_memory() if self.memory else None
+        started = time.perf_counter()
+        try:
+            yield rec
+        finally:
+            rec['seconds'] = time.perf_counter() - started
+            rec['peak_mb'] = self._exit_memory(mem) if mem is not None else None
+            with self.lock: self.records.append(rec)
+
+    def _enter_memory(self):
+        with self.lock:
+            current, peak = tracemalloc.get_traced_memory()
+            for m in self._open: m[1] = max(m[1], peak)
+            tracemalloc.reset_peak()
+            mem = [current, current]
+            self._open.append(mem)
+        return mem
+
+    def _exit_memory(self, mem):
+        with self.lock:
+            peak = tracemalloc.get_traced_memory()[1]
+            for m in self._open: m[1] = max(m[1], peak)
+            del self._open[next(i for i, m in enumerate(self._open) if m is mem)]
+        return (mem[1] - mem[0]) / 2**20
+
+    def finish(self):
+        """หยุด tracemalloc (ถ้าเป็นตัวที่เปิดเอง) เรียกครั้งเดียวตอนจบรอบ"""
+        if self._owns_tracing and tracemalloc.is_tracing(): tracemalloc.stop()
+        self._owns_tracing = False
+
+    def frame(self):
+        """ทุกขั้นเป็น DataFrame เรียงตาม ร้าน / ไฟล์ / ลำดับขั้น (ไม่ขึ้นกับว่า thread ไหนเสร็จก่อน)"""
+        with self.lock: rows = list(self.records)
+        df = pd.DataFrame(rows, columns=PROFILE_COLUMNS)
+        df[['seconds', 'peak_mb']] = df[['seconds', 'peak_mb']].apply(pd.to_numeric).astype(float)
+        df[['rows_in', 'rows_out']] = df[['rows_in', 'rows_out']].apply(pd.to_numeric).astype('Int64')
+        df['_rank'] = df['stage'].map(stage_rank)
+        df = df.sort_values(['shop', 'file', '_rank', 'stage'], na_position='first', kind='stable')
+        return df.drop(columns='_rank').reset_index(drop=True)
+
+    def summary(self):
+        """รวมต่อขั้น: จำนวนครั้ง, เวลารวม, แถวเข้า/ออกรวม, peak สูงสุด (MB)"""
+        out = self.frame().groupby('stage', sort=False).agg(
+            count=('seconds', 'size'), seconds=('seconds', 'sum'),
+            rows_in=('rows_in', lambda s: s.sum(min_count=1)), rows_out=('rows_out', lambda s: s.sum(min_count=1)),
+            peak_mb=('peak_mb', 'max'),
+        ).reset_index()
+        return out.sort_values('stage', key=lambda s: s.map(stage_rank), kind='stable').reset_index(drop=True)
+
+    def by_shop(self):
+        """วินาทีรวมต่อร้าน (แถว) x ขั้น (คอลัมน์) + total เรียงร้านที่ใช้เวลามากสุดก่อน (โฟลเดอร์ Income นับเป็นร้านหนึ่ง)"""
+        df = self.frame()
+        if df.empty: return pd.DataFrame(columns=['shop', 'total'])
+        table = df.assign(shop=df['shop'].fillna('-')).pivot_table(index='shop', columns='stage', values='seconds', aggfunc='sum')
+        table = table[sorted(table.columns, key=stage_rank)]
+        table['total'] = table.sum(axis=1)
+        return table.sort_values('total', ascending=False).rename_axis(columns=None).reset_index()
+
+    def to_dict(self):
+        """ผลทั้งรอบสำหรับเขียน JSON: ตัวเลขปัดไว้ให้ diff อ่านง่าย ค่าที่ไม่มี = null"""
+        digits = {'seconds': 3, 'peak_mb': 2}
+        def records(df):
+            rows = df.astype(object).where(df.notna(), None).to_dict('records')
+            for row in rows:
+                for col, v in row.items():
+                    if v is None: continue
+                    if col in digits: row[col] = round(float(v), digits[col])
+                    elif col in ('count', 'rows_in', 'rows_out'): row[col] = int(v)
+            return rows
+        return {
+            'memory': self.memory,
+            'generated_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'stages': records(self.summary()),
+            'shops': {row.pop('shop'): {k: round(v, 3) for k, v in row.items() if pd.notna(v)}
+                      for row in self.by_shop().to_dict('records')},
+            'records': records(self.frame()),
+        }
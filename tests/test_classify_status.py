@@ -0,0 +1,78 @@
+"""classify_status (np.select) ต้องให้ผลเหมือน get_standard_status แบบเดิมที่คิดทีละแถว
+ใช้ไฟล์ export จำลองจาก bench/generate_exports.py + กรณีลำดับความสำคัญที่ไฟล์จำลองไม่มี"""
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "bench")]
+from sync_pipeline import LocalFolderSource, SyncJob, PROCESSORS, INCOME_LOADERS, collect_sync_files, classify_status
+from generate_exports import generate
+
+def get_standard_status(row):
+    """ตัวเดิมจาก streamlit_app.py (ก่อนเปลี่ยนเป็น classify_status) ใช้เป็นคำตอบอ้างอิง"""
+    try: amt = float(row.get('settlement_amount', 0))
+    except: amt = 0
+
+    if amt > 0: return "ออเดอร์สำเร็จ"
+
+    raw_status = str(row.get('status', '')).lower()
+    if any(x in raw_status for x in ['ยกเลิก', 'cancel', 'failed']): return "ยกเลิก"
+    if any(x in raw_status for x in ['returned', 'return', 'ตีกลับ', 'refund']): return "ตีกลับ"
+    return "รอดำเนินการ"
+
+def reference(df):
+    return df.apply(get_standard_status, axis=1).astype(object)
+
+@pytest.fixture(scope="module")
+def exported_orders(tmp_path_factory):
+    """ออเดอร์ทุกร้านหลังอ่านไฟล์ + merge Income (ก่อนแปลงสถานะ) จากไฟล์จำลอง 3,000 บรรทัด"""
+    root = str(tmp_path_factory.mktemp("exports"))
+    generate(root, 3000, seed=7)
+    source = LocalFolderSource(root)
+    fetch = lambda file_id: io.BytesIO(source.download(file_id).getvalue())
+    job = SyncJob(True, 1, echo=lambda msg: None)
+    frames = []
+    for platform, info in collect_sync_files(source.folders()).items():
+        income, failed = INCOME_LOADERS[platform](info['income'], fetch, job)
+        assert not failed
+        for shop_name, files in info['shops'].items():
+            df, failed = PROCESSORS[platform](files, income, shop_name, fetch, job)
+            assert not failed
+            frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+def test_matches_row_wise_on_generated_exports(exported_orders):
+    df = exported_orders
+    assert len(df) == 3000
+    result = classify_status(df)
+    assert result.index.equals(df.index)
+    pd.testing.assert_series_equal(result, reference(df), check_names=False)
+    # ไฟล์จำลองต้องมีครบทุกสถานะ ไม่อย่างนั้นเทียบกันก็ไม่ได้พิสูจน์อะไร
+    assert set(result) == {"ออเดอร์สำเร็จ", "ยกเลิก", "ตีกลับ", "รอดำเนินการ"}
+
+@pytest.mark.parametrize("status, amount, expected", [
+    ("Cancelled", 150.0, "ออเดอร์สำเร็จ"),      # ได้รับเงินแล้ว ชนะคำว่ายกเลิก
+    ("Returned", 1.0, "ออเดอร์สำเร็จ"),
+    ("Cancel after return", 0.0, "ยกเลิก"),     # ยกเลิก ชนะ ตีกลับ
+    ("ยกเลิกแล้ว ตีกลับ", None, "ยกเลิก"),
+    ("Delivery failed - refund", -20.0, "ยกเลิก"),
+    ("REFUND", 0.0, "ตีกลับ"),
+    ("Completed", 0.0, "รอดำเนินการ"),
+    ("Completed", "abc", "รอดำเนินการ"),        # ยอดเงินอ่านไม่ได้ = 0
+    (None, None, "รอดำเนินการ"),
+])
+def test_precedence(status, amount, expected):
+    df = pd.DataFrame({'status': [status], 'settlement_amount': [amount]}, dtype=object)
+    assert classify_status(df).tolist() == [expected]
+    assert reference(df).tolist() == [expected]
+
+def test_missing_columns():
+    df = pd.DataFrame({'order_id': ['1', '2']})
+    assert classify_status(df).tolist() == reference(df).tolist() == ["รอดำเนินการ"] * 2
+    df = pd.DataFrame({'status': ['cancel', 'x'], 'settlement_amount': [np.nan, 5]})
+    assert classify_status(df).tolist() == reference(df).tolist() == ["ยกเลิก", "ออเดอร์สำเร็จ"]
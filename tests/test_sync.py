@@ -0,0 +1,184 @@
+"""Sync แบบเทียบ manifest (run_sync / write_orders_diff / refresh_daily_summary) กับ SQLiteStorage
+ใช้ไฟล์ export จำลองจาก bench/generate_exports.py เขียนลง SQLite ไฟล์ชั่วคราวของแต่ละ test"""
+import io
+import os
+import sys
+import time
+
+import openpyxl
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "bench")]
+from sync_pipeline import (LocalFolderSource, SyncJob, PROCESSORS, INCOME_LOADERS, SUMMARY_COLUMNS, SUMMARY_KEY,
+                           collect_sync_files, run_sync, build_master_df, load_order_index, write_orders_diff, summarize_orders)
+from storage import SQLiteStorage
+from generate_exports import generate
+
+UP_TO_DATE = "✅ ข้อมูลเป็นปัจจุบันแล้ว (ไม่มีไฟล์ใหม่หรือไฟล์ที่แก้ไข)"
+
+class FlakySource(LocalFolderSource):
+    """LocalFolderSource ที่ดาวน์โหลดไฟล์ใน broken ไม่ได้ (จำลองเน็ตหลุดกลางรอบ)"""
+    def __init__(self, root):
+        super().__init__(root)
+        self.broken = set()
+
+    def download(self, file_id):
+        if file_id in self.broken: raise ConnectionError("connection reset")
+        return super().download(file_id)
+
+@pytest.fixture
+def exports(tmp_path):
+    root = str(tmp_path / "exports")
+    generate(root, 600, seed=3)
+    return FlakySource(root)
+
+@pytest.fixture
+def db(tmp_path):
+    return SQLiteStorage(str(tmp_path / "sync.db"))
+
+def sync(db, source, full=False):
+    job = SyncJob(full, 2, echo=lambda msg: None)
+    stats = run_sync(db, source, collect_sync_files(source.folders()), job, full, 2)
+    return job, stats
+
+def errors(job):
+    return [msg for level, msg in job.logs if level == 'error']
+
+def touch(source, file_id):
+    """เลื่อนเวลาแก้ไขไฟล์ไปข้างหน้า -> modifiedTime ไม่ตรงกับ manifest"""
+    later = time.time() + 60
+    os.utime(os.path.join(source.root, file_id), (later, later))
+
+def order_files(source, folder):
+    return [f['id'] for f in source.folders()[folder]]
+
+def manifest(db):
+    return {r['file_id']: r for r in db.query("SELECT * FROM sync_manifest")}
+
+def settlement(db, platform):
+    return db.query("SELECT ROUND(SUM(settlement_amount), 2) AS s FROM orders WHERE platform = ?", [platform])[0]['s']
+
+def assert_summary_matches_orders(db):
+    """ตาราง daily_summary ต้องเท่ากับการสรุปใหม่จาก orders ทั้งตาราง"""
+    expected = summarize_orders(pd.DataFrame(db.query("SELECT * FROM orders")))
+    expected['created_date'] = pd.to_datetime(expected['created_date']).dt.strftime('%Y-%m-%d')
+    actual = pd.DataFrame(db.query(f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM daily_summary"), columns=SUMMARY_COLUMNS)
+    sort = lambda df: df.sort_values(SUMMARY_KEY).reset_index(drop=True)[SUMMARY_COLUMNS]
+    pd.testing.assert_frame_equal(sort(actual), sort(expected), check_dtype=False)
+
+def test_incremental_sync_processes_only_changed_files(db, exports):
+    job, stats = sync(db, exports, full=True)
+    assert not errors(job) and stats['rows'] == 600
+    assert set(manifest(db)) == {f['id'] for files in exports.folders().values() for f in files}
+
+    job, stats = sync(db, exports)
+    assert stats is None and job.message == UP_TO_DATE
+
+    touch(exports, order_files(exports, 'SHOPEE 2')[0])
+    job, stats = sync(db, exports)
+    assert not errors(job)
+    assert set(job.shops) == {'SHOPEE 2'}
+    assert db.query("SELECT COUNT(*) AS n FROM orders")[0]['n'] == 600
+
+    job, stats = sync(db, exports)
+    assert stats is None
+
+def test_write_orders_diff_counts(db, exports):
+    source = exports
+    fetch = lambda file_id: io.BytesIO(source.download(file_id).getvalue())
+    job = SyncJob(True, 1, echo=lambda msg: None)
+    info = collect_sync_files(source.folders())['LAZADA']
+    income, _ = INCOME_LOADERS['LAZADA'](info['income'], fetch, job)
+    df, _ = PROCESSORS['LAZADA'](info['shops']['LAZADA 1'], income, 'LAZADA 1', fetch, job)
+    master_df = build_master_df([df])
+    n = len(master_df)
+    assert n > 2
+
+    stats = write_orders_diff(db, master_df, load_order_index(db))
+    assert (stats['inserted'], stats['updated'], stats['deleted'], stats['unchanged']) == (n, 0, 0, 0)
+
+    stats = write_orders_diff(db, master_df, load_order_index(db))
+    assert (stats['inserted'], stats['updated'], stats['deleted'], stats['unchanged']) == (0, 0, 0, n)
+
+    # แก้ยอดแถวแรก + ตัดแถวสุดท้ายทิ้ง -> แก้ 1 ลบ 1 ที่เหลือไม่ต้องเขียน
+    changed = master_df.iloc[:-1].copy()
+    changed.loc[changed.index[0], 'settlement_amount'] = 12345.0
+    stats = write_orders_diff(db, changed, load_order_index(db))
+    assert (stats['inserted'], stats['updated'], stats['deleted'], stats['unchanged']) == (0, 1, 1, n - 2)
+    rows = db.query("SELECT order_id, sku, settlement_amount FROM orders")
+    assert len(rows) == n - 1
+    first = changed.iloc[0]
+    assert [r['settlement_amount'] for r in rows if (r['order_id'], r['sku']) == (first['order_id'], first['sku'])] == [12345.0]
+
+def test_deleted_file_rows_and_manifest_are_removed(db, exports):
+    sync(db, exports, full=True)
+    removed = order_files(exports, 'TIKTOK 1')[0]
+    assert db.query("SELECT COUNT(*) AS n FROM orders WHERE source_file_id = ?", [removed])[0]['n'] > 0
+
+    os.remove(os.path.join(exports.root, removed))
+    job, stats = sync(db, exports)
+    assert not errors(job) and stats['deleted'] > 0
+    assert db.query("SELECT COUNT(*) AS n FROM orders WHERE source_file_id = ?", [removed])[0]['n'] == 0
+    assert removed not in manifest(db)
+    assert_summary_matches_orders(db)
+
+    job, stats = sync(db, exports)
+    assert stats is None
+
+def test_daily_summary_matches_orders(db, exports):
+    sync(db, exports, full=True)
+    assert_summary_matches_orders(db)
+
+    # ย้ายไฟล์ออเดอร์ไปอีกร้าน: ทั้งสองร้านต้องสรุปใหม่ (ร้านเดิมแถวหาย ร้านใหม่ได้แถวเพิ่ม)
+    moved = order_files(exports, 'SHOPEE 1')[0]
+    os.replace(os.path.join(exports.root, moved), os.path.join(exports.root, 'SHOPEE 3', 'moved.xlsx'))
+    job, stats = sync(db, exports)
+    assert not errors(job)
+    assert {'SHOPEE 1', 'SHOPEE 3'} <= set(job.shops)
+    assert_summary_matches_orders(db)
+
+def test_income_failure_keeps_data_and_retries(db, exports):
+    """Income อ่านไม่ได้: ต้องไม่เขียนทับยอดเงินเดิมด้วย 0, แจ้ง error และรอบหน้าต้องลองใหม่ (ไม่จดลง manifest)"""
+    sync(db, exports, full=True)
+    before = settlement(db, 'TIKTOK')
+    assert before > 0
+    income_id = order_files(exports, 'INCOME TIKTOK')[0]
+    synced_at = manifest(db)[income_id]['modified_time']
+
+    touch(exports, income_id)
+    exports.broken = {income_id}
+    job, stats = sync(db, exports)
+    assert errors(job)
+    assert all(job.shops[shop].startswith("❌") for shop in ('TIKTOK 1', 'TIKTOK 2'))
+    assert settlement(db, 'TIKTOK') == before
+    assert manifest(db)[income_id]['modified_time'] == synced_at
+
+    exports.broken = set()
+    job, stats = sync(db, exports)
+    assert not errors(job) and stats is not None
+    assert settlement(db, 'TIKTOK') == before
+    assert manifest(db)[income_id]['modified_time'] != synced_at
+
+    job, stats = sync(db, exports)
+    assert stats is None
+
+def test_non_export_workbook_is_skipped(db, exports):
+    """ไฟล์ Excel ที่ไม่ใช่ export (ไม่มีคอลัมน์เลขคำสั่งซื้อ) ต้องข้ามพร้อมแจ้งเตือน ไม่ทำให้ร้านพังทุกรอบ"""
+    sync(db, exports, full=True)
+    wb = openpyxl.Workbook()
+    wb.active.append(['โปรโมชัน', 'ส่วนลด'])
+    wb.active.append(['11.11', '10%'])
+    wb.save(os.path.join(exports.root, 'SHOPEE 1', 'promo_plan.xlsx'))
+
+    for full in (False, True):
+        job, stats = sync(db, exports, full=full)
+        assert not errors(job)
+        assert job.shops['SHOPEE 1'].startswith("✅")
+        assert any('promo_plan.xlsx' in msg for level, msg in job.logs if level == 'warning')
+        assert manifest(db)['SHOPEE 1/promo_plan.xlsx']['row_count'] == 0
+        assert db.query("SELECT COUNT(*) AS n FROM orders")[0]['n'] == 600
+
+        job, stats = sync(db, exports)
+        assert stats is None